@@ -0,0 +1,237 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import multiprocessing
+import random
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.WARNING)
+
+# Beam search of a character's legal builds for the best score on an objective, expanded across worker processes.
+
+# The BuildExplorer the workers expand builds with, set before they are forked
+_explorer = None
+
+
+class ExploredBuild(NamedTuple):
+    """A build found by BuildExplorer: its score, the placements made as (node location, mod_id) in a legal order,
+    the TP they cost and its compiled stats (BuildExplorer.columns order)."""
+
+    score: float
+    placements: tuple
+    tp_cost: int
+    stats: np.ndarray
+
+    def rank(self) -> tuple:
+        """The sort key: best score first, then cheapest, then by placements."""
+        return -self.score, self.tp_cost, tuple(sorted(self.placements))
+
+
+class BuildExplorer:
+    """The builds of one character (base_char) under a TP budget, scored by objective ({stat: weight}). char_mods
+    are the mods the character has and locked its breed locks ({node id: mod_ids}), as for BuildPlanner.plan.
+    compile_stats is CharacterMethods.compile_mod_stats_many. Build it with CharacterMethods.explore_builds."""
+
+    def __init__(
+        self,
+        planner,
+        base_char,
+        char_mods,
+        locked: dict,
+        objective: dict,
+        tp_budget: int,
+        compile_stats,
+        max_children: int = 32,
+        seed: int = 0,
+    ):
+        self.planner = planner
+        self.graph = planner.graph
+        self.base_char = base_char
+        self.locked: dict = locked
+        self.tp_budget: int = tp_budget
+        self.compile_stats = compile_stats
+        self.max_children: int = max_children
+        self.seed: int = seed
+        # Builds compiled and scored by search, across every worker
+        self.compiled: int = 0
+
+        # Compiling the character also builds the catalog's effects matrix, so forked workers get it ready-made
+        self.base_mods: list = [mod_id for mod_id in base_char.nodes.values() if mod_id]
+        columns, values = compile_stats([self.base_mods])
+        self.columns: tuple = columns
+        unknown = [stat for stat in objective if stat not in columns]
+        if unknown:
+            raise ValueError(f"Objective stats aren't compiled stats: {unknown}")
+        self.weights: np.ndarray = np.array(
+            [objective.get(stat, 0) for stat in columns], dtype=np.float64
+        )
+        self.base_score: float = float(values[0] @ self.weights)
+
+        ids = self.graph.ids
+        # Only the character's own locations can be filled
+        self.locations: frozenset = frozenset(
+            ids[location] for location in base_char.nodes if location in ids
+        )
+        self.filled: frozenset = frozenset(
+            ids[location]
+            for location, mod_id in base_char.nodes.items()
+            if mod_id and location in ids
+        )
+        self.held: frozenset = frozenset(char_mods)
+        self.free: frozenset = frozenset(
+            (self.graph.reachable(self.filled) & self.locations) - self.filled
+        )
+
+    def node_placements(self, placements: tuple) -> tuple:
+        """Requires: placements (tuple); returns tuple.
+        ExploredBuild placements ((node location, mod_id)) as (node id, mod_id)."""
+        ids = self.graph.ids
+        return tuple((ids[location], mod_id) for location, mod_id in placements)
+
+    def state(self, placements: tuple) -> tuple:
+        """Requires: placements (tuple); returns tuple.
+        (held, char_bits, filled, free node ids, tp cost) of the build made by placements ((node id, mod_id))."""
+        graph = self.graph
+        held = self.held | {mod_id for _, mod_id in placements}
+        filled = set(self.filled)
+        free = set(self.free)
+        for node_id, _ in placements:
+            filled.add(node_id)
+            free.discard(node_id)
+            free.update(
+                (graph.forward[node_id] & self.locations) - filled - graph.closed
+            )
+        tp_cost = sum(self.planner.tp_costs.get(mod_id, 0) for _, mod_id in placements)
+
+        return held, self.planner.rule_index.mask(held), filled, free, tp_cost
+
+    def children(self, placements: tuple) -> list:
+        """Requires: placements (tuple); returns list.
+        The builds one legal placement on from placements, at most max_children of them (sampled with a seed
+        made from the explorer's seed and the build)."""
+        planner = self.planner
+        held, char_bits, _, free, tp_cost = self.state(placements)
+        moves: list = []
+        for node_id in sorted(free):
+            if not self.graph.req_met(node_id, held):
+                continue
+            node_locked = self.locked.get(node_id, ())
+            for mod_id in planner.candidates.get(node_id, ()):
+                if tp_cost + planner.tp_costs.get(mod_id, 0) > self.tp_budget:
+                    continue
+                if planner.allowed(mod_id, held, char_bits, node_locked):
+                    moves.append((node_id, mod_id))
+
+        if len(moves) > self.max_children:
+            rng = random.Random(f"{self.seed}:{sorted(placements)}")
+            moves = rng.sample(moves, self.max_children)
+
+        return [placements + (move,) for move in moves]
+
+    def expand(self, beam: list, keep: int) -> tuple:
+        """Requires: beam (list of placements), keep (int); returns tuple.
+        (number of builds compiled, the best keep builds (ExploredBuild) one placement on from the builds in beam,
+        best first)."""
+        graph = self.graph
+        # A build is the same whatever order its placements were made in
+        builds: dict = {}
+        for placements in beam:
+            for child in self.children(placements):
+                key = tuple(sorted(child))
+                if key not in builds or child < builds[key]:
+                    builds[key] = child
+        if not builds:
+            return 0, []
+
+        # Placements only ever fill empty nodes, so a build's mods are the character's plus the ones placed
+        _, values = self.compile_stats(
+            [
+                self.base_mods + [mod_id for _, mod_id in placements]
+                for placements in builds.values()
+            ]
+        )
+        scores = values @ self.weights
+
+        explored: list = [
+            ExploredBuild(
+                float(score),
+                tuple((graph.names[i], mod_id) for i, mod_id in placements),
+                sum(self.planner.tp_costs.get(mod_id, 0) for _, mod_id in placements),
+                stats,
+            )
+            for placements, score, stats in zip(builds.values(), scores, values)
+        ]
+        explored.sort(key=ExploredBuild.rank)
+        return len(explored), explored[:keep]
+
+    def search(
+        self,
+        max_placements: int = 4,
+        beam_width: int = 64,
+        top_n: int = 10,
+        workers: int = 1,
+    ):
+        """Requires: max_placements (int), beam_width (int), top_n (int), workers (int); yields tuple.
+        Beam search up to max_placements placements deep. Yields the top_n builds (ExploredBuild, best first) found
+        so far after every depth. With more than one worker the beam is expanded in that many shards at once."""
+        global _explorer
+
+        pool = None
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            _explorer = self
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork")
+            )
+
+        try:
+            beam: list = [()]
+            top: dict = {}
+            for depth in range(max_placements):
+                if pool is None:
+                    compiled, explored = self.expand(beam, beam_width)
+                else:
+                    shards = [beam[i::workers] for i in range(workers)]
+                    compiled = 0
+                    explored = []
+                    for count, builds in pool.map(
+                        _expand_shard, shards, repeat(beam_width)
+                    ):
+                        compiled += count
+                        explored.extend(builds)
+                self.compiled += compiled
+                # Builds from different shards can be the same build, made in a different order
+                best: dict = {}
+                for build in explored:
+                    placements = self.node_placements(build.placements)
+                    key = tuple(sorted(placements))
+                    if key not in best or placements < best[key][0]:
+                        best[key] = (placements, build)
+                explored = sorted(
+                    (build for _, build in best.values()), key=ExploredBuild.rank
+                )[:beam_width]
+                if not explored:
+                    break
+
+                top.update((tuple(sorted(x.placements)), x) for x in explored)
+                top = dict(sorted(top.items(), key=lambda x: x[1].rank())[:top_n])
+                logging.info(
+                    f"BuildExplorer: depth {depth + 1}, {len(explored)} builds in the beam, best score "
+                    f"{explored[0].score}"
+                )
+                yield tuple(top.values())
+
+                beam = [self.node_placements(x.placements) for x in explored]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+                _explorer = None
+
+
+def _expand_shard(beam: list, keep: int) -> tuple:
+    """BuildExplorer.expand in a worker, with the explorer it inherited."""
+    return _explorer.expand(beam, keep)
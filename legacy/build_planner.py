@@ -0,0 +1,408 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from typing import NamedTuple
+from heapq import heappush, heappop
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+# Cheapest placements that unlock a mod a character can't take yet (A* over legal placements, see BuildPlanner).
+
+
+class BuildPlan(NamedTuple):
+    """The cheapest placements found, as (node location, mod_id) in the order to make them. search_cost is the TP
+    the search minimised (bonuses count as 0), tp_cost the real change in TP spent and searched the number of
+    states the search looked at."""
+
+    placements: tuple
+    search_cost: int
+    tp_cost: int
+    searched: int
+
+
+class BuildPlanner:
+    """Graph structures for planning builds, compiled once from the NodeGraph, the candidate mods of every node
+    (get_node_candidates), every mod's TP cost and the catalog's ModRuleIndex. Build it with
+    CharacterMethods.get_build_planner and treat it as read-only."""
+
+    def __init__(self, graph, node_candidates: dict, tp_costs: dict, rule_index):
+        self.graph = graph
+        self.rule_index = rule_index
+        # mod_id: TP the mod costs, negative for a bonus
+        self.tp_costs: dict = tp_costs
+        # node id: candidate mod_ids
+        self.candidates: dict = {
+            node_id: tuple(mod_ids) for node_id, mod_ids in node_candidates.items()
+        }
+        # node id: candidate mod_ids cheapest first, for filling a node
+        self.fillers: dict = {
+            node_id: tuple(
+                sorted(mod_ids, key=lambda mod_id: (self.search_cost(mod_id), mod_id))
+            )
+            for node_id, mod_ids in self.candidates.items()
+        }
+        # mod_id: ids of the nodes it can go in
+        hosts: dict = {}
+        for node_id, mod_ids in self.candidates.items():
+            for mod_id in mod_ids:
+                hosts.setdefault(mod_id, []).append(node_id)
+        self.hosts: dict = {mod_id: tuple(ids) for mod_id, ids in hosts.items()}
+        # mod_id: the mod_ids named in its prerequisites (any one of them meets them, see ModRuleIndex)
+        self.prereqs: dict = {}
+        for mod_id, mask in rule_index.prereq_masks.items():
+            if mask:
+                self.prereqs[mod_id] = self._mask_mods(mask)
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def _mask_mods(self, mask: int) -> tuple:
+        """The mod_ids of the bits set in mask."""
+        return tuple(
+            mod_id for mod_id, bit in self.rule_index.bits.items() if mask >> bit & 1
+        )
+
+    def search_cost(self, mod_id: str) -> int:
+        """Requires: mod_id (str); returns int.
+        What placing mod_id costs the search: its TP cost, or 0 for a bonus."""
+        return max(self.tp_costs.get(mod_id, 0), 0)
+
+    def scope(self, target: str, char_bits: int) -> tuple:
+        """Requires: target (str), char_bits (int); returns tuple.
+        (needed mods, relevant node ids) for getting target from the character's mods (char_bits): the needed mods'
+        prerequisites the character doesn't meet and the req mods of the relevant nodes are needed too, until
+        nothing more is added."""
+        needed: set = self.needed_mods((target,), char_bits)
+        while True:
+            relevant = self.relevant_nodes(needed)
+            req_mods = set().union(*(self.graph.req.get(i, ()) for i in relevant))
+            if req_mods <= needed:
+                return needed, relevant
+            needed |= self.needed_mods(req_mods - needed, char_bits)
+
+    def needed_mods(self, mod_ids, char_bits: int) -> set:
+        """Requires: mod_ids (iterable of str), char_bits (int); returns set.
+        mod_ids plus the mods named in the prerequisites of any of them the character's mods (char_bits) don't
+        meet, and in theirs, and so on."""
+        rule_index = self.rule_index
+        needed: set = set()
+        todo: list = list(mod_ids)
+        while todo:
+            mod_id = todo.pop()
+            if mod_id in needed:
+                continue
+            needed.add(mod_id)
+            if mod_id in rule_index.prereq_masks and not rule_index.prerequisites_met(
+                mod_id, char_bits
+            ):
+                todo.extend(self.prereqs.get(mod_id, ()))
+
+        return needed
+
+    def placeable(self, needed, held, char_bits: int, filled) -> set:
+        """Requires: needed (set), held (set), char_bits (int), filled (set); returns set.
+        The needed mods that could ever be placed: not held yet, one of the nodes they go in is empty, their
+        restrictions aren't already broken (mods are never taken off, so they never will be) and their
+        prerequisites are met or one of them is placeable too."""
+        rule_index = self.rule_index
+        possible = {
+            mod_id
+            for mod_id in needed
+            if mod_id not in held
+            and mod_id in rule_index.prereq_masks
+            and rule_index.restrictions_met(mod_id, char_bits)
+            and not filled.issuperset(self.hosts.get(mod_id, ()))
+        }
+        placeable: set = set()
+        added = True
+        while added:
+            added = False
+            for mod_id in possible - placeable:
+                if rule_index.prerequisites_met(
+                    mod_id, char_bits
+                ) or not placeable.isdisjoint(self.prereqs.get(mod_id, ())):
+                    placeable.add(mod_id)
+                    added = True
+
+        return placeable
+
+    def relevant_nodes(self, needed) -> set:
+        """Requires: needed (set); returns set.
+        Ids of the nodes the needed mods can go in and of every node that (through cxn) leads to one of them."""
+        graph = self.graph
+        relevant: set = set()
+        todo: list = [
+            node_id for mod_id in needed for node_id in self.hosts.get(mod_id, ())
+        ]
+        while todo:
+            node_id = todo.pop()
+            if node_id in relevant:
+                continue
+            relevant.add(node_id)
+            todo.extend(
+                source
+                for source in graph.reverse[node_id]
+                if source in self.candidates and source not in graph.closed
+            )
+
+        return relevant
+
+    def plan(
+        self,
+        char_nodes: dict,
+        char_mods,
+        target: str,
+        locked: dict = None,
+        max_steps: int = 12,
+        max_searched: int = 1000,
+    ):
+        """Requires: char_nodes (dict), char_mods (list), target (str), locked (dict), max_steps (int),
+        max_searched (int); returns BuildPlan (or None).
+        The cheapest placements that get target into char_nodes (CharacterModel.nodes) from the character's mods.
+        locked is {node id: breed locked mod_ids} for the character's breed. An empty plan means the character
+        already has target; None that there is no way to it in max_steps placements (or max_searched states)."""
+        graph = self.graph
+        rule_index = self.rule_index
+        locked = locked or {}
+
+        ids = graph.ids
+        filled = frozenset(
+            ids[location]
+            for location, mod_id in char_nodes.items()
+            if mod_id and location in ids
+        )
+        held = frozenset(char_mods)
+        if target in held:
+            return BuildPlan((), 0, 0, 0)
+        if target not in self.hosts:
+            return None
+
+        char_bits = rule_index.mask(held)
+        needed, _ = self.scope(target, char_bits)
+        needed = self.placeable(needed, held, char_bits, filled)
+        if target not in needed:
+            return None
+        relevant = self.relevant_nodes(needed)
+        distances = self.distances(target, relevant)
+        # The cheapest of target's prerequisites that can be placed, for estimate
+        prereq_cost = min(
+            (self.search_cost(x) for x in self.prereqs.get(target, ()) if x in needed),
+            default=0,
+        )
+        # If every node target goes in has a req list, one of them has to be met before target can go in
+        host_reqs: list = [
+            graph.req.get(i) for i in self.hosts[target] if i in relevant
+        ]
+        if not all(host_reqs):
+            host_reqs = []
+        # node id: the needed mods that can go in it
+        needed_at: dict = {}
+        for mod_id in needed:
+            for node_id in self.hosts.get(mod_id, ()):
+                needed_at.setdefault(node_id, []).append(mod_id)
+        # A filler that restricts a needed mod would stop it being taken
+        blocked = 0
+        for mod_id in needed:
+            blocked |= rule_index.restriction_masks.get(mod_id, 0)
+
+        # Only relevant nodes are ever filled, so a state only needs those: the ones that are free (frontier) and
+        # the ones that are filled or reachable (settled)
+        reachable = graph.reachable(filled)
+        frontier = frozenset((relevant & reachable) - filled)
+        settled = frozenset(relevant & (reachable | filled))
+        path_costs = self.path_costs(frontier, distances)
+        if not path_costs:
+            return None
+        # States are only built when they come off the queue: (placements, held, char_bits, frontier, settled)
+        states: list = [((), held, char_bits, frontier, settled)]
+        # (priority, steps, tie, search cost, parent state, node id, mod_id)
+        queue: list = [
+            (
+                self.estimate(target, char_bits, path_costs[0][0], prereq_cost),
+                0,
+                0,
+                0,
+                0,
+                None,
+                None,
+            )
+        ]
+        seen: set = set()
+        tie = 0
+        searched = 0
+        while queue and searched < max_searched:
+            _, steps, _, cost, parent, node_id, mod_id = heappop(queue)
+            placements, held, char_bits, frontier, settled = states[parent]
+            if node_id is not None:
+                opened = (graph.forward[node_id] & relevant) - settled
+                placements = placements + ((node_id, mod_id),)
+                held = held | {mod_id}
+                char_bits = char_bits | rule_index.mask((mod_id,))
+                frontier = (frontier - {node_id}) | (opened - graph.closed)
+                settled = settled | opened
+            if mod_id == target:
+                return BuildPlan(
+                    tuple((graph.names[i], placed) for i, placed in placements),
+                    cost,
+                    sum(self.tp_costs.get(placed, 0) for _, placed in placements),
+                    searched,
+                )
+            state = (held, frontier, settled)
+            if state in seen:
+                continue
+            seen.add(state)
+            searched += 1
+            if steps >= max_steps:
+                continue
+            states.append((placements, held, char_bits, frontier, settled))
+            parent = len(states) - 1
+
+            # The two best free nodes, so a move's estimate doesn't have to look at the whole frontier
+            path_costs = self.path_costs(frontier, distances)
+            req_cost, req_count = self.req_left(host_reqs, held)
+            for node_id, mod_id in self._moves(
+                held, char_bits, frontier, settled, relevant, needed_at, blocked, locked
+            ):
+                step_cost = cost + self.search_cost(mod_id)
+                # Placing mod_id can meet at most one more req mod
+                if steps + 1 + max(req_count - 1, 0) + (mod_id != target) > max_steps:
+                    continue
+                if mod_id == target:
+                    remaining = 0
+                else:
+                    path_cost = min(
+                        (distance for distance, i in path_costs if i != node_id),
+                        default=None,
+                    )
+                    for i in graph.forward[node_id] - settled - graph.closed:
+                        if i in distances and (
+                            path_cost is None or distances[i] < path_cost
+                        ):
+                            path_cost = distances[i]
+                    if path_cost is None:
+                        continue
+                    remaining = self.estimate(
+                        target,
+                        char_bits | rule_index.mask((mod_id,)),
+                        max(
+                            path_cost,
+                            req_cost
+                            - self.search_cost(mod_id)
+                            + self.search_cost(target),
+                        ),
+                        prereq_cost,
+                    )
+                tie += 1
+                heappush(
+                    queue,
+                    (
+                        step_cost + remaining,
+                        steps + 1,
+                        tie,
+                        step_cost,
+                        parent,
+                        node_id,
+                        mod_id,
+                    ),
+                )
+
+        return None
+
+    def req_left(self, host_reqs: list, held) -> tuple:
+        """Requires: host_reqs (list), held (set); returns tuple.
+        (search cost, number) of the req mods still to take before one of target's nodes can be free, the least of
+        each over its nodes. (0, 0) if target has a node without a req list."""
+        if not host_reqs:
+            return 0, 0
+        missing = [req - held for req in host_reqs]
+        return (
+            min(sum(map(self.search_cost, req)) for req in missing),
+            min(map(len, missing)),
+        )
+
+    @staticmethod
+    def path_costs(frontier, distances: dict) -> list:
+        """Requires: frontier (set), distances (dict); returns list.
+        [(distance, node id)] of the (up to) two free nodes closest to the target, closest first."""
+        return sorted((distances[i], i) for i in distances.keys() & frontier)[:2]
+
+    def distances(self, target: str, relevant) -> dict:
+        """Requires: target (str), relevant (set); returns dict.
+        {node id: the least search cost of getting target in once the node is free} for the relevant nodes that
+        lead to one of target's nodes: target's own cost in the nodes it can go in, and from any other node the
+        cheapest mod it can hold plus the distance of the best node it connects to (Dijkstra, backwards along
+        cxn). Prerequisites, restrictions and req are left out, so it never overestimates."""
+        graph = self.graph
+        distances: dict = {}
+        queue: list = [
+            (self.search_cost(target), node_id)
+            for node_id in self.hosts.get(target, ())
+            if node_id in relevant
+        ]
+        while queue:
+            distance, node_id = heappop(queue)
+            if node_id in distances:
+                continue
+            distances[node_id] = distance
+            for source in graph.reverse[node_id]:
+                if source in relevant and source not in distances:
+                    fill_cost = self.search_cost(self.fillers[source][0])
+                    heappush(queue, (distance + fill_cost, source))
+
+        return distances
+
+    def estimate(
+        self, target: str, char_bits: int, path_cost: int, prereq_cost: int
+    ) -> int:
+        """Requires: target (str), char_bits (int), path_cost (int), prereq_cost (int); returns int.
+        A lower bound on the search cost still to pay (so the search is A*): the distance of the closest free node
+        (path_cost), or the target's cost plus its cheapest prerequisite (prereq_cost) if they aren't met yet,
+        whichever is more."""
+        estimate = self.search_cost(target)
+        if not self.rule_index.prerequisites_met(target, char_bits):
+            estimate += prereq_cost
+
+        return max(path_cost, estimate)
+
+    def _moves(
+        self, held, char_bits, frontier, settled, relevant, needed_at, blocked, locked
+    ):
+        """The placements worth trying from a state: a needed mod in a free node it can go in, or the cheapest
+        allowed mod in a free relevant node (frontier) that opens up a relevant node that isn't settled yet."""
+        graph = self.graph
+        rule_index = self.rule_index
+        for node_id in frontier:
+            if not graph.req_met(node_id, held):
+                continue
+            node_locked = locked.get(node_id, ())
+            node_needed = needed_at.get(node_id, ())
+
+            for mod_id in node_needed:
+                if self.allowed(mod_id, held, char_bits, node_locked):
+                    yield node_id, mod_id
+
+            if (graph.forward[node_id] & relevant) <= settled:
+                continue
+            for mod_id in self.fillers[node_id]:
+                bit = rule_index.bits.get(mod_id)
+                if (
+                    mod_id not in node_needed
+                    and not (bit is not None and blocked >> bit & 1)
+                    and self.allowed(mod_id, held, char_bits, node_locked)
+                ):
+                    yield node_id, mod_id
+                    break
+
+    def allowed(self, mod_id: str, held, char_bits: int, node_locked) -> bool:
+        """Requires: mod_id (str), held (set), char_bits (int), node_locked (tuple); returns bool.
+        True if check_mods_by_node would offer mod_id (one of the node's candidates) to the character."""
+        rule_index = self.rule_index
+        return (
+            mod_id not in held
+            and mod_id not in node_locked
+            and mod_id in rule_index.prereq_masks
+            and rule_index.prerequisites_met(mod_id, char_bits)
+            and rule_index.restrictions_met(mod_id, char_bits)
+        )
@@ -5,6 +5,7 @@ __author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
 from datetime import datetime
 from pydantic import BaseModel, Extra
 from typing import Optional
+from db_migrations import migrate_db, CHARDATA_MIGRATIONS
 import sqlite3
 import logging
 
@@ -325,6 +326,8 @@ class BSCMConfig(BaseModel):
         "table": "gamedata",
         "db_path": "./gamedata/",
     }
+    # Traits for random characters, in the gamedata db_path (see character_generator.py)
+    random_traits_xlsx: str = "random_traits.xlsx"
 
     gamedata_fields: list = [
         "Mod ID",
@@ -7368,10 +7371,14 @@ def create_character_db(
     cursor.execute(create_table_sql1)
     cursor.execute(create_table_sql2)
     cursor.execute(create_table_sql3)
+    # Fresh tables are the original (v0) schema, so reset the version and let the migrations build the rest
+    cursor.execute("PRAGMA user_version = 0")
 
     conn.commit()
     conn.close()
 
+    migrate_db(db=db, db_path=db_path, migrations=CHARDATA_MIGRATIONS, force=True)
+
 
 def main() -> None:
     """Main function"""
@@ -0,0 +1,250 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from typing import NamedTuple
+from itertools import accumulate
+from bisect import bisect
+from openpyxl import load_workbook
+import warnings
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+# Random legal placements for NPCs and mooks from the BreedTemplates and random_traits.xlsx. Turning them into
+# compiled characters is CharacterMethods.generate_random_characters.
+
+# The sheet of random_traits.xlsx listing the traits by ID, Name and Type
+RANDOM_TRAITS_SHEET = "Trait Names"
+
+# Mods a random character is never given: traits come from the weighted pool, injuries and wounds from play
+SKIPPED_CATEGORIES = ("trait", "injury", "wound")
+
+
+def read_random_traits(excel_path: str) -> list:
+    """Requires: excel_path (str); returns list.
+    The (name, type) of every trait on the 'Trait Names' sheet of random_traits.xlsx, in order. Blank rows are left
+    out."""
+    traits: list = []
+    with warnings.catch_warnings():
+        # openpyxl warns about the workbook's conditional formatting, which it doesn't need for the values
+        warnings.simplefilter("ignore", UserWarning)
+        workbook = load_workbook(
+            filename=excel_path,
+            read_only=True,
+            keep_vba=False,
+            data_only=True,
+            keep_links=False,
+        )
+        try:
+            sheet = workbook[RANDOM_TRAITS_SHEET]
+            for _, name, trait_type in sheet.iter_rows(
+                min_row=2, max_col=3, values_only=True
+            ):
+                if name:
+                    traits.append((str(name).strip(), str(trait_type or "").strip()))
+        finally:
+            workbook.close()
+
+    return traits
+
+
+class GeneratedCharacter(NamedTuple):
+    """A character made by RandomCharacterGenerator: its breed, the placements made as (node location, mod_id),
+    breed template first, and the TP they cost (bonuses included) beyond what the breed pays for."""
+
+    breed: str
+    placements: tuple
+    tp_cost: int
+
+
+class RandomCharacterGenerator:
+    """Random legal builds for the breeds in templates ({breed: {node location: mod_id}}, see _breed_match).
+    locked is {breed: {node id: breed locked mod_ids}} (get_breed_locked_nodes), locations the node locations a
+    character has (CharacterModel.nodes), categories {mod_id: category}, trait_weights {trait mod_id: weight},
+    excluded the mod_ids that are never picked and template_costs {breed: TP its template costs beyond what the breed
+    pays for}. Build it with CharacterMethods.get_character_generator and treat it as read-only."""
+
+    def __init__(
+        self,
+        planner,
+        templates: dict,
+        locked: dict,
+        locations,
+        categories: dict,
+        trait_weights: dict,
+        excluded=(),
+        template_costs: dict = None,
+    ):
+        self.planner = planner
+        self.graph = planner.graph
+        self.rule_index = planner.rule_index
+        self.templates: dict = templates
+        self.locked: dict = locked
+        self.trait_weights: dict = trait_weights
+        ids = self.graph.ids
+        self.locations: frozenset = frozenset(
+            ids[location] for location in locations if location in ids
+        )
+
+        # node id: (mod_ids, cumulative weights, TP of the cheapest) to draw a trait, or any other mod, from
+        tp_costs = planner.tp_costs
+        self.trait_pools: dict = {}
+        self.mod_pools: dict = {}
+        for node_id, candidates in planner.candidates.items():
+            if node_id not in self.locations:
+                continue
+            traits = [
+                mod_id
+                for mod_id in candidates
+                if trait_weights.get(mod_id) and mod_id not in excluded
+            ]
+            if traits:
+                self.trait_pools[node_id] = (
+                    tuple(traits),
+                    tuple(accumulate(trait_weights[mod_id] for mod_id in traits)),
+                    min(tp_costs.get(mod_id, 0) for mod_id in traits),
+                )
+            mods = tuple(
+                mod_id
+                for mod_id in candidates
+                if categories.get(mod_id) not in SKIPPED_CATEGORIES
+                and mod_id not in excluded
+            )
+            if mods:
+                self.mod_pools[node_id] = (
+                    mods,
+                    None,
+                    min(tp_costs.get(mod_id, 0) for mod_id in mods),
+                )
+
+        # node id: the character's nodes that placing a mod there opens up (connected and not closed), and mod_id: its
+        # bit in char_bits, worked out once rather than for every placement
+        forward = self.graph.forward
+        self.opens: dict = {
+            node_id: frozenset((forward[node_id] & self.locations) - self.graph.closed)
+            for node_id in self.locations
+        }
+        self.mod_bits: dict = {
+            mod_id: self.rule_index.mask((mod_id,))
+            for pools in (self.trait_pools, self.mod_pools)
+            for mods, _, _ in pools.values()
+            for mod_id in mods
+        }
+
+        # breed: (held, char_bits, filled, free node ids, tp cost) once its template is placed
+        self.starts: dict = {}
+        for breed, template in templates.items():
+            held = frozenset(template.values())
+            filled = frozenset(
+                ids[location] for location in template if location in ids
+            )
+            free = frozenset((self.graph.reachable(filled) & self.locations) - filled)
+            self.starts[breed] = (
+                held,
+                self.rule_index.mask(held),
+                filled,
+                free,
+                (template_costs or {}).get(breed, 0),
+            )
+        self.breeds: tuple = tuple(self.starts)
+
+    def _place(
+        self, rng, pools: dict, nodes: list, state: list, budget: int, tries: int
+    ):
+        """Requires: rng (random.Random), pools (dict), nodes (list), state (list), budget (int), tries (int);
+        returns tuple.
+        Makes one random legal placement from pools in state ([held, char_bits, filled, free, tp_cost, locked],
+        updated in place) costing at most budget TP: (node id, mod_id), or None if there isn't one. nodes are the
+        free node ids pools has mods for, kept up to date here rather than worked out again for every placement.
+        Nodes are picked at random and given up to tries draws each, stopping at the first that can be placed (none if
+        even the node's cheapest mod is over budget); a node that fails is moved behind the ones still to try, so it
+        isn't tried again this placement."""
+        graph = self.graph
+        planner = self.planner
+        tp_costs = planner.tp_costs
+        random = rng.random
+        held, char_bits, filled, free, tp_cost, locked = state
+
+        untried = len(nodes)
+        while untried:
+            pick = int(random() * untried)
+            node_id = nodes[pick]
+            untried -= 1
+            nodes[pick], nodes[untried] = nodes[untried], node_id
+            mods, cum_weights, cheapest = pools[node_id]
+            if tp_cost + cheapest > budget or not graph.req_met(node_id, held):
+                continue
+            node_locked = locked.get(node_id, ())
+            for _ in range(tries):
+                # Drawn as rng.choices draws one, without the call
+                if cum_weights is None:
+                    mod_id = mods[int(random() * len(mods))]
+                else:
+                    mod_id = mods[
+                        bisect(
+                            cum_weights, random() * cum_weights[-1], 0, len(mods) - 1
+                        )
+                    ]
+                cost = tp_cost + tp_costs.get(mod_id, 0)
+                if cost > budget or not planner.allowed(
+                    mod_id, held, char_bits, node_locked
+                ):
+                    continue
+                held.add(mod_id)
+                state[1] = char_bits | self.mod_bits[mod_id]
+                state[4] = cost
+                filled.add(node_id)
+                free.discard(node_id)
+                nodes[untried] = nodes[-1]
+                nodes.pop()
+                opened = self.opens[node_id] - filled - free
+                free.update(opened)
+                nodes.extend(x for x in opened if x in pools)
+                return node_id, mod_id
+
+        return None
+
+    def generate(
+        self,
+        rng,
+        breed: str = "",
+        tp_budget: int = 30,
+        traits: int = 3,
+        max_placements: int = 40,
+        tries: int = 4,
+    ) -> GeneratedCharacter:
+        """Requires: rng (random.Random), breed (str), tp_budget (int), traits (int), max_placements (int),
+        tries (int); returns GeneratedCharacter.
+        One random character of breed (a random one of the generator's breeds if not given): its template, up to
+        traits weighted random traits and then random placements, never spending more than tp_budget TP."""
+        if not breed:
+            breed = rng.choice(self.breeds)
+        held, char_bits, filled, free, tp_cost = self.starts[breed]
+        state: list = [
+            set(held),
+            char_bits,
+            set(filled),
+            set(free),
+            tp_cost,
+            self.locked.get(breed, {}),
+        ]
+
+        names = self.graph.names
+        placements: list = list(self.templates[breed].items())
+        made: int = 0
+        for pools, limit in (
+            (self.trait_pools, traits),
+            (self.mod_pools, max_placements),
+        ):
+            nodes = sorted(node_id for node_id in state[3] if node_id in pools)
+            for _ in range(limit):
+                if made >= max_placements:
+                    break
+                placement = self._place(rng, pools, nodes, state, tp_budget, tries)
+                if placement is None:
+                    break
+                placements.append((names[placement[0]], placement[1]))
+                made += 1
+
+        return GeneratedCharacter(breed, tuple(placements), state[4])
@@ -14,9 +14,31 @@ from character_dataclasses import (
 )
 from datetime import datetime, timezone
 from utility_methods import UtilityMethods
+from mod_catalog import ModCatalog, ModEffectsMatrix, PrefixSearch
+from node_graph import NodeGraph, FreeNodeFrontier
+from build_planner import BuildPlanner
+from build_explorer import BuildExplorer
+from character_generator import RandomCharacterGenerator, read_random_traits
+from effect_ledger import EffectLedger
+from housekeeping_pipeline import HousekeepingStage, HousekeepingPipeline
+from what_if import (
+    WhatIfSession,
+    overlay_model,
+    container_fields,
+    has_nested_models,
+    model_from_values,
+    non_default_values,
+)
+from stat_tables import WT_TABLE, MOOK_WT_TABLE, INITIATIVE_TABLE
+from gamedata_snapshot import load_node_map, load_breed_templates
+import queries
 from json import dumps, loads
+from contextlib import contextmanager, nullcontext
 import textwrap
+import gc
 import logging
+import random
+import numpy as np
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -50,10 +72,26 @@ class CharacterMethods(UtilityMethods):
         valid_edge_types = bscm.valid_edge_types
         node_map_types = bscm.node_map_types
 
-        nm = NodeMap()
+        # Both come from the gamedata snapshot when it's up to date, which skips the pydantic validation
+        nm = load_node_map(self.gamedata_db["db_path"])
         nm_dict = nm.dict()
         self.nm = nm
         self.nm_dict = nm_dict
+        # Compiled from nm_dict on first use, see get_node_graph
+        self.node_graph = None
+        # Free nodes of the character being built, kept up to date by apply_mod_to_character and
+        # remove_mod_from_character. See get_free_node_frontier
+        self.free_node_frontier = None
+        # Compiled from the NodeGraph, node candidates and catalog for plan_build, see get_build_planner
+        self.build_planner = None
+        self.build_planner_load: int = 0
+        # breed: {node id: breed locked mod_ids} for plan_build
+        self.build_planner_locked: dict = {}
+        # The BuildExplorer of the last explore_builds, for its count of builds compiled
+        self.build_explorer = None
+        # Built from the BuildPlanner, BreedTemplates and random_traits.xlsx, see get_character_generator
+        self.character_generator = None
+        self.character_generator_load: int = 0
 
         ss = SpecialStats()
         self.ss = ss
@@ -66,13 +104,75 @@ class CharacterMethods(UtilityMethods):
         self.valid_edge_types = valid_edge_types
         self.node_map_types = node_map_types
 
-        bt = BreedTemplates()
+        bt = load_breed_templates(self.gamedata_db["db_path"])
         self.bt = bt
         breeds_list = bt.breeds_list
         self.breeds_options = breeds_list
 
         self.lifestyle_mod_id = ""
 
+        # In-memory copy of the gamedata table, shared by every instance and loaded on first lookup
+        catalog = ModCatalog.shared(
+            db=self.gamedata_db["db"],
+            db_path=self.gamedata_db["db_path"],
+            table=self.gamedata_db["table"],
+        )
+        self.catalog = catalog
+        # The gamedata fields check_mod_allowed needs, in the order it expects them in mod_info
+        self.mod_allowed_fields = (
+            "prereqs, prereq_any, restriction, restriction_any, allow_multiple"
+        )
+        # node_location: (candidate mod_ids, candidate mod_ids including 'extra' types) for check_mods_by_node.
+        # Built from the catalog and NodeMap by get_node_candidates, and rebuilt whenever the catalog reloads
+        self.node_candidates: dict = {}
+        self.node_candidates_load: int = 0
+        # mod_autocomplete's last search, so each keystroke only narrows the previous result (see PrefixSearch)
+        self.prefix_search = None
+        # How check_preq_restrict_all evaluates Prerequisites and Restrictions: "bitset" (the catalog's compiled
+        # ModRuleIndex) or "list" (check_prerequisite and check_restriction). Both give the same answers
+        self.rule_evaluator: str = "bitset"
+        # Remember check_mod_allowed's answers in the catalog's ModAllowedCache. False always checks from scratch
+        self.memoise_allowed: bool = True
+
+        # The SpecialStats lists _mod_effect_updates checks for every effect of every mod, as sets
+        self.protected_stats: frozenset = frozenset(ss.protected_stats)
+        self.replace_stats: frozenset = frozenset(ss.replace_stats)
+        self.min_1_skills: frozenset = frozenset(ss.min_1_skills)
+        self.armour_values: frozenset = frozenset(ss.armour_values)
+
+        # What each mod did to the live character being built, so remove_mod_from_character can take a mod off
+        # without rebuilding the live character. See get_effect_ledger
+        self.effect_ledger = None
+        # A blank LiveCharacterModel's stats, and the ones mods add integer effects to, for compile_live_char's
+        # effects matrix
+        self.live_char_defaults = None
+        self.live_char_int_stats = None
+        # The notes _if_mod_is_ets_add_note writes to
+        self.ets_note_stats: list = ["edges_note", "traits_note", "sliverware_note"]
+        # The housekeeping stages that recalculate a stat from scratch, for recalc_derived_stats
+        self.derived_stages: tuple = (
+            "wyld_cancer_injuries",
+            "lifestyle",
+            "skill_minimums",
+            "initiative",
+            "wound_thresholds",
+            "armour_value_caps",
+            "bonus_languages",
+        )
+        # Housekeeping stages and their reads/writes (see get_housekeeping_pipeline), and the fields of
+        # dirty_live_char changed since its last housekeeping. dirty_stats is None while nothing is known
+        self.housekeeping_pipeline = None
+        self.dirty_live_char = None
+        self.dirty_stats = None
+        # Debug: check every partial housekeeping against a full run on a copy of the character
+        self.verify_housekeeping: bool = False
+        self.housekeeping_verify_failures: int = 0
+        # Housekeeping adds the skill masteries and sliverware completion on top of the skills, so removing a mod
+        # that changes these needs the full rebuild
+        self.full_rebuild_stats: set = {"smx1", "smx2", "smx3"} | set(
+            bscm.sliverware_complete
+        )
+
     def __repr__(self):
         return f"{self.__class__.__name__}"
 
@@ -329,10 +429,7 @@ class CharacterMethods(UtilityMethods):
         if write_to_db:
             if insert_update:
                 # INSERT into table
-                write_sql = (
-                    f"INSERT INTO players (player_id, player_name, player_real_name, player_email, player_json, "
-                    f"deleted) VALUES (?, ?, ?, ?, ?, ?)"
-                )
+                write_sql = queries.INSERT_PLAYER
                 logging.info(
                     f"{self.chk} {self.sql_txt} Player doesn't exist, so "
                     f"{self.col['g']}INSERTING{self.col['w']} new DB entry for "
@@ -361,10 +458,7 @@ class CharacterMethods(UtilityMethods):
                     f"{self.col['y']}player_id:{next_player_id}{self.col['w']} so "
                     f"{self.col['y']}UPDATING{self.col['w']} DB entry."
                 )
-                write_sql = (
-                    f"UPDATE players SET player_real_name = ?, player_email = ?, player_json = ? "
-                    f"WHERE player_id={next_player_id}"
-                )
+                write_sql = queries.UPDATE_PLAYER
 
                 self.db_fetch(
                     self.chardata_db["db"],
@@ -374,6 +468,7 @@ class CharacterMethods(UtilityMethods):
                         safe_player_real_name,
                         safe_player_email,
                         str(player_json),
+                        int(next_player_id),
                     ),
                     allow_edit=True,
                 )
@@ -566,10 +661,7 @@ class CharacterMethods(UtilityMethods):
             if write_to_db:
                 if insert_update:
                     # INSERT into table
-                    write_sql = (
-                        f"INSERT INTO characters (char_id, char_name, char_archetype, player_id, char_type, char_json, "
-                        f"deleted) VALUES (?, ?, ?, ?, ?, ?, ?)"
-                    )
+                    write_sql = queries.INSERT_CHAR
                     logging.info(
                         f"{self.chk} {self.sql_txt} Character doesn't exist, so "
                         f"{self.col['g']}INSERTING{self.col['w']} new DB entry for "
@@ -634,10 +726,7 @@ class CharacterMethods(UtilityMethods):
                             f"{self.ind0}{self.col['y']}-{self.col['g']}Player ID{self.col['y']} = "
                             f"{self.col['w']}{safe_player_id}\n"
                         )
-                    write_sql = (
-                        f"UPDATE characters SET char_name = ?, char_archetype = ?, char_type = ?, char_json = ? "
-                        f"WHERE char_id={next_char_id}"
-                    )
+                    write_sql = queries.UPDATE_CHAR
 
                     self.db_fetch(
                         self.chardata_db["db"],
@@ -648,6 +737,7 @@ class CharacterMethods(UtilityMethods):
                             safe_char_archetype,
                             safe_char_type,
                             str(char_json),
+                            int(next_char_id),
                         ),
                         allow_edit=True,
                     )
@@ -722,11 +812,11 @@ class CharacterMethods(UtilityMethods):
 
                     # We have to search the live_Characters table by char_id to see if a live_character already exists
                     # This is a more complicated search as each player could potentially have the same character
-                    live_char_sql = f"SELECT * FROM live_characters WHERE char_id={char_id} AND player_id={player_id}"
                     live_char_exists = self.db_fetch(
                         self.chardata_db["db"],
                         self.chardata_db["db_path"],
-                        live_char_sql,
+                        queries.LIVE_CHAR_BY_CHAR_AND_PLAYER,
+                        sql_data_tuple=(char_id, player_id),
                     )
 
                     if live_char_exists:
@@ -782,10 +872,7 @@ class CharacterMethods(UtilityMethods):
         if write_to_db and next_live_char_id > -1:
             if insert_update:
                 # INSERT into table
-                write_sql = (
-                    f"INSERT INTO live_characters (live_char_id, char_id, player_id, char_name, live_char_json, "
-                    f"deleted) VALUES (?, ?, ?, ?, ?, ?)"
-                )
+                write_sql = queries.INSERT_LIVE_CHAR
                 logging.info(
                     f"{self.chk} {self.sql_txt} Live_Character doesn't exist, so "
                     f"{self.col['g']}INSERTING{self.col['w']} new DB entry for "
@@ -818,10 +905,7 @@ class CharacterMethods(UtilityMethods):
                     f"{self.col['y']}live_char_id:{next_live_char_id}{self.col['w']} so "
                     f"{self.col['y']}UPDATING{self.col['w']} DB entry."
                 )
-                write_sql = (
-                    f"UPDATE live_characters SET char_id = ?, char_name = ?, live_char_json = ? "
-                    f"WHERE live_char_id={next_live_char_id}"
-                )
+                write_sql = queries.UPDATE_LIVE_CHAR
 
                 self.db_fetch(
                     self.chardata_db["db"],
@@ -831,6 +915,7 @@ class CharacterMethods(UtilityMethods):
                         char_id,
                         safe_char_name,
                         str(char_json),
+                        int(next_live_char_id),
                     ),
                     allow_edit=True,
                 )
@@ -940,9 +1025,11 @@ class CharacterMethods(UtilityMethods):
         player_exists = self.pc_exists_by_id(search_id=player_id, pc="player")
 
         if player_exists:
-            retrieve_sql = f"SELECT * FROM players WHERE player_id={player_id}"
             player_retrieve = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], retrieve_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                queries.PLAYER_BY_ID,
+                sql_data_tuple=(player_id,),
             )
             player_dict = self.convert_db_str_to_dict(player_retrieve[0][4])
 
@@ -982,9 +1069,11 @@ class CharacterMethods(UtilityMethods):
         player_exists = self.pc_exists_by_name(search_name=player_name, pc="player")
 
         if player_exists:
-            retrieve_sql = f"SELECT * FROM players WHERE player_name='{player_name}'"
             player_retrieve = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], retrieve_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                queries.PLAYER_BY_NAME,
+                sql_data_tuple=(player_name,),
             )
             player_dict = self.convert_db_str_to_dict(player_retrieve[0][4])
 
@@ -1030,6 +1119,7 @@ class CharacterMethods(UtilityMethods):
         self.char = char
         self.live_char = live_char
         self.player = player
+        self.seed_effect_ledger(char=char, live_char=live_char)
 
         return char, live_char
 
@@ -1078,10 +1168,13 @@ class CharacterMethods(UtilityMethods):
         logging.info(f"{self.chk} {self.col['y']}[_check_mod_fail]{self.col['w']}")
         # We need to check all the mod_ids are valid and exist and throw an error if they don't
         failed_mods: list = []
+        existing_mods = self.get_mod_info_many(
+            [nodes_dict[node] for node in nodes_dict if nodes_dict[node]],
+            optional_fields="mod_id",
+        )
         for node in nodes_dict:
             if nodes_dict[node]:
-                check = self.check_mod_exists(mod_id=nodes_dict[node])
-                if not check:
+                if nodes_dict[node] not in existing_mods:
                     if cli_print:
                         print(
                             f"\n{self.cross} {self.col['r']}ERROR: Mod ID:{self.col['w']}{nodes_dict[node]}"
@@ -1238,9 +1331,11 @@ class CharacterMethods(UtilityMethods):
         char_exists = self.pc_exists_by_id(search_id=char_id, pc="char")
 
         if char_exists:
-            retrieve_sql = f"SELECT * FROM characters WHERE char_id={char_id}"
             char_retrieve = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], retrieve_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                queries.CHAR_BY_ID,
+                sql_data_tuple=(char_id,),
             )
             char_dict = self.convert_db_str_to_dict(char_retrieve[0][5])
 
@@ -1286,9 +1381,11 @@ class CharacterMethods(UtilityMethods):
         char_exists = self.pc_exists_by_name(search_name=char_name, pc="char")
 
         if char_exists:
-            retrieve_sql = f"SELECT * FROM characters WHERE char_name='{char_name}'"
             char_retrieve = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], retrieve_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                queries.CHAR_BY_NAME,
+                sql_data_tuple=(char_name,),
             )
             char_dict = self.convert_db_str_to_dict(char_retrieve[0][5])
 
@@ -1336,9 +1433,11 @@ class CharacterMethods(UtilityMethods):
             lc = self.pc_exists_by_id(char_id, pc="live_char", lc=True)
             lc_id = lc[0][0]
             logging.debug(f"{self.chk} {self.sql_txt} live_char_id:{lc_id}")
-            retrieve_sql = f"SELECT * FROM live_characters WHERE live_char_id={lc_id}"
             live_char_retrieve = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], retrieve_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                queries.LIVE_CHAR_BY_ID,
+                sql_data_tuple=(lc_id,),
             )
             live_char_dict = self.convert_db_str_to_dict(live_char_retrieve[0][4])
 
@@ -1364,6 +1463,58 @@ class CharacterMethods(UtilityMethods):
                 f"Character with char_id:{char_id} not found in DB.{self.col['w']}"
             )
 
+    def load_chars_many(self, char_ids: list) -> list:
+        """Requires: char_ids (list of int); returns list.
+        Loads many CharacterModels with one query per queries.MAX_BOUND_IDS char_ids, in char_ids order (missing
+        nodes added, see _update_char_nodes). char_ids that aren't in the DB are logged and left out."""
+        logging.info(f"{self.chk} {self.col['y']}[load_chars_many]{self.col['w']}")
+
+        chars_by_id: dict = {}
+        for row in self._fetch_pc_many(pc="char", ids=char_ids):
+            char = CharacterModel.parse_obj(self.convert_db_str_to_dict(row[5]))
+            chars_by_id[row[0]] = self._update_char_nodes(char=char, cli_print=False)
+
+        missing = [char_id for char_id in char_ids if char_id not in chars_by_id]
+        if missing:
+            logging.error(
+                f"{self.cross} {self.sql_txt} {self.err_txt} {self.col['r']} "
+                f"Characters with char_ids:{missing} not found in DB.{self.col['w']}"
+            )
+
+        return [chars_by_id[char_id] for char_id in char_ids if char_id in chars_by_id]
+
+    def load_live_char_info_many(self, char_ids: list) -> dict:
+        """Requires: char_ids (list of int); returns dict.
+        {char_id: (live_char_id, player_name)} of the live characters of many characters, for compile_chars."""
+        logging.info(
+            f"{self.chk} {self.col['y']}[load_live_char_info_many]{self.col['w']}"
+        )
+
+        live_char_info: dict = {}
+        for row in self._fetch_pc_many(pc="live_char", ids=char_ids, by_char_id=True):
+            live_char_dict = self.convert_db_str_to_dict(row[4])
+            live_char_info[row[1]] = (row[0], live_char_dict.get("player_name", ""))
+
+        return live_char_info
+
+    def _fetch_pc_many(self, pc: str, ids: list, by_char_id: bool = False) -> list:
+        """Requires: pc (str), ids (list of int), by_char_id (bool); returns list.
+        The DB rows of many players/characters/live_characters (see queries.pc_by_ids), in no particular order."""
+        ids = list(dict.fromkeys(ids))
+        rows: list = []
+        for start in range(0, len(ids), queries.MAX_BOUND_IDS):
+            chunk = tuple(ids[start : start + queries.MAX_BOUND_IDS])
+            rows.extend(
+                self.db_fetch(
+                    self.chardata_db["db"],
+                    self.chardata_db["db_path"],
+                    queries.pc_by_ids(pc, len(chunk), by_char_id=by_char_id),
+                    sql_data_tuple=chunk,
+                )
+            )
+
+        return rows
+
     def print_player_model(self, player: PlayerModel = None) -> None:
         """Requires: player (PlayerModel); returns nothing.
         Prints the current PlayerModel in memory."""
@@ -1433,61 +1584,32 @@ class CharacterMethods(UtilityMethods):
         cli_print: bool = False,
     ) -> dict:
         """Method for searching for mod names that begin with a number of characters.
-        search_type options: name, cat, type, name_cat, name_type, all"""
+        search_type options: name, cat, type, name_cat, name_type, all, text
+        text is a ranked full-text search of names, descriptions, categories, types and effects (see search_mods)"""
         logging.warning(f"{self.chk} {self.col['y']}[mod_name_search]{self.col['w']}")
         search_text = search_text.lower()
         return_dict: dict = {}
 
         print(f"MOD NAME SEARCH")
 
-        # Match type of search
-        match search_type:
-            case "cat":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE category='{mod_cat}' ORDER BY name"
-                )
-            case "type":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE type='{mod_type}' ORDER BY name"
-                )
-            case "sliver":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE category='{mod_cat}' AND type='{mod_type}' AND mod_id='{search_text}' ORDER BY name"
-                )
-            case "name_cat":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE LOWER(name) LIKE '{search_text}%' AND category='{mod_cat}' ORDER BY category, name"
-                )
-            case "name_type":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE LOWER(name) LIKE '{search_text}%' AND type='{mod_type}' ORDER BY category, name"
-                )
-            case "cat_type":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE LOWER(name) LIKE '{search_text}%' AND category='{mod_cat}' AND type='{mod_type}' "
-                    f"ORDER BY category, name"
-                )
-            case "all":
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE LOWER(name) LIKE '{search_text}%' AND category='{mod_cat}' AND type='{mod_type}' "
-                    f"ORDER BY category, name"
-                )
-            case _:
-                # "name"
-                fetch_sql = (
-                    f"SELECT mod_id, name, category, type FROM gamedata "
-                    f"WHERE LOWER(name) LIKE '{search_text}%' ORDER BY category, name"
-                )
+        # Match type of search ("name" is the default)
+        fetch_sql, param_names = queries.MOD_NAME_SEARCH.get(
+            search_type, queries.MOD_NAME_SEARCH["name"]
+        )
+        params = {
+            "mod_cat": mod_cat,
+            "mod_type": mod_type,
+            "search_text": search_text,
+            "search_like": queries.like_prefix(search_text),
+            "search_match": queries.fts_match(search_text),
+        }
+        if "search_match" in param_names and not params["search_match"]:
+            # Nothing but punctuation to search for
+            return return_dict
+        sql_data_tuple = tuple(params[name] for name in param_names)
 
         # TODO: Comment this out! FOR TESTING ONLY
-        print(f"{fetch_sql}")
+        print(f"{fetch_sql} {sql_data_tuple}")
 
         logging.warning(
             f"{self.chk} {self.sql_txt} Fetching all mods that begin with:"
@@ -1502,7 +1624,10 @@ class CharacterMethods(UtilityMethods):
             )
 
         return_data = self.db_fetch(
-            self.gamedata_db["db"], self.gamedata_db["db_path"], fetch_sql
+            self.gamedata_db["db"],
+            self.gamedata_db["db_path"],
+            fetch_sql,
+            sql_data_tuple=sql_data_tuple,
         )
 
         len_rr = len(return_data)
@@ -1516,34 +1641,193 @@ class CharacterMethods(UtilityMethods):
 
         return return_dict
 
-    def get_mod_info(
-        self, mod_id: str, optional_fields: str = "", lower_case: bool = False
+    def mod_autocomplete(
+        self,
+        search_text: str = "",
+        mod_cat: str = "",
+        mod_type: str = "",
+        search_type: str = "name",
     ) -> dict:
-        """Requires mod_id (int), optional_fields (string); returns dict.
-        Get full information on a specific mod_id. Defaults to ALL information (SELECT *)"""
-        logging.info(f"{self.chk} {self.col['y']}[get_mod_info]{self.col['w']}")
+        """Requires: search_text (str); returns dict.
+        In-memory version of mod_name_search for the CLI's type-as-you-go searches: served from the catalog's prefix
+        index (ModCatalog.get_prefix_index) so it never touches the DB, and a search that carries on from the last one
+        (same filters, longer prefix) only narrows its result (see PrefixSearch). Returns the same
+        {count: (mod_id, name, category, type)} dict in the same order.
+        search_type options: name, cat, type, name_cat, name_type, cat_type, all, sliver, text
+        Differences from mod_name_search:
+        - a blank mod_cat or mod_type means any category or type rather than matching nothing
+        - sliver takes a comma separated list of mod_ids in search_text
+        - text is a full-text search, so it is passed on to mod_name_search"""
+        logging.info(f"{self.chk} {self.col['y']}[mod_autocomplete]{self.col['w']}")
+
+        if search_type == "text":
+            return self.mod_name_search(
+                search_text=search_text,
+                mod_cat=mod_cat,
+                mod_type=mod_type,
+                search_type=search_type,
+            )
 
-        if optional_fields:
-            select_range = optional_fields
+        index = self.catalog.get_prefix_index()
+        # Which of mod_cat and mod_type each search_type filters by (as in queries.MOD_NAME_SEARCH)
+        if search_type in ("cat", "name_cat", "cat_type", "all", "sliver"):
+            categories = mod_cat
         else:
-            select_range = "*"
-
-        if lower_case:
-            fetch_sql = f"SELECT {select_range} FROM gamedata WHERE LOWER(mod_id)='{mod_id.lower()}'"
+            categories = ""
+        if search_type in ("type", "name_type", "cat_type", "all", "sliver"):
+            mod_types = mod_type
         else:
-            fetch_sql = f"SELECT {select_range} FROM gamedata WHERE mod_id='{mod_id}'"
+            mod_types = ""
+        if search_type in ("cat", "type", "sliver"):
+            order_by = "name"
+        else:
+            order_by = "category"
+
+        if search_type == "sliver":
+            mod_ids = {mod_id.strip() for mod_id in str(search_text).split(",")}
+            positions = index.filter_positions(
+                [
+                    index.positions[mod_id]
+                    for mod_id in mod_ids
+                    if mod_id in index.positions
+                ],
+                index.category_mask(categories),
+                index.type_mask(mod_types),
+            )
+            records = [
+                index.records[i]
+                for i in index.sort_positions(positions, order_by=order_by)
+            ]
+        else:
+            prefix = search_text if search_type not in ("cat", "type") else ""
+            # Typing on from the last search only searches what that one matched
+            search = self.prefix_search
+            if search is None or not search.matches(index, categories, mod_types):
+                search = PrefixSearch(index, categories=categories, mod_types=mod_types)
+                self.prefix_search = search
+            records = search.narrow(prefix, order_by=order_by)
+
+        logging.info(
+            f"{self.info} {self.py_txt} Record(s) matching '{search_text}': {self.col['g']}{len(records)}"
+            f"{self.col['w']}"
+        )
+        return {
+            count: (record.mod_id, record.name, record.category, record.type)
+            for count, record in enumerate(records)
+        }
+
+    def search_mods(
+        self,
+        query: str,
+        category: str = None,
+        mod_type: str = None,
+        limit: int = 20,
+    ) -> list:
+        """Requires: query (str); returns list.
+        Ranked full-text search (FTS5 index gamedata_fts) of every mod's name, description, category, type and
+        effects. Every word in query must match the start of a word in the mod, so "night vis" finds "Night Vision".
+        Returns a list of (mod_id, name, category, type, rank) tuples, best match first. Name matches rank highest.
+        Available Options:
+        category: only return mods in this category
+        mod_type: only return mods of this type
+        limit: maximum number of results to return"""
+        logging.info(f"{self.chk} {self.col['y']}[search_mods]{self.col['w']}")
+
+        search_match = queries.fts_match(query)
+        if not search_match:
+            logging.info(
+                f"{self.cross} {self.sql_txt} Nothing to search for in '{query}'."
+            )
+            return []
+
+        sql_data_tuple: tuple = (search_match,)
+        if category:
+            sql_data_tuple += (category,)
+        if mod_type:
+            sql_data_tuple += (mod_type,)
+        sql_data_tuple += (int(limit),)
+
+        return self.db_fetch(
+            self.gamedata_db["db"],
+            self.gamedata_db["db_path"],
+            queries.mod_fts_search(by_category=bool(category), by_type=bool(mod_type)),
+            sql_data_tuple=sql_data_tuple,
+        )
+
+    def get_mod_info(
+        self, mod_id: str, optional_fields: str = "", lower_case: bool = False
+    ) -> list:
+        """Requires mod_id (int), optional_fields (string); returns list.
+        Get full information on a specific mod_id. Defaults to ALL information (SELECT *). Served from the in-memory
+        gamedata catalog, so the result is the same list of row tuples a 'SELECT ... WHERE mod_id=' would give."""
+        logging.info(f"{self.chk} {self.col['y']}[get_mod_info]{self.col['w']}")
 
         logging.info(
-            f"{self.chk} {self.sql_txt} Fetching all details of mod_id:{self.col['g']}{mod_id}{self.col['w']}."
+            f"{self.chk} {self.py_txt} Fetching all details of mod_id:{self.col['g']}{mod_id}{self.col['w']}."
         )
 
-        return_data = self.db_fetch(
-            self.gamedata_db["db"], self.gamedata_db["db_path"], fetch_sql
+        return_data = self.catalog.fetch(
+            mod_id=mod_id, optional_fields=optional_fields, lower_case=lower_case
         )
 
         len_rr = len(return_data)
         logging.info(
-            f"{self.info} {self.sql_txt} Record returned: {self.col['g']}{len_rr}{self.col['w']}"
+            f"{self.info} {self.py_txt} Record returned: {self.col['g']}{len_rr}{self.col['w']}"
+        )
+
+        return return_data
+
+    def get_mod_info_many(
+        self,
+        mod_ids,
+        optional_fields: str = "",
+        lower_case: bool = False,
+        from_db: bool = False,
+    ) -> dict:
+        """Requires mod_ids (list/set/tuple of strings), optional_fields (string); returns dict.
+        Batch version of get_mod_info. Resolves a whole set of mod_ids in one go and returns a dict of
+        {mod_id: tuple of requested fields}. mod_ids that don't exist are left out of the dict.
+        Available Options:
+        mod_ids: the mod_ids to look up. Duplicates are only looked up once
+        optional_fields: comma separated gamedata fields, defaults to ALL (SELECT *)
+        lower_case: True makes the mod_id match case-insensitive. Keys are the mod_ids as requested
+        from_db: True skips the in-memory catalog and uses a single 'WHERE mod_id IN (...)' query instead"""
+        logging.info(f"{self.chk} {self.col['y']}[get_mod_info_many]{self.col['w']}")
+
+        mod_ids = list(dict.fromkeys(mod_ids))
+        if not mod_ids:
+            return {}
+
+        if not from_db:
+            return_data = self.catalog.fetch_many(
+                mod_ids, optional_fields=optional_fields, lower_case=lower_case
+            )
+        else:
+            fields = self.catalog.parse_fields(optional_fields)
+            placeholders = ", ".join("?" for _ in mod_ids)
+            if lower_case:
+                fetch_sql = (
+                    f"SELECT LOWER(mod_id), {', '.join(fields)} FROM gamedata "
+                    f"WHERE LOWER(mod_id) IN ({placeholders})"
+                )
+                requested = {mod_id.lower(): mod_id for mod_id in mod_ids}
+                sql_data_tuple = tuple(requested)
+            else:
+                fetch_sql = f"SELECT mod_id, {', '.join(fields)} FROM gamedata WHERE mod_id IN ({placeholders})"
+                requested = {mod_id: mod_id for mod_id in mod_ids}
+                sql_data_tuple = tuple(mod_ids)
+
+            conn, cursor = self.get_db_connection(
+                db=self.gamedata_db["db"], db_path=self.gamedata_db["db_path"]
+            )
+            self.db_read_count += 1
+            return_data = {}
+            for row in cursor.execute(fetch_sql, sql_data_tuple).fetchall():
+                return_data.setdefault(requested[row[0]], tuple(row[1:]))
+
+        logging.info(
+            f"{self.info} {self.py_txt} Records returned: {self.col['g']}{len(return_data)}{self.col['w']} "
+            f"of {len(mod_ids)} requested"
         )
 
         return return_data
@@ -1554,18 +1838,7 @@ class CharacterMethods(UtilityMethods):
         Setting lower_case to True makes the search case-insensitive."""
         logging.info(f"{self.chk} {self.col['y']}[check_mod_exists]{self.col['w']}")
 
-        if lower_case:
-            fetch_sql = f"SELECT * FROM gamedata WHERE LOWER(mod_id)='{mod_id.lower()}'"
-        else:
-            fetch_sql = f"SELECT * FROM gamedata WHERE mod_id='{mod_id}'"
-
-        mod_check = self.db_fetch(
-            db=self.gamedata_db["db"],
-            db_path=self.gamedata_db["db_path"],
-            fetch_sql=fetch_sql,
-            lower_case=True,
-        )
-        if mod_check:
+        if self.catalog.exists(mod_id=mod_id, lower_case=lower_case):
             logging.info(
                 f"{self.chk} Mod ID:{self.col['y']}{mod_id} {self.col['g']}EXISTS{self.col['w']} "
             )
@@ -1579,8 +1852,7 @@ class CharacterMethods(UtilityMethods):
     def get_mod_name(self, mod_id: str) -> str:
         """Requires: mod_id (str); returns str
         Simple method to return a mod_id's name. That's it."""
-        mod_name_search = self.get_mod_info(mod_id=mod_id, optional_fields="name")
-        mod_name = mod_name_search[0][0]
+        mod_name = self.catalog.get(mod_id).name
         logging.info(f"{self.chk} Mod name:{self.col['g']}{mod_name}{self.col['w']}")
 
         return mod_name
@@ -1598,16 +1870,30 @@ class CharacterMethods(UtilityMethods):
             char = self.char
 
         additional_mods: dict = {}
+        location_mod_ids: dict = {}
+        for mod_location in mods_dict:
+            if type(mods_dict[mod_location]) is dict:
+                location_mod_ids[mod_location] = mods_dict[mod_location]["mod_id"]
+            else:
+                location_mod_ids[mod_location] = mods_dict[mod_location]
+
+        # Look up all the mod_ids in one go
+        existing_mods = self.get_mod_info_many(
+            [
+                location_mod_ids[mod_location]
+                for mod_location in mods_dict
+                if mod_location in char.nodes
+            ],
+            optional_fields="mod_id",
+            lower_case=True,
+        )
+
         for mod_location in mods_dict:
             # Check if mod_id and mod_location exist
             if mod_location in char.nodes:
-                if type(mods_dict[mod_location]) is dict:
-                    mod_id = mods_dict[mod_location]["mod_id"]
-                else:
-                    mod_id = mods_dict[mod_location]
+                mod_id = location_mod_ids[mod_location]
 
-                mod_exists = self.check_mod_exists(mod_id=mod_id, lower_case=True)
-                if mod_exists:
+                if mod_id in existing_mods:
                     additional_mods[mod_location] = mods_dict[mod_location]
                 else:
                     logging.error(
@@ -1629,20 +1915,14 @@ class CharacterMethods(UtilityMethods):
         Produce a dict with relevant mods of (mod_id: name)"""
         logging.info(f"{self.chk} {self.col['y']}[get_mod_selection]{self.col['w']}")
 
-        if optional_fields:
-            select_range = optional_fields
-        else:
-            select_range = "*"
-
-        fetch_sql = f"SELECT {select_range} FROM gamedata WHERE category='{mod_category}' AND type='{mod_type}'"
         logging.info(
-            f"{self.chk} {self.sql_txt} Fetching all mod_ids and names where category:"
+            f"{self.chk} {self.py_txt} Fetching all mod_ids and names where category:"
             f"{self.col['g']}{mod_category}{self.col['w']} and mod_type:{self.col['g']}{mod_type}{self.col['w']}."
         )
 
-        fetched_data = self.db_fetch(
-            self.gamedata_db["db"], self.gamedata_db["db_path"], fetch_sql
-        )
+        fetched_data: list = []
+        for mod_id in self.catalog.mod_ids_by_category_type(mod_category, mod_type):
+            fetched_data += self.catalog.fetch(mod_id, optional_fields=optional_fields)
 
         if len(fetched_data) > 1:
             return_data = fetched_data
@@ -1702,18 +1982,16 @@ class CharacterMethods(UtilityMethods):
             f"{self.chk} {self.py_txt} Checking any/all requirements prereqs/restrictions of "
             f"mod_id:{self.col['g']}{mod_id}{self.col['w']}."
         )
-        main_mod = self.get_mod_info(
-            mod_id, optional_fields="prereq_any, restriction_any"
-        )
+        main_mod = self.catalog.get(mod_id)
         mod_preq = False
         mod_rest = False
         mod_preq_aa = f"{self.col['r']}ALL (False)"
         mod_rest_aa = f"{self.col['r']}ALL (False)"
 
-        if main_mod[0][0]:
+        if main_mod.prereq_any:
             mod_preq = True
             mod_preq_aa = f"{self.col['y']}ANY (True)"
-        if main_mod[0][1]:
+        if main_mod.restriction_any:
             mod_rest = True
             mod_rest_aa = f"{self.col['y']}ANY (True)"
 
@@ -1757,14 +2035,13 @@ class CharacterMethods(UtilityMethods):
         Mini method for checking if a mod_id is present in a list of mod_ids"""
         logging.info(f"{self.chk} {self.col['y']}[multi_check]{self.col['w']}")
         # TODO: Work out if we can delete check_len from this method... or at least actually use it!
-        count = 0
-        for x in mod_list:
-            mod_check = self.check_mod_in_list(x, char_mods)
-            if mod_check:
-                logging.info(
-                    f"{self.chk} {self.py_txt} mod_id {self.col['g']}IS{self.col['w']} found in list!"
-                )
-                count += 1
+        # One set intersection rather than a list search per mod_id
+        found_mods = set(mod_list).intersection(char_mods)
+        count = len(found_mods)
+        if found_mods:
+            logging.info(
+                f"{self.chk} {self.py_txt} mod_id(s) {self.col['g']}{found_mods}{self.col['w']} found in list!"
+            )
 
         # if check_len == count:
         if count > 0:
@@ -1779,7 +2056,7 @@ class CharacterMethods(UtilityMethods):
             return False
 
     def get_prereqs_restrictions(self, mod_id: str) -> tuple:
-        """Requires mod_id (string); returns tuple of lists with Prerequisites at [0] and Restrictions at [1].
+        """Requires mod_id (string); returns tuple of tuples with Prerequisites at [0] and Restrictions at [1].
         This makes a list of the prerequisite or restriction mods_ids (if any) for a specified mod_id"""
         logging.info(
             f"{self.chk} {self.col['y']}[get_prereqs_restrictions]{self.col['w']}"
@@ -1789,9 +2066,9 @@ class CharacterMethods(UtilityMethods):
             f"{self.chk} {self.py_txt} Compiling Prerequisite/Restriction mod list for "
             f"mod_id:{self.col['g']}{mod_id}{self.col['w']}."
         )
-        return_data = self.get_mod_info(mod_id, optional_fields="prereqs, restriction")
-        pre1 = self.split_string_list_to_true_list(return_data[0][0])
-        res2 = self.split_string_list_to_true_list(return_data[0][1])
+        # Parsed once when the catalog loads
+        pre1 = self.catalog.get_prereqs(mod_id)
+        res2 = self.catalog.get_restrictions(mod_id)
 
         pr_tuple = (pre1, res2)
         logging.info(
@@ -1998,19 +2275,46 @@ class CharacterMethods(UtilityMethods):
                         )
                         return True
 
-    def check_preq_restrict_all(self, mod_id: str, char_mods: list) -> tuple:
+    def get_char_mods_bits(self, char_mods: list) -> int:
+        """Requires char_mods (list); returns int.
+        The character's mods as a bitset for the bitset rule evaluator (see ModRuleIndex). Work this out once and
+        pass it to check_mod_allowed as char_bits when checking many mods against the same char_mods."""
+        return self.catalog.get_rule_index().mask(char_mods)
+
+    def check_preq_restrict_all(
+        self, mod_id: str, char_mods: list, mod_info: tuple = (), char_bits: int = None
+    ) -> tuple:
         """Requires mod_id (string), char_mods (dict); returns tuple.
         Checks that ALL prerequisites or restrictions are met for a mod_id. ANY is already done as that is a
         single test. Returns (True, True) if all passed.
+        mod_info can optionally hold the mod's gamedata fields (self.mod_allowed_fields) already fetched with
+        get_mod_info_many, which saves looking them up again.
+        char_bits can optionally hold get_char_mods_bits(char_mods) for the bitset rule evaluator.
         """
         logging.info(
             f"{self.chk} {self.col['y']}[check_preq_restrict_all]{self.col['w']}"
         )
 
+        # The bitset evaluator only knows the mods in the catalog. Anything else goes the long way round
+        if self.rule_evaluator == "bitset" and mod_id in self.catalog:
+            rule_index = self.catalog.get_rule_index()
+            if char_bits is None:
+                char_bits = rule_index.mask(char_mods)
+            return_data = rule_index.check(mod_id, char_bits)
+
+            logging.info(
+                f"{self.chk} {self.py_txt} {mod_id} has returned "
+                f"{self.col['g']}{return_data}{self.col['w']} for Prerequisites AND Restrictions."
+            )
+            return return_data
+
         # Returns True if ANY, and False if ALL.  [0] = Preq, [1] Restriction.
-        any_mod = self.check_any_all(mod_id)
+        if mod_info:
+            any_mod = (bool(mod_info[1]), bool(mod_info[3]))
+        else:
+            any_mod = self.check_any_all(mod_id)
 
-        # Returns list of mod_ids [0] = Preq, [1] Restriction.
+        # Returns tuple of mod_ids [0] = Preq, [1] Restriction.
         mod_list = self.get_prereqs_restrictions(mod_id)
 
         # These next two together return an AND gate. If A+B=True proceed, else fail.
@@ -2083,11 +2387,6 @@ class CharacterMethods(UtilityMethods):
         if not char:
             char = self.char
 
-        # DB info for searches
-        db = self.gamedata_db["db"]
-        db_path = self.gamedata_db["db_path"]
-        table = "gamedata"
-
         # Get character's current mods as a list
         char_mods: list = self.get_char_current_mods(char=char, cli_print=cli_print)
         char_breed: str = getattr(char, "breed", "")
@@ -2095,105 +2394,123 @@ class CharacterMethods(UtilityMethods):
         # Load the full list of a character's locations and current nodes into a dict
         # free_locations: list = self.get_char_free_nodes(char=char, cli_print=cli_print)
 
-        nm = self.nm
-        node_info: dict = getattr(nm, node_location)
+        # The candidates only depend on the gamedata and NodeMap, so they are worked out once (see
+        # get_node_candidates) and only the character's filter runs here. A node with nothing to search returns None
+        candidates = self.get_node_candidates(
+            node_location, include_extra=include_extra
+        )
         node_name = self.get_node_location_name(node_location)
+        if candidates is None:
+            return None
+
+        return self._filter_for_check_mods_by_node(
+            node_name=node_name,
+            search_results=candidates,
+            char_mods=char_mods,
+            char_breed=char_breed,
+            override=override,
+            cli_print=cli_print,
+        )
+
+    def build_node_candidates(self, node_info: dict) -> tuple:
+        """Requires node_info (dict); returns tuple of (candidates, candidates including 'extra' types).
+        Works out the mod_ids that can go in a NodeMap entry, as the SQL searches check_mods_by_node used to run:
+        mods of the node's category with one of its types (sorted by type), or if it has no types, mods of the
+        node's category named in its mod fields (skl, cyb, bio etc., sorted by mod_id). Either is None if the node
+        has nothing to search."""
+        nm = self.nm
         node_cat = node_info["category"]
-        search_type_list_raw: list = []
-        search_mod_list_raw: list = []
-        search_type_list: list = []
-        search_mod_list: list = []
-        # Compile search criteria
+        search_types: list = []
+        search_types_extra: list = []
+        search_mods: list = []
         for field in node_info:
             if field in nm.node_map_types:
-                search_type_list_raw.append(node_info[field])
+                search_types.extend(node_info[field])
             elif field in nm.node_mod_types:
-                search_mod_list_raw.append(node_info[field])
+                search_mods.extend(node_info[field])
             elif field in nm.node_map_types_extra:
-                if include_extra:
-                    search_type_list_raw.append(node_info[field])
-            elif field == "name":
-                pass
-            elif field == "category":
-                pass
-            elif field == "cxn":
-                pass
-            elif field == "req":
-                pass
-            else:
-                logging.error(
-                    f"{self.cross} {self.err_txt} Unknown field type of {field}"
+                search_types_extra.extend(node_info[field])
+
+        by_mod_id = None
+        if search_mods:
+            by_mod_id = tuple(
+                sorted(
+                    {
+                        mod_id
+                        for mod_id in search_mods
+                        if mod_id in self.catalog
+                        and self.catalog.get(mod_id).category == node_cat
+                    }
                 )
+            )
 
-        # We will have one or more sub-lists that we need to organise into single lists
-        count = 0
-        for x in search_type_list_raw:
-            for x2 in search_type_list_raw[count]:
-                search_type_list.append(x2)
-            count += 1
+        candidates: list = []
+        for types in (search_types, search_types + search_types_extra):
+            if types:
+                candidates.append(
+                    tuple(
+                        mod_id
+                        for mod_type in sorted(set(types))
+                        for mod_id in self.catalog.mod_ids_by_category_type(
+                            node_cat, mod_type
+                        )
+                    )
+                )
+            else:
+                candidates.append(by_mod_id)
 
-        count = 0
-        for y in search_mod_list_raw:
-            for y2 in search_mod_list_raw[count]:
-                search_mod_list.append(y2)
-            count += 1
+        return tuple(candidates)
 
-        # Prepare the SQL for searches for mods by category AND type:
-        search_str_1: str = ""
-        for mod_type in search_type_list:
-            if not search_str_1:
-                search_str_1 = f"SELECT mod_id FROM gamedata WHERE category='{node_cat}' AND (type='{mod_type}'"
-            else:
-                search_str_1 = f"{search_str_1} OR type='{mod_type}'"
-        if search_str_1:
-            search_str_1 = f"{search_str_1}) ORDER BY type"
-
-        # Prepare the SQL for searches for mods by category AND mod_id:
-        search_str_2: str = ""
-        for mod_id in search_mod_list:
-            if not search_str_2:
-                search_str_2 = f"SELECT mod_id FROM gamedata WHERE category='{node_cat}' AND (mod_id='{mod_id}'"
-            else:
-                search_str_2 = f"{search_str_2} OR mod_id='{mod_id}'"
-        if search_str_2:
-            search_str_2 = f"{search_str_2}) ORDER BY mod_id"
-
-        # Perform the searches
-        if search_str_1:
-            raw_search_1 = self.db_fetch(db=db, db_path=db_path, fetch_sql=search_str_1)
-            search_results_1 = self._filter_for_check_mods_by_node(
-                node_name=node_name,
-                search_results=raw_search_1,
-                char_mods=char_mods,
-                char_breed=char_breed,
-                override=override,
-                cli_print=cli_print,
+    def get_node_candidates(self, node_location: str, include_extra: bool = False):
+        """Requires node_location (str); returns tuple (or None).
+        The candidate mod_ids for node_location, before any character filter. The index of every node in the
+        NodeMap is built on first use and again after the catalog reloads.
+        Available Options:
+        include_extra: True adds the mods of the node's 'extra' types"""
+        logging.info(f"{self.chk} {self.col['y']}[get_node_candidates]{self.col['w']}")
+
+        if (
+            not self.catalog.loaded
+            or self.node_candidates_load != self.catalog.load_count
+        ):
+            node_candidates: dict = {}
+            searched_fields = set(
+                self.nm.node_map_types
+                + self.nm.node_map_types_extra
+                + self.nm.node_mod_types
+                + ["name", "category", "cxn", "req"]
             )
-            return search_results_1
+            unknown_fields: set = set()
+            for location, node_info in self.nm_dict.items():
+                if isinstance(node_info, dict) and "category" in node_info:
+                    node_candidates[location] = self.build_node_candidates(node_info)
+                    unknown_fields.update(set(node_info) - searched_fields)
+            if unknown_fields:
+                logging.info(
+                    f"{self.chk} {self.py_txt} NodeMap fields not searched for candidate mods: {unknown_fields}"
+                )
 
-        if search_str_2:
-            raw_search_2 = self.db_fetch(db=db, db_path=db_path, fetch_sql=search_str_2)
-            search_results_2 = self._filter_for_check_mods_by_node(
-                node_name=node_name,
-                search_results=raw_search_2,
-                char_mods=char_mods,
-                char_breed=char_breed,
-                override=override,
-                cli_print=cli_print,
+            self.node_candidates = node_candidates
+            self.node_candidates_load = self.catalog.load_count
+
+        if node_location not in self.node_candidates:
+            self.node_candidates[node_location] = self.build_node_candidates(
+                getattr(self.nm, node_location)
             )
-            return search_results_2
+
+        return self.node_candidates[node_location][1 if include_extra else 0]
 
     def _filter_for_check_mods_by_node(
         self,
         node_name: str,
-        search_results: dict,
+        search_results: tuple,
         char_mods: list = list,
         char_breed: str = "",
         override: bool = False,
         cli_print: bool = False,
     ) -> list:
-        """Simple method to filter mods available to a node_name searched by check_mods_by_node, and filtered by mods
-        the character has (char_mods). Returns a list of all the filtered mod_ids."""
+        """Simple method to filter the candidate mod_ids (search_results) for a node_name from check_mods_by_node, by
+        the mods the character has (char_mods). Returns a list of all the filtered mod_ids."""
         if override:
             if cli_print:
                 print(
@@ -2202,9 +2519,21 @@ class CharacterMethods(UtilityMethods):
                     f"{self.col['w']}{node_name}{self.col['g']} slot...{self.col['w']}"
                 )
 
+        # The bitset rule evaluator checks every candidate against the same char_bits. The list evaluator needs
+        # the Prerequisite/Restriction/Multiple fields for every candidate, so fetch them in one go
+        mods_info: dict = {}
+        char_bits = None
+        if not override:
+            if self.rule_evaluator == "bitset":
+                char_bits = self.get_char_mods_bits(char_mods)
+            else:
+                mods_info = self.get_mod_info_many(
+                    list(search_results),
+                    optional_fields=self.mod_allowed_fields,
+                )
+
         master_mod_list: list = []
-        for mod_set in search_results:
-            check_mod_id = mod_set[0]
+        for check_mod_id in search_results:
             # Now filter out any that clash due to Restrictions or Prerequisites and Allow Multiples
             if not override:
                 breed_locked = self.check_if_breed_mod(
@@ -2212,7 +2541,10 @@ class CharacterMethods(UtilityMethods):
                 )
                 if not breed_locked:
                     mod_allowed = self.check_mod_allowed(
-                        mod_id=check_mod_id, char_mods=char_mods
+                        mod_id=check_mod_id,
+                        char_mods=char_mods,
+                        mod_info=mods_info.get(check_mod_id, ()),
+                        char_bits=char_bits,
                     )
                     if mod_allowed:
                         # Possibly add to master_mod_list
@@ -2221,7 +2553,7 @@ class CharacterMethods(UtilityMethods):
                             logging.info(
                                 f"{self.chk}{self.col['g']}{check_mod_id} is allowed!{self.col['w']}"
                             )
-                            master_mod_list.append(mod_set[0])
+                            master_mod_list.append(check_mod_id)
                         else:
                             # Don't add it to master_mod_list
                             logging.info(
@@ -2239,7 +2571,7 @@ class CharacterMethods(UtilityMethods):
                         f"allowed!{self.col['w']}"
                     )
             else:
-                master_mod_list.append(mod_set[0])
+                master_mod_list.append(check_mod_id)
 
         if master_mod_list:
             if cli_print:
@@ -2258,82 +2590,503 @@ class CharacterMethods(UtilityMethods):
         if not char:
             char = self.char
 
-        # Load the full list of a character's locations and current nodes into a dict
-        char_locations: dict = char.nodes
-
         if cli_print:
             print(
                 f"{self.info} {self.col['y']}Generating a list of all free slots for "
                 f"{self.col['w']}{self.string_pretty(char.char_name)}{self.col['y']}..."
             )
 
-        # Make a list of all the available (empty locations) for the character:
-        unfiltered_free_locations: list = []
-        free_locations: list = []
-        filled_locations: list = []
-        for x in char_locations:
-            if char_locations[x]:
+        # Free = empty, connected to a filled node (or an entry node), not closed and with its req met. The
+        # frontier is only rebuilt if char.nodes has changed other than through apply/remove_mod_from_character
+        frontier = self.get_free_node_frontier(char=char)
+        free_locations: list = frontier.free_nodes()
+
+        logging.info(
+            f"{self.chk} {self.py_txt} {self.col['y']}Character current FREE LOCATIONS: "
+            f"{free_locations}{self.col['w']}"
+        )
+
+        return free_locations
+
+    def get_free_node_frontier(self, char: CharacterModel = None) -> FreeNodeFrontier:
+        """Requires: char (CharacterModel); returns FreeNodeFrontier.
+        The free nodes of the character being built. apply_mod_to_character and remove_mod_from_character update
+        the frontier as they go, so it is only rebuilt from the NodeGraph when it doesn't match char.nodes (a
+        different character, or nodes changed some other way, e.g. loading or importing)."""
+        logging.info(
+            f"{self.chk} {self.col['y']}[get_free_node_frontier]{self.col['w']}"
+        )
+        if not char:
+            char = self.char
+
+        frontier = self.free_node_frontier
+        if frontier is None or not frontier.in_sync(char.nodes):
+            graph = self.get_node_graph()
+            unknown_locations = [x for x in char.nodes if x not in graph]
+            if unknown_locations:
                 logging.info(
-                    f"{self.chk} {self.py_txt} {self.col['b']}Filled Slot: {x}{self.col['w']}"
+                    f"{self.chk} {self.py_txt} Character locations not in the NodeMap are never free: "
+                    f"{unknown_locations}"
                 )
-                filled_locations.append(x)
-            else:
-                logging.info(
-                    f"{self.chk} {self.py_txt} {self.col['y']}Unfiltered Free Slot: {x}{self.col['w']}"
+            frontier = FreeNodeFrontier(graph, char.nodes)
+            self.free_node_frontier = frontier
+
+        return frontier
+
+    def get_node_graph(self) -> NodeGraph:
+        """Returns the NodeMap compiled to a NodeGraph (int ids, forward/reverse adjacency sets, entry and req
+        nodes), building it on first use. The NodeMap is never changed at runtime, so it is only built once."""
+        if self.node_graph is None:
+            self.node_graph = NodeGraph(self.nm_dict)
+
+        return self.node_graph
+
+    def get_build_planner(self) -> BuildPlanner:
+        """Returns the BuildPlanner for plan_build, building it on first use and again after the catalog reloads."""
+        logging.info(f"{self.chk} {self.col['y']}[get_build_planner]{self.col['w']}")
+
+        if (
+            self.build_planner is None
+            or not self.catalog.loaded
+            or self.build_planner_load != self.catalog.load_count
+        ):
+            graph = self.get_node_graph()
+            node_candidates: dict = {}
+            for node_id, location in enumerate(graph.names):
+                candidates = self.get_node_candidates(location)
+                if candidates:
+                    node_candidates[node_id] = candidates
+            tp_costs: dict = {}
+            for mod_id, effects in self.catalog.effects.items():
+                if effects and ("tp_spent" in effects or "tp_bonus" in effects):
+                    tp_costs[mod_id] = int(effects.get("tp_spent", 0)) - int(
+                        effects.get("tp_bonus", 0)
+                    )
+
+            self.build_planner = BuildPlanner(
+                graph, node_candidates, tp_costs, self.catalog.get_rule_index()
+            )
+            self.build_planner_load = self.catalog.load_count
+            self.build_planner_locked = {}
+
+        return self.build_planner
+
+    def get_breed_locked_nodes(self, char_breed: str) -> dict:
+        """Requires: char_breed (str); returns dict.
+        {node id: breed locked mod_ids} of a breed for the BuildPlanner, worked out once per breed (and again after
+        the catalog reloads)."""
+        planner = self.get_build_planner()
+        if char_breed not in self.build_planner_locked:
+            # check_mods_by_node checks breed locks by the node's name
+            breed_dict = self._breed_match(breed=char_breed)
+            locked: dict = {}
+            if breed_dict:
+                for node_id, location in enumerate(planner.graph.names):
+                    node_name = self.get_node_location_name(location)
+                    if node_name in breed_dict:
+                        locked[node_id] = breed_dict[node_name]
+            self.build_planner_locked[char_breed] = locked
+
+        return self.build_planner_locked[char_breed]
+
+    def plan_build(
+        self,
+        mod_id: str,
+        char: CharacterModel = None,
+        max_steps: int = 12,
+        max_searched: int = 1000,
+    ):
+        """Requires: mod_id (str), char (CharacterModel); returns BuildPlan (or None).
+        What the character needs to take to unlock mod_id: the cheapest (Talent Points) sequence of
+        (node location, mod_id) placements, each one allowed by check_mods_by_node at that point, ending with mod_id.
+        An empty plan means the character already has it, None that it can't be reached in max_steps placements.
+        Nothing is applied to the character. See build_planner.py"""
+        logging.info(f"{self.chk} {self.col['y']}[plan_build]{self.col['w']}")
+        if not char:
+            char = self.char
+
+        planner = self.get_build_planner()
+        plan = planner.plan(
+            char_nodes=char.nodes,
+            char_mods=self.get_char_current_mods(char=char, cli_print=False),
+            target=mod_id,
+            locked=self.get_breed_locked_nodes(char_breed=getattr(char, "breed", "")),
+            max_steps=max_steps,
+            max_searched=max_searched,
+        )
+
+        if plan is None:
+            logging.info(
+                f"{self.chk} {self.py_txt} {self.col['r']}No way to {mod_id}{self.col['w']} found for "
+                f"{char.char_name} in {max_steps} placements."
+            )
+        else:
+            logging.info(
+                f"{self.chk} {self.py_txt} {self.col['g']}{mod_id}{self.col['w']} for {char.char_name} in "
+                f"{len(plan.placements)} placements costing {plan.tp_cost} TP: {plan.placements}"
+            )
+
+        return plan
+
+    def explore_builds(
+        self,
+        objective: dict,
+        char: CharacterModel = None,
+        tp_budget: int = None,
+        max_placements: int = 4,
+        beam_width: int = 64,
+        top_n: int = 10,
+        max_children: int = 32,
+        workers: int = 1,
+        seed: int = 0,
+    ):
+        """Requires: objective (dict), char (CharacterModel), tp_budget (int), max_placements (int), beam_width (int),
+        top_n (int), max_children (int), workers (int), seed (int); yields tuple.
+        Searches the legal builds of char (placements check_mods_by_node would offer, costing at most tp_budget TP,
+        by default the character's unspent TP) for the ones with the highest objective score, the sum of
+        {stat: weight} over their compiled stats. Yields the top_n builds (ExploredBuild, best first) found so far
+        after each of up to max_placements placements. workers > 1 shares the search across that many processes;
+        the same seed gives the same builds whatever the number of workers. Nothing is applied to the character.
+        See build_explorer.py"""
+        logging.info(f"{self.chk} {self.col['y']}[explore_builds]{self.col['w']}")
+        if not char:
+            char = self.char
+        if tp_budget is None:
+            tp_budget = char.tp_unspent
+
+        explorer = BuildExplorer(
+            planner=self.get_build_planner(),
+            base_char=char,
+            char_mods=self.get_char_current_mods(char=char, cli_print=False),
+            locked=self.get_breed_locked_nodes(char_breed=getattr(char, "breed", "")),
+            objective=objective,
+            tp_budget=tp_budget,
+            compile_stats=self.compile_mod_stats_many,
+            max_children=max_children,
+            seed=seed,
+        )
+        self.build_explorer = explorer
+        logging.info(
+            f"{self.chk} {self.py_txt} Exploring builds of {self.col['g']}{char.char_name}{self.col['w']} for "
+            f"{objective} with {tp_budget} TP, starting from a score of {explorer.base_score}."
+        )
+
+        yield from explorer.search(
+            max_placements=max_placements,
+            beam_width=beam_width,
+            top_n=top_n,
+            workers=workers,
+        )
+
+    def get_character_generator(self) -> RandomCharacterGenerator:
+        """Returns the RandomCharacterGenerator for generate_random_characters, building it on first use and again
+        after the catalog reloads. Trait weights are the number of times random_traits.xlsx names each trait."""
+        logging.info(
+            f"{self.chk} {self.col['y']}[get_character_generator]{self.col['w']}"
+        )
+        planner = self.get_build_planner()
+
+        if (
+            self.character_generator is None
+            or self.character_generator_load != self.catalog.load_count
+        ):
+            categories: dict = {}
+            trait_ids: dict = {}
+            for mod_id, record in self.catalog.records.items():
+                categories[mod_id] = record.category
+                if record.category == "trait":
+                    trait_ids.setdefault(
+                        (record.name.strip().lower(), record.type), mod_id
+                    )
+
+            trait_weights: dict = {}
+            unknown_traits: list = []
+            for name, trait_type in read_random_traits(
+                self.gamedata_db["db_path"] + self.bscm.random_traits_xlsx
+            ):
+                mod_id = trait_ids.get((name.lower(), trait_type))
+                if mod_id:
+                    trait_weights[mod_id] = trait_weights.get(mod_id, 0) + 1
+                else:
+                    unknown_traits.append(name)
+            if unknown_traits:
+                logging.warning(
+                    f"{self.cross} {self.py_txt} Traits in {self.bscm.random_traits_xlsx} that aren't in gamedata "
+                    f"are never picked: {unknown_traits}"
+                )
+
+            # Mods with an effect compile_chars can't apply (text for a number stat, or a stat the LiveCharacterModel
+            # doesn't have) are gamedata errors, so they are never picked
+            defaults = self.get_live_char_defaults()
+            matrix = self.catalog.get_effects_matrix(self.get_live_char_int_stats())
+            excluded: set = set()
+            for mod_id, effects in matrix.other_effects.items():
+                for stat, value in effects.items():
+                    if stat != "replace_text" and (
+                        stat not in defaults
+                        or type(defaults[stat]) is int
+                        and not str(value).lstrip("-").isdigit()
+                    ):
+                        excluded.add(mod_id)
+            if excluded:
+                logging.warning(
+                    f"{self.cross} {self.py_txt} Mods with effects that can't be applied are never picked: "
+                    f"{sorted(excluded)}"
+                )
+
+            # Breeds in the breeds_list without a template can't be made
+            templates: dict = {
+                breed: getattr(self.bt, breed)
+                for breed in self.bt.breeds_list
+                if hasattr(self.bt, breed)
+            }
+            # The breed mod's breed_tp_spent and breed_tp_bonus pay for its template, what they don't cover (feral's
+            # template costs 6 TP more than its corrections) comes out of the character's own TP
+            template_costs: dict = {}
+            for breed, template in templates.items():
+                breed_mod = self.bt.breeds_list[breed]
+                breed_effects = self.catalog.effects.get(breed_mod) or {}
+                template_costs[breed] = (
+                    sum(planner.tp_costs.get(mod_id, 0) for mod_id in template.values())
+                    - int(breed_effects.get("breed_tp_spent", 0))
+                    + int(breed_effects.get("breed_tp_bonus", 0))
                 )
-                unfiltered_free_locations.append(x)
 
+            self.character_generator = RandomCharacterGenerator(
+                planner=planner,
+                templates=templates,
+                locked={
+                    breed: self.get_breed_locked_nodes(char_breed=breed)
+                    for breed in templates
+                },
+                locations=CharacterModel.__fields__["nodes"].default,
+                categories=categories,
+                trait_weights=trait_weights,
+                excluded=excluded,
+                template_costs=template_costs,
+            )
+            self.character_generator_load = self.catalog.load_count
+
+        return self.character_generator
+
+    @staticmethod
+    @contextmanager
+    def _gc_paused():
+        """Yields None.
+        Pauses the garbage collector for the 'with' block and then puts it back as it was."""
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            yield
+        finally:
+            if enabled:
+                gc.enable()
+
+    def generate_random_characters(
+        self,
+        count: int,
+        player_id: int,
+        char_type: str = "mook",
+        breed: str = "",
+        traits: int = 3,
+        max_placements: int = 40,
+        seed: int = 0,
+        write_to_db: bool = False,
+        ndjson_stream=None,
+        batch_size: int = 500,
+    ) -> list:
+        """Requires: count (int), player_id (int), char_type (str), breed (str), traits (int), max_placements (int),
+        seed (int), write_to_db (bool), ndjson_stream (text stream), batch_size (int); returns list.
+        Makes count random characters for player_id: [(CharacterModel, LiveCharacterModel)]. Each one has the
+        template of breed (a random breed if not given), traits random traits weighted by random_traits.xlsx and then
+        random legal placements until its tp_create TP are spent (see character_generator.py), and is compiled as
+        compile_many would, batch_size characters at a time. They are given the next free char_ids and
+        live_char_ids. With write_to_db they are all inserted in one transaction, with ndjson_stream each is written
+        to it as a line of JSON: {"char": CharacterModel, "live_char": LiveCharacterModel}, with only the fields that
+        aren't their defaults (parse_obj fills the rest back in). The same seed gives the same characters.
+        self.char/self.live_char are left alone."""
         logging.info(
-            f"{self.chk} {self.py_txt} {self.col['y']}Character current FILLED LOCATIONS: "
-            f"{filled_locations}{self.col['w']}"
+            f"{self.chk} {self.col['y']}[generate_random_characters]{self.col['w']}"
         )
 
-        for empty_loc in unfiltered_free_locations:
-            node_info: dict = getattr(self.nm, empty_loc, {})
-            # Get connection list for cxn_location
-            cxn_list = node_info["cxn"]
-            if cxn_list[0] != "null":
-                if "entry_node" in cxn_list:
-                    logging.info(f"ENTRY NODE FOR {empty_loc}\n{node_info}")
-                    if "req" in node_info:
-                        logging.info(f"Checking if mod_location is allowed")
-                        check_allowed = self.check_prerequisites_for_node(
-                            node_location=empty_loc, char=char
+        player_check = self.pc_exists_by_id(player_id, is_deleted=False, pc="player")
+        if not player_check:
+            logging.error(
+                f"{self.cross} {self.err_txt} {self.col['r']}No player with player_id:{player_id}, so no random "
+                f"characters made.{self.col['w']}"
+            )
+            return []
+        player_name = player_check[0][1]
+
+        if char_type not in self.bscm.valid_char_types:
+            char_type = "character"
+        generator = self.get_character_generator()
+        if breed and breed not in generator.starts:
+            logging.warning(
+                f"{self.cross} {self.py_txt} There is no Breed template for {self.col['r']}{breed}{self.col['w']}, "
+                f"so making random Breeds."
+            )
+            breed = ""
+
+        next_char_id = self.fetch_next_id(id_type="char")
+        next_live_char_id = self.fetch_next_id(id_type="live_char")
+        created: datetime = datetime.now()
+        # Every character starts as an overlay of the same blank one, which is only validated once
+        blank = CharacterModel(
+            char_id=next_char_id,
+            player_id=player_id,
+            char_type=char_type,
+            char_created=created,
+            char_modified=created,
+        )
+        tp_budget: int = blank.tp_create
+        # NDJSON lines only have what is different from these (see non_default_values), most of a LiveCharacterModel's
+        # ~1,000 stats are left as they are and writing them all out takes longer than compiling the character. Only
+        # the stats compile_chars_changes gives a live character are compared
+        char_defaults: dict = CharacterModel(char_id=0, player_id=0).__dict__
+        live_defaults: dict = self.get_live_char_defaults()
+        # A character's nodes are the blank's, with its placements swapped in, so their JSON is the blank's nodes
+        # encoded once with just the placed nodes encoded again rather than all ~540 nodes for every character
+        char_fields: tuple = tuple(field for field in char_defaults if field != "nodes")
+        node_index: dict = {location: i for i, location in enumerate(blank.nodes)}
+        node_keys: list = [f"{dumps(location)}: " for location in blank.nodes]
+        blank_node_entries: list = [
+            key + dumps(mod_id) for key, mod_id in zip(node_keys, blank.nodes.values())
+        ]
+        mod_json: dict = {}
+
+        # Mods with %TEXT% get the placeholder save_user_defined_text gives them, apart from the ones their Breed
+        # names (the Breed mod's replace_text effect, see _mod_effect_updates)
+        text_mods: set = {
+            mod_id
+            for mod_id, record in self.catalog.records.items()
+            if record.choose_text
+        }
+        breed_texts: dict = {}
+        for breed_name, breed_mod in self.bt.breeds_list.items():
+            effects = self.catalog.effects.get(breed_mod) or {}
+            replace_text = effects.get("replace_text")
+            if replace_text:
+                r_node, r_text_id, r_text = replace_text.split("|", maxsplit=3)[:3]
+                breed_texts[breed_name] = {r_node: {r_text_id: r_text.replace(")", "")}}
+
+        generated: list = []
+        with (
+            self.db_transaction(
+                db=self.chardata_db["db"], db_path=self.chardata_db["db_path"]
+            )
+            if write_to_db
+            else nullcontext()
+        ) as cursor:
+            for start in range(0, count, batch_size):
+                # A batch makes thousands of lists and dicts, none of them in a reference cycle, so the garbage
+                # collector is paused while it is made instead of scanning them and every batch before again and again
+                with self._gc_paused():
+                    chars: list = []
+                    builds: list = []
+                    live_char_info: dict = {}
+                    for i in range(start, min(count, start + batch_size)):
+                        built = generator.generate(
+                            rng=random.Random(f"{seed}:{i}"),
+                            breed=breed,
+                            tp_budget=tp_budget,
+                            traits=traits,
+                            max_placements=max_placements,
                         )
-                        if check_allowed:
-                            free_locations.append(empty_loc)
-                            logging.info(
-                                f"{self.chk} {self.py_txt} {self.col['g']}Valid req found for "
-                                f"{self.col['w']}{empty_loc}"
-                            )
-                    else:
-                        free_locations.append(empty_loc)
-                else:
-                    check_cxn = self.check_node_cxn(
-                        node_location=empty_loc, cxn_list=filled_locations
+                        char = overlay_model(blank)
+                        char.char_id = next_char_id + i
+                        char.char_name = f"{char_type.title()}_{char.char_id}"
+                        char.breed = built.breed
+                        char.nodes.update(built.placements)
+                        for location, mod_id in built.placements:
+                            if mod_id in text_mods:
+                                char.text_replace_mods[location] = {
+                                    mod_id: "*Replace This*"
+                                }
+                        char.text_replace_mods.update(breed_texts.get(built.breed, {}))
+                        char.tp_total = (
+                            char.tp_create + char.tp_bonus + char.tp_missions
+                        )
+                        char.tp_unspent = char.tp_total - built.tp_cost
+                        chars.append(char)
+                        builds.append(built)
+                        live_char_info[char.char_id] = (
+                            next_live_char_id + i,
+                            player_name,
+                        )
+
+                    all_changes = self.compile_chars_changes(
+                        chars=chars, live_char_info=live_char_info
                     )
-                    if check_cxn:
-                        if "req" in node_info:
-                            logging.info(f"Checking if mod_location is allowed")
-                            check_allowed = self.check_prerequisites_for_node(
-                                node_location=empty_loc, char=char
+
+                    char_rows: list = []
+                    live_char_rows: list = []
+                    for char, built, changes in zip(chars, builds, all_changes):
+                        changes.update(
+                            tp_total=char.tp_total,
+                            tp_unspent=char.tp_unspent,
+                            char_created=created,
+                            char_modified=created,
+                        )
+                        live_char = self._live_char_from_changes(changes=changes)
+                        generated.append((char, live_char))
+                        if write_to_db:
+                            char_json = self._convert_model_to_dict(
+                                model=char, logging_name=char.char_name
                             )
-                            if check_allowed:
-                                free_locations.append(empty_loc)
-                                logging.info(
-                                    f"{self.chk} {self.py_txt} {self.col['g']}Valid req found for "
-                                    f"{self.col['w']}{empty_loc}"
+                            live_char_json = self._convert_model_to_dict(
+                                model=live_char, logging_name=live_char.char_name
+                            )
+                            char_rows.append(
+                                (
+                                    char.char_id,
+                                    char.char_name,
+                                    char.char_archetype,
+                                    player_id,
+                                    char_type,
+                                    char_json,
+                                    False,
                                 )
-                            else:
-                                pass
-                        else:
-                            free_locations.append(empty_loc)
-                            logging.info(
-                                f"{self.chk} {self.py_txt} {self.col['g']}Valid connection found for "
-                                f"{self.col['w']}{empty_loc}"
+                            )
+                            live_char_rows.append(
+                                (
+                                    live_char.live_char_id,
+                                    char.char_id,
+                                    player_id,
+                                    char.char_name,
+                                    live_char_json,
+                                    False,
+                                )
+                            )
+                        if ndjson_stream is not None:
+                            node_entries = blank_node_entries.copy()
+                            for location, mod_id in built.placements:
+                                n = node_index[location]
+                                encoded = mod_json.get(mod_id)
+                                if encoded is None:
+                                    encoded = mod_json[mod_id] = dumps(mod_id)
+                                node_entries[n] = node_keys[n] + encoded
+                            char_values = non_default_values(
+                                char, char_defaults, fields=char_fields
+                            )
+                            live_values = non_default_values(
+                                live_char, live_defaults, fields=changes
+                            )
+                            ndjson_stream.write(
+                                f'{{"char": {{"nodes": {{{", ".join(node_entries)}}}, '
+                                f"{dumps(char_values, default=str)[1:]}, "
+                                f'"live_char": {dumps(live_values, default=str)}}}\n'
                             )
 
-        return free_locations
+                    if write_to_db:
+                        cursor.executemany(queries.INSERT_CHAR, char_rows)
+                        cursor.executemany(queries.INSERT_LIVE_CHAR, live_char_rows)
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Made {self.col['g']}{len(generated)}{self.col['w']} random characters for "
+            f"player_id:{player_id}, char_ids {next_char_id} to {next_char_id + len(generated) - 1}."
+        )
+        return generated
 
     def check_node_cxn(self, node_location: str, cxn_list: list):
         """Check all connections (CXN) for a node. Is node_location (A) in the CNX set for cxn_location (B)?
@@ -2539,10 +3292,9 @@ class CharacterMethods(UtilityMethods):
         logging.info(
             f"{self.chk} {self.sql_txt} Checking if you are allowed multiple copies of mod_id: '{mod_id}'."
         )
-        return_data = self.get_mod_info(mod_id, optional_fields="allow_multiple")
+        main_mod = self.catalog.get(mod_id)
 
-        # return_data[0][0] contains the required data
-        if return_data[0][0] == 1:
+        if main_mod.allow_multiple == 1:
             logging.info(
                 f"{self.chk} {self.sql_txt} You {self.col['g']}ARE{self.col['w']} allowed multiples of "
                 f"mod_id: '{mod_id}'."
@@ -2555,7 +3307,9 @@ class CharacterMethods(UtilityMethods):
             )
             return False
 
-    def check_mod_allowed(self, mod_id: str, char_mods: list) -> bool:
+    def check_mod_allowed(
+        self, mod_id: str, char_mods: list, mod_info: tuple = (), char_bits: int = None
+    ) -> bool:
         """Requires mod_id (string), char_mods (dict); returns bool.
         Here we check if a character has any/all the prerequisites and restrictions for a specific mod
         Accept mod to be checked in and current list of character_mods
@@ -2563,15 +3317,51 @@ class CharacterMethods(UtilityMethods):
         1. check prerequisites and restrictions -> check_preq_restrict_all
         2. check if mod can be chosen multiple times if it already exists
         If all are True, proceed
+        mod_info can optionally hold the mod's self.mod_allowed_fields from get_mod_info_many.
+        char_bits can optionally hold get_char_mods_bits(char_mods) for the bitset rule evaluator.
+        Answers for mods in the catalog are remembered (see ModAllowedCache) unless memoise_allowed is False.
         """
         logging.info(f"{self.chk} {self.col['y']}[check_mod_allowed]{self.col['w']}")
 
-        logging.info(f"{self.chk} {self.py_txt} Checking if {mod_id} is allowed.")
-        check_mult = True
-        check_pr = self.check_preq_restrict_all(mod_id, char_mods)
-        check_preq = check_pr[0]
-        check_restrict = check_pr[1]
-        if mod_id in char_mods:
+        if not self.memoise_allowed or mod_id not in self.catalog:
+            return self._check_mod_allowed(
+                mod_id, char_mods, mod_info=mod_info, char_bits=char_bits
+            )
+
+        # The answer only depends on which of the mods named in the prerequisites and restrictions the character
+        # has, and on whether it already has more than one copy of the mod
+        rule_index = self.catalog.get_rule_index()
+        if char_bits is None:
+            char_bits = rule_index.mask(char_mods)
+        key = (
+            mod_id,
+            char_bits & rule_index.rule_masks.get(mod_id, 0),
+            list(char_mods).count(mod_id) > 1,
+            self.rule_evaluator,
+        )
+        allowed_cache = self.catalog.allowed_cache
+        allowed = allowed_cache.get(key)
+        if allowed is None:
+            allowed = self._check_mod_allowed(
+                mod_id, char_mods, mod_info=mod_info, char_bits=char_bits
+            )
+            allowed_cache.put(key, allowed)
+
+        return allowed
+
+    def _check_mod_allowed(
+        self, mod_id: str, char_mods: list, mod_info: tuple = (), char_bits: int = None
+    ) -> bool:
+        """Requires mod_id (string), char_mods (dict); returns bool.
+        check_mod_allowed without the memo."""
+        logging.info(f"{self.chk} {self.py_txt} Checking if {mod_id} is allowed.")
+        check_mult = True
+        check_pr = self.check_preq_restrict_all(
+            mod_id, char_mods, mod_info=mod_info, char_bits=char_bits
+        )
+        check_preq = check_pr[0]
+        check_restrict = check_pr[1]
+        if mod_id in char_mods:
             count = 0
             for x in char_mods:
                 if x == mod_id:
@@ -2584,7 +3374,10 @@ class CharacterMethods(UtilityMethods):
                     f"in character_mods, so checking if character is allowed {self.col['y']}MULTIPLE "
                     f"COPIES{self.col['w']} of this mod_id."
                 )
-                check_mult = self.check_allowed_multiple(mod_id)
+                if mod_info:
+                    check_mult = mod_info[4] == 1
+                else:
+                    check_mult = self.check_allowed_multiple(mod_id)
         else:
             logging.info(
                 f"{self.chk} {self.py_txt} {mod_id} {self.col['g']}IS NOT{self.col['w']} "
@@ -2605,36 +3398,19 @@ class CharacterMethods(UtilityMethods):
             )
             return False
 
-    def get_touched_skills(self, mod_id: str) -> list:
-        """Requires mod_id (string); returns list.
-        This method gets a list of all the skills touched by a mod_id. The SQLite db dumps this information out as a
-        STRING rather than a LIST, so we must reconvert it to a LIST before returning it."""
+    def get_touched_skills(self, mod_id: str) -> tuple:
+        """Requires mod_id (string); returns tuple.
+        This method gets a list of all the skills touched by a mod_id. The SQLite db stores this information as a
+        STRING rather than a LIST, so the catalog parses it once when it loads and this returns that tuple."""
         logging.info(f"{self.chk} {self.col['y']}[get_touched_skills]{self.col['w']}")
 
-        clean_list = []
-        logging.info(
-            f"{self.chk} {self.sql_txt} Fetching list of skills TOUCHED by mod_id '{mod_id}'."
-        )
-        return_data = list(self.get_mod_info(mod_id, optional_fields="skills_touched"))
-        # Convert STRING from DB back to LIST
-        list_data = return_data[0][0].strip("][").split(", ")
-
-        # list_data still has an issue in that each entry in enclosed in extra double quotation marks.
-        # We need to remove those
-        for x in list_data:
-            x = x.replace('"', "")
-            clean_list.append(x)
+        clean_list = self.catalog.get_skills_touched(mod_id)
 
         logging.info(
-            f"{self.chk} {self.sql_txt} List of skills {self.col['g']}TOUCHED{self.col['w']}"
+            f"{self.chk} {self.py_txt} List of skills {self.col['g']}TOUCHED{self.col['w']}"
             f" by mod_id '{mod_id}' is \n"
             f"                      {self.col['y']}->{self.col['w']} {clean_list}"
         )
-        return_type = type(clean_list)
-        logging.info(
-            f"{self.chk} {self.py_txt} Data has been successfully been converted back to {return_type} "
-            f"from STRING."
-        )
 
         return clean_list
 
@@ -2649,8 +3425,8 @@ class CharacterMethods(UtilityMethods):
             f"{self.chk} {self.sql_txt} Fetching list of skills and effects "
             f"{self.col['g']}MODIFIED{self.col['w']} by mod_id '{mod_id}'."
         )
-        return_data = self.get_mod_info(mod_id, optional_fields="effects")
-        skills_modded = loads(return_data[0][0])  # Convert STRING from DB back to DICT
+        # Parsed from STRING to DICT once when the catalog loads. Don't modify it!
+        skills_modded = self.catalog.get_effects(mod_id)
         logging.info(
             f"{self.chk} {self.sql_txt} List of skills and effects "
             f"{self.col['g']}MODIFIED{self.col['w']} by mod_id '{mod_id}' is \n"
@@ -3217,6 +3993,8 @@ class CharacterMethods(UtilityMethods):
                 # setattr(char.nodes, mod_location, mod_id)
                 # Add mod_id to the specified node (as in give the character that mod)
                 char.nodes[mod_location] = mod_id
+                if self.free_node_frontier is not None:
+                    self.free_node_frontier.set_node(mod_location, mod_id)
 
                 # From here we have to set custom text for placeholder replacement
                 has_trm = hasattr(char, "text_replace_mods")
@@ -3318,10 +4096,14 @@ class CharacterMethods(UtilityMethods):
         live_char: LiveCharacterModel = None,
         override: bool = False,
         cli_print: bool = False,
+        write_to_db: bool = True,
     ) -> CharacterModel:
         """Requires: mod_id (string), mod_location (string), character (CharacterModel),
-        live_char (LiveCharacterModel); Returns CharacterModel.
-        Removes a single mod from a CharacterModel
+        live_char (LiveCharacterModel), write_to_db (bool); Returns CharacterModel.
+        Removes a single mod from a CharacterModel. If the mod was applied in this session its effects are taken off
+        the live character by delta (see remove_mod_delta), otherwise the live character is rebuilt from every node.
+        Either way it is saved to the DB, unless write_to_db is False: then nothing is written and a rebuild is
+        compiled in memory instead (see compile_live_char)
         """
         logging.info(
             f"{self.chk} {self.col['y']}[remove_mod_from_character]{self.col['w']}"
@@ -3373,6 +4155,8 @@ class CharacterMethods(UtilityMethods):
                 nodes: dict = char.nodes
                 nodes[mod_location] = ""
                 char.nodes = nodes
+                if self.free_node_frontier is not None:
+                    self.free_node_frontier.set_node(mod_location, "")
                 # Remove any user defined text
                 user_defined_text: dict = char.text_replace_mods
                 if mod_location in user_defined_text:
@@ -3380,26 +4164,56 @@ class CharacterMethods(UtilityMethods):
                         mod_id=mod_id, mod_location=mod_location, char=char
                     )
 
-                # Create a new, blank live_character, but don't save it to DB
-                live_char = LiveCharacterModel(
-                    live_char_id=live_char.live_char_id,
-                    char_id=char.char_id,
-                    char_name=char.char_name,
-                    player_id=char.player_id,
-                    player_name=live_char.player_name,
-                    deleted=char.deleted,
-                )
+                if mod_id in char.nodes.values():
+                    # A mod's effects are only applied once, so they stay while another node still has it
+                    logging.info(
+                        f"{self.chk} {self.py_txt} Mod_id:{self.col['y']}{mod_id}{self.col['w']} is still in "
+                        f"another node, so the live character is unchanged."
+                    )
+                elif self.can_remove_mod_delta(
+                    mod_id=mod_id, mod_location=mod_location, live_char=live_char
+                ):
+                    # Take off just this mod's effects, as recorded when it was applied
+                    live_char = self.remove_mod_delta(
+                        mod_id=mod_id, char=char, live_char=live_char
+                    )
+                    if write_to_db:
+                        # Saved just as the full rebuild below saves it
+                        live_char = self.new_or_update_live_char(
+                            char_id=char.char_id,
+                            player_id=char.player_id,
+                            write_to_db=True,
+                            live_char=live_char,
+                        )
+                elif not write_to_db:
+                    # Rebuild the live character from every node without touching the DB
+                    compiled = self.compile_live_char(char=char, live_char=live_char)
+                    compiled.char_created = live_char.char_created
+                    live_char = compiled
+                    live_char = self.housekeeping(
+                        char=char, live_char=live_char, full=True
+                    )
+                else:
+                    # Create a new, blank live_character, but don't save it to DB
+                    live_char = LiveCharacterModel(
+                        live_char_id=live_char.live_char_id,
+                        char_id=char.char_id,
+                        char_name=char.char_name,
+                        player_id=char.player_id,
+                        player_name=live_char.player_name,
+                        deleted=char.deleted,
+                    )
 
-                # Process all the mods for the character
-                char = self.process_char(char=char)
+                    # Process all the mods for the character
+                    char = self.process_char(char=char)
 
-                # Make NEW live_char model in the DB
-                live_char = self.new_or_update_live_char(
-                    char_id=char.char_id,
-                    player_id=char.player_id,
-                    write_to_db=True,
-                    live_char=live_char,
-                )
+                    # Make NEW live_char model in the DB
+                    live_char = self.new_or_update_live_char(
+                        char_id=char.char_id,
+                        player_id=char.player_id,
+                        write_to_db=True,
+                        live_char=live_char,
+                    )
                 if override and not check_breed:
                     override_mod_name = self.get_mod_name(mod_id=mod_id)
                     # Add a note about the override to the LiveCharacter
@@ -3447,6 +4261,187 @@ class CharacterMethods(UtilityMethods):
 
             return char
 
+    def start_what_if(
+        self, char: CharacterModel = None, live_char: LiveCharacterModel = None
+    ) -> WhatIfSession:
+        """Requires: char (CharacterModel), live_char (LiveCharacterModel); returns WhatIfSession.
+        Starts a what-if session over char and live_char: mods applied and removed with what_if_apply and
+        what_if_remove only change the session's copy-on-write overlays, never char, live_char or the DB. The
+        session starts from the effect ledger, dirty stats and free node frontier of the character being built,
+        where they describe char and live_char, so it is as quick to work on as the character itself."""
+        logging.info(f"{self.chk} {self.col['y']}[start_what_if]{self.col['w']}")
+        if not char:
+            char = self.char
+        if not live_char:
+            live_char = self.live_char
+
+        session = WhatIfSession(base_char=char, base_live_char=live_char)
+        if self.effect_ledger is not None and self.effect_ledger.tracks(live_char):
+            session.effect_ledger = self.effect_ledger.fork(session.live_char)
+        if self.dirty_live_char is live_char and self.dirty_stats is not None:
+            session.dirty_stats = set(self.dirty_stats)
+        if self.free_node_frontier is not None and self.free_node_frontier.in_sync(
+            char.nodes
+        ):
+            session.free_node_frontier = self.free_node_frontier.copy()
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Started a what-if session for {self.col['g']}{char.char_name}"
+            f"{self.col['w']}."
+        )
+        return session
+
+    @contextmanager
+    def _what_if_state(self, session: WhatIfSession):
+        """Requires: session (WhatIfSession); yields WhatIfSession.
+        Makes the session's overlays the character being built for the 'with' block, so the usual methods work on
+        them, then stores the state they leave behind in the session and puts the previous character back."""
+        session.check_open()
+        saved = (
+            self.char,
+            self.live_char,
+            self.effect_ledger,
+            self.dirty_live_char,
+            self.dirty_stats,
+            self.free_node_frontier,
+        )
+        self.char = session.char
+        self.live_char = session.live_char
+        self.effect_ledger = session.effect_ledger
+        self.dirty_live_char = session.live_char
+        self.dirty_stats = session.dirty_stats
+        self.free_node_frontier = session.free_node_frontier
+        try:
+            yield session
+        finally:
+            session.char = self.char
+            session.live_char = self.live_char
+            session.effect_ledger = self.effect_ledger
+            if self.dirty_live_char is session.live_char:
+                session.dirty_stats = self.dirty_stats
+            else:
+                session.dirty_stats = None
+            session.free_node_frontier = self.free_node_frontier
+            (
+                self.char,
+                self.live_char,
+                self.effect_ledger,
+                self.dirty_live_char,
+                self.dirty_stats,
+                self.free_node_frontier,
+            ) = saved
+
+    def what_if_apply(
+        self,
+        session: WhatIfSession,
+        mod_id: str,
+        mod_location: str,
+        ignore_pr: bool = False,
+        replace_text: str = "",
+        override: bool = False,
+    ) -> bool:
+        """Requires: session (WhatIfSession), mod_id (str), mod_location (str), ignore_pr (bool), replace_text
+        (str), override (bool); returns bool.
+        apply_mod_to_character for the session's overlays. Returns True if mod_id is now at mod_location."""
+        logging.info(f"{self.chk} {self.col['y']}[what_if_apply]{self.col['w']}")
+
+        with self._what_if_state(session):
+            char = self.apply_mod_to_character(
+                mod_id=mod_id,
+                mod_location=mod_location,
+                char=session.char,
+                live_char=session.live_char,
+                ignore_pr=ignore_pr,
+                replace_text=replace_text,
+                override=override,
+            )
+        applied = char.nodes.get(mod_location) == mod_id
+        if applied:
+            session.changes.append(("apply", mod_id, mod_location))
+
+        return applied
+
+    def what_if_remove(
+        self,
+        session: WhatIfSession,
+        mod_id: str,
+        mod_location: str,
+        override: bool = False,
+    ) -> bool:
+        """Requires: session (WhatIfSession), mod_id (str), mod_location (str), override (bool); returns bool.
+        remove_mod_from_character for the session's overlays, which never writes to the DB. Returns True if
+        mod_location is now empty."""
+        logging.info(f"{self.chk} {self.col['y']}[what_if_remove]{self.col['w']}")
+
+        with self._what_if_state(session):
+            char = self.remove_mod_from_character(
+                mod_id=mod_id,
+                mod_location=mod_location,
+                char=session.char,
+                live_char=session.live_char,
+                override=override,
+                write_to_db=False,
+            )
+        removed = not char.nodes.get(mod_location)
+        if removed:
+            session.changes.append(("remove", mod_id, mod_location))
+
+        return removed
+
+    def what_if_diff(self, session: WhatIfSession, housekeeping: bool = True) -> dict:
+        """Requires: session (WhatIfSession), housekeeping (bool); returns dict.
+        {stat: (base value, what-if value)} for every live character stat the session has changed. With
+        housekeeping True the derived stats (initiative, wound thresholds, lifestyle ...) are brought up to date
+        first, running only the housekeeping stages the session's changes need."""
+        logging.info(f"{self.chk} {self.col['y']}[what_if_diff]{self.col['w']}")
+
+        if housekeeping:
+            with self._what_if_state(session):
+                self.housekeeping(char=session.char, live_char=session.live_char)
+        diff = session.diff()
+
+        logging.info(
+            f"{self.chk} {self.py_txt} What-if session changes {self.col['g']}{len(diff)}{self.col['w']} stats: "
+            f"{sorted(diff)}"
+        )
+        return diff
+
+    def commit_what_if(self, session: WhatIfSession) -> tuple:
+        """Requires: session (WhatIfSession); returns tuple.
+        Saves the session's character to the DB (see save_complete_character) in a single transaction, makes it the
+        character being built and closes the session. Returns (char, live_char)."""
+        logging.info(f"{self.chk} {self.col['y']}[commit_what_if]{self.col['w']}")
+        session.check_open()
+
+        char = session.char
+        live_char = session.live_char
+        logging.info(
+            f"{self.chk} {self.py_txt} Committing {len(session)} what-if changes for {self.col['g']}"
+            f"{char.char_name}{self.col['w']}: {session.changes}"
+        )
+        with self.db_transaction(
+            db=self.chardata_db["db"], db_path=self.chardata_db["db_path"]
+        ):
+            self.save_complete_character(char=char, live_char=live_char)
+
+        self.effect_ledger = session.effect_ledger
+        self.dirty_live_char = live_char
+        self.dirty_stats = session.dirty_stats
+        self.free_node_frontier = session.free_node_frontier
+        session.close()
+
+        return self.char, self.live_char
+
+    def discard_what_if(self, session: WhatIfSession) -> None:
+        """Requires: session (WhatIfSession); returns None.
+        Closes the session without saving anything. Nothing else was ever changed, so there is nothing to undo."""
+        logging.info(f"{self.chk} {self.col['y']}[discard_what_if]{self.col['w']}")
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Discarding {len(session)} what-if changes: {session.changes}"
+        )
+        session.close()
+
     def applied_mods_check(
         self, mod_id: str, live_char: LiveCharacterModel = None, invert: bool = False
     ) -> bool:
@@ -3501,41 +4496,6 @@ class CharacterMethods(UtilityMethods):
 
         return mod_continue
 
-    def _replace_live_text_placeholder(
-        self,
-        mod_id: str,
-        mod_location: str,
-        live_char: LiveCharacterModel = None,
-        base_text: str = "",
-    ) -> str:
-        """This method is a simple utility method that replaces %TEXT% in mod_id information with the contents of
-        base_text"""
-        logging.info(
-            f"{self.chk} {self.col['y']}[_replace_live_text_placeholder]{self.col['w']}"
-        )
-        if not live_char:
-            live_char = self.live_char
-
-        user_defined_text = self._check_mod_for_user_defined_text(mod_id=mod_id)
-        if user_defined_text:
-            logging.info(
-                f"{self.chk} {self.py_txt} {self.col['g']}REPLACING{self.col['w']} placeholder "
-                f"%TEXT% with live_character:{self.col['g']}'{base_text}'{self.col['w']}."
-            )
-            # text_replace_mods:{"mod_location": {"mod_id": "replacement_text"}
-            # e.g. 'To be decided'
-            replacement_text = live_char.text_replace_mods[mod_location][mod_id]
-            replacement_text = self.string_pretty(replacement_text)
-            # replaces %TEXT% with e.g. 'To be decided'
-            return_text = base_text.replace("%TEXT%", replacement_text)
-            return return_text
-        else:
-            logging.info(
-                f"{self.chk} {self.py_txt} {self.col['y']}NO placeholder %TEXT% replacement required.{self.col['w']}"
-            )
-            return_text = base_text
-            return return_text
-
     def write_all_mod_touched_entries(
         self, mod_id: str, touched_skills: list, live_char: LiveCharacterModel = None
     ) -> LiveCharacterModel:
@@ -3566,8 +4526,15 @@ class CharacterMethods(UtilityMethods):
         if not live_char:
             live_char = self.live_char
 
-        mod_name = self.get_mod_name(mod_id=mod_id)
         ts_name = touched_skill + "_touched_by"
+        if ts_name not in live_char.__fields__:
+            # e.g. 'rank_list' or 'null', which have nothing to show a _touched_by entry in
+            logging.info(
+                f"{self.chk} {self.py_txt} No {self.col['y']}{ts_name}{self.col['w']} entry, so skipping..."
+            )
+            return live_char
+
+        mod_name = self.get_mod_name(mod_id=mod_id)
         touched_by = getattr(live_char, ts_name, None)
         if touched_by:
             touched_by = str(touched_by) + f", {mod_name}"
@@ -3605,6 +4572,13 @@ class CharacterMethods(UtilityMethods):
         )
         # Show all the touched skills
         touched_skills = self.get_touched_skills(mod_id=mod_id)
+        skills = self.get_modded_skills(mod_id=mod_id)
+
+        # Snapshot everything this mod can change, so the effect ledger can take it off again later
+        ledger_stats = self._effect_ledger_stats(
+            skills=skills, touched_skills=touched_skills
+        )
+        before = self._snapshot_live_char(live_char=live_char, stats=ledger_stats)
 
         # Get alist of all the mod_ids that have already been applied, so we don't repeat ourselves
         # TODO: There is a problem here with mod_ids that are allowed to be taken more than once!
@@ -3618,184 +4592,1112 @@ class CharacterMethods(UtilityMethods):
             live_char = self._if_mod_is_ets_add_note(mod_id=mod_id, live_char=live_char)
 
             # Update the modified skills
-            skills = self.get_modded_skills(mod_id=mod_id)
             for x in skills:
-                if x in self.ss.protected_stats:  # was live_char.protected_stats
-                    logging.info(
-                        f"{self.cross} {self.err_txt} The skill:{self.col['y']}{x}{self.col['w']} is marked as "
-                        f"{self.col['r']}PROTECTED{self.col['w']} so skipping..."
-                    )
-                else:
-                    if x == "replace_text":
-                        # Move all of this to a helper method once working...
-                        replace_base = skills[x].split("|", maxsplit=3)
-                        r_node = replace_base[0]
-                        r_text_id = replace_base[1]
-                        r_text = replace_base[2].replace(")", "")
-                        char.text_replace_mods[r_node] = {r_text_id: r_text}
-                        # Overwrite this whole section with user input:
-
-                        if replace_text_in:
-                            safe_text = self.string_safe(
-                                replace_text_in, allow_hyphen=True
-                            )
-                            char.text_replace_mods[mod_location] = {mod_id: safe_text}
-                    else:
-                        current_val = getattr(live_char, x)
-                        logging.info(
-                            f"{self.chk} {self.py_txt} {self.col['m']}CURRENT{self.col['w']} "
-                            f"value for {self.col['m']}{x}{self.col['w']} = "
-                            f"{self.col['m']}{current_val}{self.col['w']}"
-                        )
-                        if x in self.ss.replace_stats:
-                            logging.info(
-                                f"{self.chk} {self.py_txt} value is set to {self.col['y']}REPLACE"
-                                f"{self.col['w']}, so replacing rather than appending."
-                            )
-                        else:
-                            logging.info(
-                                f"{self.chk} {self.py_txt} value is set to {self.col['g']}APPEND"
-                                f"{self.col['w']}, so appending rather than replacing."
-                            )
+                live_char = self._apply_mod_effect(
+                    mod_id=mod_id,
+                    mod_location=mod_location,
+                    stat=x,
+                    value=skills[x],
+                    live_char=live_char,
+                    char=char,
+                    replace_text_in=replace_text_in,
+                )
 
-                        if type(current_val) == int:
-                            if x in self.ss.replace_stats:
-                                new_val = int(skills[x])
-                            else:
-                                logging.info(
-                                    f"{self.chk} {self.py_txt} {self.col['m']}Current value = {current_val}, "
-                                    f"adding {skills[x]}{self.col['w']}"
-                                )
-                                # To ensure correct calculations of minimum skills we also write to the
-                                # value of the "_actual" version of each skill in special_stats.min_1_skills
-                                if x in self.ss.min_1_skills:
-                                    actual = x + "_actual"
-                                    actual_val = getattr(live_char, actual, 0)
-                                    new_val = actual_val + int(skills[x])
-                                    setattr(live_char, actual, new_val)
-                                # We do the same with Armour value actual (armour_value_actual)
-                                elif x in self.ss.armour_values:
-                                    actual = x + "_actual"
-                                    logging.info(
-                                        f"SETTING ACTUAL ARMOUR VALUE FOR {actual}"
-                                    )
-                                    actual_val = getattr(live_char, actual, 0)
-                                    logging.info(f"CURRENT ACTUAL = {actual_val}")
-                                    new_val = actual_val + int(skills[x])
-                                    logging.info(f"NEW ACTUAL = {new_val}")
-                                    setattr(live_char, actual, new_val)
-                                else:
-                                    new_val = current_val + int(skills[x])
-
-                        elif type(current_val) == str:
-                            new_text = self._replace_live_text_placeholder(
-                                mod_id=mod_id,
-                                mod_location=mod_location,
-                                live_char=live_char,
-                                base_text=skills[x],
-                            )
-                            # Was live_char.replace_stats
-                            if x in self.ss.replace_stats:
-                                new_val = new_text
-                            else:
-                                mod_name = self.get_mod_name(mod_id=mod_id)
-                                if current_val:
-                                    if x.endswith("general_note"):
-                                        new_val = f"{current_val}. \n**{mod_name}:** {new_text}"
-                                    else:
-                                        new_val = f"{current_val}, {new_text}"
-                                else:
-                                    new_val = f"{new_text}"
-
-                        elif type(current_val) == bool:
-                            # This was saving true as "true", rather than just true... corrected now
-                            if skills[x] == "true":
-                                new_val = True
-                            else:
-                                new_val = False
-
-                        elif type(current_val) == list:
-                            new_val = current_val.append(skills[x])
+            after = self._snapshot_live_char(live_char=live_char, stats=ledger_stats)
+            delta = self.get_effect_ledger(live_char=live_char).record(
+                mod_id, before, after, replace_stats=self.ss.replace_stats
+            )
+            self.mark_dirty(stats=delta, live_char=live_char)
 
-                        else:
-                            new_val = skills[x]
+        self.live_char = live_char
+        return live_char
 
-                        logging.info(
-                            f"{self.chk} {self.py_txt} {self.col['g']}NEW{self.col['w']} "
-                            f"value for {self.col['g']}{x}{self.col['w']} = "
-                            f"{self.col['g']}{new_val}{self.col['w']}"
-                        )
+    def _apply_mod_effect(
+        self,
+        mod_id: str,
+        mod_location: str,
+        stat: str,
+        value,
+        live_char: LiveCharacterModel,
+        char: CharacterModel,
+        replace_text_in: str = "",
+    ) -> LiveCharacterModel:
+        """Requires: mod_id (str), mod_location (str), stat (str), value (effect value), live_char
+        (LiveCharacterModel), char (CharacterModel), replace_text_in (str); returns LiveCharacterModel.
+        Applies a single effect (stat: value) of a mod to the live_character, as apply_mod_to_live_character does for
+        each of a mod's effects. The new values come from _mod_effect_updates, as they do when compiling."""
+        if stat in self.ss.protected_stats:  # was live_char.protected_stats
+            logging.info(
+                f"{self.cross} {self.err_txt} The skill:{self.col['y']}{stat}{self.col['w']} is marked as "
+                f"{self.col['r']}PROTECTED{self.col['w']} so skipping..."
+            )
+        elif stat == "replace_text":
+            self._mod_effect_updates(
+                values=live_char.__dict__,
+                stat=stat,
+                value=value,
+                mod_id=mod_id,
+                mod_location=mod_location,
+                mod_name="",
+                choose_text=False,
+                char=char,
+            )
+            # Overwrite this whole section with user input:
+            if replace_text_in:
+                safe_text = self.string_safe(replace_text_in, allow_hyphen=True)
+                char.text_replace_mods[mod_location] = {mod_id: safe_text}
+        else:
+            logging.info(
+                f"{self.chk} {self.py_txt} {self.col['m']}CURRENT{self.col['w']} "
+                f"value for {self.col['m']}{stat}{self.col['w']} = "
+                f"{self.col['m']}{getattr(live_char, stat)}{self.col['w']}"
+            )
+            if stat in self.ss.replace_stats:
+                logging.info(
+                    f"{self.chk} {self.py_txt} value is set to {self.col['y']}REPLACE"
+                    f"{self.col['w']}, so replacing rather than appending."
+                )
+            else:
+                logging.info(
+                    f"{self.chk} {self.py_txt} value is set to {self.col['g']}APPEND"
+                    f"{self.col['w']}, so appending rather than replacing."
+                )
 
-                        setattr(live_char, x, new_val)
+            updates = self._mod_effect_updates(
+                values=live_char.__dict__,
+                stat=stat,
+                value=value,
+                mod_id=mod_id,
+                mod_location=mod_location,
+                mod_name=self.get_mod_name(mod_id=mod_id),
+                choose_text=self._check_mod_for_user_defined_text(mod_id=mod_id),
+                char=char,
+            )
+            for updated_stat, new_val in updates.items():
+                logging.info(
+                    f"{self.chk} {self.py_txt} {self.col['g']}NEW{self.col['w']} "
+                    f"value for {self.col['g']}{updated_stat}{self.col['w']} = "
+                    f"{self.col['g']}{new_val}{self.col['w']}"
+                )
+                setattr(live_char, updated_stat, new_val)
 
-        self.live_char = live_char
         return live_char
 
-    def housekeeping(
+    def _mod_effect_updates(
+        self,
+        values: dict,
+        stat: str,
+        value,
+        mod_id: str,
+        mod_location: str,
+        mod_name: str,
+        choose_text: bool,
+        char: CharacterModel,
+    ) -> dict:
+        """Requires: values (dict), stat (str), value (effect value), mod_id (str), mod_location (str), mod_name (str),
+        choose_text (bool), char (CharacterModel); returns dict.
+        The rules for one effect (stat: value) of a mod that isn't in the effects matrix, for both applying a mod
+        (_apply_mod_effect) and compiling (_compile_other_effects): {stat: new value} for a live character whose
+        current values are values (a dict, or a LiveCharacterModel's __dict__, which is only read). Skills with a
+        minimum of 1 and armour values also get their _actual value. A 'replace_text' effect goes into
+        char.text_replace_mods instead and protected stats are left alone, so both give {}."""
+        if stat in self.protected_stats:
+            return {}
+        if stat == "replace_text":
+            replace_base = value.split("|", maxsplit=3)
+            r_node = replace_base[0]
+            r_text_id = replace_base[1]
+            r_text = replace_base[2].replace(")", "")
+            char.text_replace_mods[r_node] = {r_text_id: r_text}
+            return {}
+
+        current_val = values[stat]
+        if type(current_val) == int:
+            if stat in self.replace_stats:
+                return {stat: int(value)}
+            # To ensure correct calculations of minimum skills we also write to the value of the "_actual" version
+            # of each skill in special_stats.min_1_skills. We do the same with Armour value actual
+            if stat in self.min_1_skills or stat in self.armour_values:
+                actual = stat + "_actual"
+                new_val = values.get(actual, 0) + int(value)
+                return {actual: new_val, stat: new_val}
+            return {stat: current_val + int(value)}
+
+        elif type(current_val) == str:
+            new_text = value
+            if choose_text:
+                # text_replace_mods:{"mod_location": {"mod_id": "replacement_text"}, replaces %TEXT% with e.g.
+                # 'To be decided'
+                replacement_text = values["text_replace_mods"][mod_location][mod_id]
+                new_text = value.replace("%TEXT%", self.string_pretty(replacement_text))
+            if stat in self.replace_stats:
+                return {stat: new_text}
+            if not current_val:
+                return {stat: f"{new_text}"}
+            if stat.endswith("general_note"):
+                return {stat: f"{current_val}. \n**{mod_name}:** {new_text}"}
+            return {stat: f"{current_val}, {new_text}"}
+
+        elif type(current_val) == bool:
+            # This was saving true as "true", rather than just true... corrected now
+            return {stat: value == "true"}
+
+        elif type(current_val) == list:
+            # The list is appended to, and the stat then set to what append returns
+            return {stat: current_val.append(value)}
+
+        return {stat: value}
+
+    def compile_live_char(
         self, char: CharacterModel = None, live_char: LiveCharacterModel = None
     ) -> LiveCharacterModel:
         """Requires: char (CharacterModel), live_char (LiveCharacterModel); returns LiveCharacterModel.
-        This method performs all the general housekeeping tasks for CharacterModel that don't fit anywhere else,
-        such as applying the correct lifestyle"""
-        logging.info(f"{self.chk} {self.col['y']}[char_housekeeping]{self.col['w']}")
-
+        Builds a new LiveCharacterModel (with live_char's ids and player_name) from every mod in char.nodes, giving
+        the same stats as applying each mod to a blank live_character with apply_mod_to_live_character.
+        The integer effects are one row-sum over the catalog's effects matrix (see ModEffectsMatrix), written back
+        in one step. Everything else goes through _compile_other_effects. The effect ledger is then seeded for the new
+        live_character (see seed_effect_ledger), so its mods can be removed by delta."""
+        logging.info(f"{self.chk} {self.col['y']}[compile_live_char]{self.col['w']}")
         if not char:
             char = self.char
         if not live_char:
             live_char = self.live_char
 
+        matrix = self.catalog.get_effects_matrix(self.get_live_char_int_stats())
+        values = self._compile_other_effects(
+            char=char,
+            live_char_id=live_char.live_char_id,
+            player_name=live_char.player_name,
+            matrix=matrix,
+        )
+        applied_mods = values["applied_mods"]
+
+        # Fast path: every integer effect at once. Skills with a minimum of 1 and armour values are added to their
+        # _actual value, which the skill is then set to, as apply_mod_to_live_character does
+        for stat, total in matrix.totals(applied_mods).items():
+            if stat in self.ss.min_1_skills or stat in self.ss.armour_values:
+                actual = stat + "_actual"
+                values[actual] = values.get(actual, 0) + total
+                values[stat] = values[actual]
+            else:
+                values[stat] = values[stat] + total
+        compiled = model_from_values(LiveCharacterModel, values)
+        self.seed_effect_ledger(char=char, live_char=compiled)
+
         logging.info(
-            f"{self.chk} {self.py_txt} Performing CharacterModel housekeeping..."
+            f"{self.chk} {self.py_txt} Compiled {len(applied_mods)} mods for live_character:"
+            f"{self.col['g']}'{compiled.char_name}'{self.col['w']}."
+        )
+        self.live_char = compiled
+        return compiled
+
+    def _compile_mod_info(self, mod_id: str, matrix: ModEffectsMatrix) -> tuple:
+        """Requires: mod_id (str), matrix (ModEffectsMatrix); returns tuple.
+        What _compile_other_effects needs to know about a mod: (name, the _touched_by entries of the skills it touches
+        (as write_touched_entry, skipping skills that don't have one), (note type, note) as _if_mod_is_ets_add_note
+        adds it or (), whether it has 'choose_text', its effects that aren't in the effects matrix). Effects on
+        protected stats are left out, as _mod_effect_updates leaves them alone."""
+        record = self.catalog.get(mod_id)
+        fields = LiveCharacterModel.__fields__
+        protected_stats = self.protected_stats
+        return (
+            record.name,
+            tuple(
+                skill + "_touched_by"
+                for skill in self.catalog.get_skills_touched(mod_id)
+                if skill + "_touched_by" in fields
+            ),
+            self._ets_note(mod_id=mod_id),
+            record.choose_text == 1,
+            tuple(
+                (stat, value)
+                for stat, value in matrix.other_effects.get(mod_id, {}).items()
+                if stat not in protected_stats
+            ),
+        )
+
+    def _compile_other_effects(
+        self,
+        char: CharacterModel,
+        live_char_id: int,
+        player_name: str,
+        matrix: ModEffectsMatrix,
+        mod_info: dict = None,
+    ) -> dict:
+        """Requires: char (CharacterModel), live_char_id (int), player_name (str), matrix (ModEffectsMatrix),
+        mod_info (dict); returns dict.
+        The values of a blank LiveCharacterModel for char with every effect that isn't in the effects matrix (text,
+        bools, lists etc.) applied: the blank values updated with _compile_other_changes."""
+        values: dict = self._blank_live_char_values()
+        values.update(
+            self._compile_other_changes(
+                char=char,
+                live_char_id=live_char_id,
+                player_name=player_name,
+                matrix=matrix,
+                mod_info=mod_info,
+            )
         )
 
-        # Apply Sliverware Completion Bonuses
-        live_char = self.calc_sliverware_completion_bonus(
-            live_char=live_char, char=char
+        return values
+
+    def _compile_other_changes(
+        self,
+        char: CharacterModel,
+        live_char_id: int,
+        player_name: str,
+        matrix: ModEffectsMatrix,
+        mod_info: dict = None,
+    ) -> dict:
+        """Requires: char (CharacterModel), live_char_id (int), player_name (str), matrix (ModEffectsMatrix),
+        mod_info (dict); returns dict.
+        What every effect of char's mods that isn't in the effects matrix (text, bools, lists etc.) changes on a
+        blank LiveCharacterModel: {stat: value} for only the stats it sets, which can still be their default. The
+        effects are applied in node order, each mod only once (see applied_mods_check), by the same rules as applying
+        a mod (_mod_effect_updates, _appended_note). A stat is read from the blank values until it is set (lists and
+        dicts copied first), and applied_mods and the _touched_by entries (see write_touched_entry) are built up
+        on their own and set once at the end. mod_info ({mod_id: see _compile_mod_info}) keeps what is needed
+        about each mod between characters compiled together."""
+        if mod_info is None:
+            mod_info = {}
+        defaults: dict = self.get_live_char_defaults()
+        changes: dict = {
+            "live_char_id": live_char_id,
+            "char_id": char.char_id,
+            "char_name": char.char_name,
+            "player_id": char.player_id,
+            "player_name": player_name,
+            "deleted": char.deleted,
+            "text_replace_mods": {
+                x: dict(char.text_replace_mods[x]) for x in char.text_replace_mods
+            },
+        }
+
+        applied_mods: list = []
+        seen: set = set()
+        touched_by: dict = {}
+        for mod_location, mod_id in char.nodes.items():
+            if not mod_id or mod_id in seen:
+                continue
+            seen.add(mod_id)
+            applied_mods.append(mod_id)
+            info = mod_info.get(mod_id)
+            if info is None:
+                info = mod_info[mod_id] = self._compile_mod_info(mod_id, matrix)
+            mod_name, touched_names, note, choose_text, effects = info
+            for ts_name in touched_names:
+                names = touched_by.get(ts_name)
+                touched_by[ts_name] = (
+                    mod_name if names is None else f"{names}, {mod_name}"
+                )
+            if note:
+                note_name = f"{note[0]}_note"
+                changes[note_name] = self._appended_note(
+                    current_note=changes.get(note_name, defaults.get(note_name, "")),
+                    note_value=note[1],
+                )
+            for stat, value in effects:
+                if stat not in changes and stat in defaults:
+                    default = defaults[stat]
+                    if type(default) is list or type(default) is dict:
+                        changes[stat] = default.copy()
+                    else:
+                        changes[stat] = default
+                        # An integer effect on a skill also reads the skill's _actual value
+                        actual = stat + "_actual"
+                        if type(default) is int and actual in defaults:
+                            changes.setdefault(actual, defaults[actual])
+                changes.update(
+                    self._mod_effect_updates(
+                        values=changes,
+                        stat=stat,
+                        value=value,
+                        mod_id=mod_id,
+                        mod_location=mod_location,
+                        mod_name=mod_name,
+                        choose_text=choose_text,
+                        char=char,
+                    )
+                )
+
+        changes["applied_mods"] = applied_mods
+        for ts_name, names in touched_by.items():
+            current = changes.get(ts_name, defaults.get(ts_name))
+            changes[ts_name] = f"{current}, {names}" if current else names
+
+        return changes
+
+    def _live_char_from_changes(self, changes: dict) -> LiveCharacterModel:
+        """Requires: changes (dict); returns LiveCharacterModel.
+        A LiveCharacterModel with the blank values updated with changes ({stat: value})."""
+        values: dict = self._blank_live_char_values()
+        values.update(changes)
+        # Every value has come from a validated LiveCharacterModel or the same effects apply_mod_to_live_character
+        # would set, so the model is built without validating them again
+        return model_from_values(LiveCharacterModel, values)
+
+    def _blank_live_char_values(self) -> dict:
+        """Returns dict.
+        A copy of get_live_char_defaults, with its lists and dicts copied too, for building a LiveCharacterModel on."""
+        values: dict = dict(self.get_live_char_defaults())
+        for field in container_fields(LiveCharacterModel):
+            value = values[field]
+            if type(value) is list or type(value) is dict:
+                values[field] = value.copy()
+
+        return values
+
+    def get_live_char_defaults(self) -> dict:
+        """Returns dict.
+        The stats of a blank LiveCharacterModel (what compile_live_char starts from). Made once and then kept."""
+        if self.live_char_defaults is None:
+            self.live_char_defaults = LiveCharacterModel(
+                live_char_id=0,
+                char_id=0,
+                char_name="",
+                player_id=0,
+                player_name="",
+                deleted=False,
+            ).dict()
+
+        return self.live_char_defaults
+
+    def get_live_char_int_stats(self) -> frozenset:
+        """Returns frozenset.
+        The LiveCharacterModel stats that apply_mod_to_live_character adds integer effects to: every int stat that
+        isn't a replace or protected stat. Worked out from a blank LiveCharacterModel once and then kept."""
+        if self.live_char_int_stats is None:
+            self.live_char_int_stats = frozenset(
+                stat
+                for stat, value in self.get_live_char_defaults().items()
+                if type(value) is int
+                and stat not in self.ss.replace_stats
+                and stat not in self.ss.protected_stats
+            )
+
+        return self.live_char_int_stats
+
+    def compile_many(self, char_ids: list) -> dict:
+        """Requires: char_ids (list of int); returns dict.
+        Compiles the live characters of many characters at once: {char_id: LiveCharacterModel}, each what
+        compile_live_char followed by set_skill_minimums, calc_live_char_initiative, calc_live_char_wound_thresholds
+        and set_armour_value_caps would give. The characters are loaded in batches (see load_chars_many), nothing is
+        saved and self.char/self.live_char are left alone. char_ids that aren't in the DB are left out."""
+        logging.info(f"{self.chk} {self.col['y']}[compile_many]{self.col['w']}")
+
+        chars = self.load_chars_many(char_ids=char_ids)
+        live_chars = self.compile_chars(
+            chars=chars,
+            live_char_info=self.load_live_char_info_many(
+                char_ids=[char.char_id for char in chars]
+            ),
         )
 
-        # Calc Permanent Wyld Injuries & Also Total Wyld Cancer
-        live_char = self.calc_wyld_cancer_injuries(live_char=live_char)
+        return {char.char_id: live_char for char, live_char in zip(chars, live_chars)}
+
+    def compile_chars(self, chars: list, live_char_info: dict = None) -> list:
+        """Requires: chars (list of CharacterModel), live_char_info (dict); returns list.
+        compile_many for CharacterModels that are already loaded: one LiveCharacterModel per char, in order.
+        live_char_info is {char_id: (live_char_id, player_name)} (see load_live_char_info_many), chars missing from it
+        get (0, ""). Each is built from compile_chars_changes (see _live_char_from_changes)."""
+        logging.info(f"{self.chk} {self.col['y']}[compile_chars]{self.col['w']}")
+
+        live_chars: list = []
+        for changes in self.compile_chars_changes(
+            chars=chars, live_char_info=live_char_info
+        ):
+            live_chars.append(self._live_char_from_changes(changes=changes))
 
-        # Apply Lifestyle_mod_id
-        lifestyle_mod_id = self.calc_lifestyle(live_char=live_char)
         logging.info(
-            f"{self.chk} {self.py_txt} Set lifestyle_mod_id:{self.col['g']}{lifestyle_mod_id}{self.col['w']}."
+            f"{self.chk} {self.py_txt} Compiled {self.col['g']}{len(live_chars)}{self.col['w']} live_characters."
         )
-        self.apply_lifestyle_mod_id(lifestyle_mod_id=lifestyle_mod_id, char=char)
+        return live_chars
 
-        # Skill Masteries
-        live_char = self.set_skill_masteries(char=char, live_char=live_char)
+    def compile_chars_changes(self, chars: list, live_char_info: dict = None) -> list:
+        """Requires: chars (list of CharacterModel), live_char_info (dict); returns list.
+        compile_chars without building the models: for each char, in order, {stat: value} for the stats its live
+        character has that can be different from a blank LiveCharacterModel's. The integer and derived stats come
+        from compile_stats_many, only those that aren't their default (or that an effect outside the effects matrix
+        also set) are picked out of its array, all the characters at once. Everything else comes from
+        _compile_other_changes a character at a time."""
+        logging.info(
+            f"{self.chk} {self.col['y']}[compile_chars_changes]{self.col['w']}"
+        )
+        if live_char_info is None:
+            live_char_info = {}
+
+        columns, values = self.compile_stats_many(chars=chars)
+        matrix = self.catalog.get_effects_matrix(self.get_live_char_int_stats())
+        defaults = self.get_live_char_defaults()
+        write_back = [
+            i for i, stat in enumerate(columns) if stat not in self.protected_stats
+        ]
+        write_stats = [columns[i] for i in write_back]
+        write_index = {stat: j for j, stat in enumerate(write_stats)}
+        values = values[:, write_back]
+
+        # Every character's changed integer stats at once: (row, column) pairs in row order, split by row below
+        rows, cols = np.nonzero(
+            values != np.array([defaults[stat] for stat in write_stats])
+        )
+        changed_values = values[rows, cols].tolist()
+        changed_stats = [write_stats[j] for j in cols.tolist()]
+        bounds = np.searchsorted(rows, np.arange(len(chars) + 1)).tolist()
+
+        all_changes: list = []
+        mod_info: dict = {}
+        for i, char in enumerate(chars):
+            live_char_id, player_name = live_char_info.get(char.char_id, (0, ""))
+            changes = self._compile_other_changes(
+                char=char,
+                live_char_id=live_char_id,
+                player_name=player_name,
+                matrix=matrix,
+                mod_info=mod_info,
+            )
+            # The integer stats from compile_stats_many replace whatever the other effects set them to
+            for stat in changes.keys() & write_index.keys():
+                changes[stat] = int(values[i, write_index[stat]])
+            changes.update(
+                zip(
+                    changed_stats[bounds[i] : bounds[i + 1]],
+                    changed_values[bounds[i] : bounds[i + 1]],
+                )
+            )
+            all_changes.append(changes)
+
+        return all_changes
+
+    def compile_stats_many(self, chars: list) -> tuple:
+        """Requires: chars (list of CharacterModel); returns tuple.
+        The integer stats of many characters' live characters as one array: (columns, values), where columns is a
+        tuple of stat names and values an int64 numpy array with one row per char and one column per stat.
+        The characters x mods incidence matrix is multiplied by the effects matrix (ModEffectsMatrix.totals_many), the
+        sums added to a blank LiveCharacterModel's values as compile_live_char does, and then the derived stats are
+        worked out for every character at once (calc_derived_stats_many). Nothing else is built, so this is the
+        cheap way to compare the numbers of a whole party or campaign."""
+        logging.info(f"{self.chk} {self.col['y']}[compile_stats_many]{self.col['w']}")
+
+        return self.compile_mod_stats_many(
+            mod_lists=[
+                [mod_id for mod_id in char.nodes.values() if mod_id] for char in chars
+            ]
+        )
+
+    def compile_mod_stats_many(self, mod_lists: list) -> tuple:
+        """Requires: mod_lists (list of lists of mod_ids); returns tuple.
+        compile_stats_many for lists of mod_ids rather than CharacterModels: (columns, values) with a row for the
+        live character each list of mods would give."""
+        ss = self.ss
+        defaults = self.get_live_char_defaults()
+        int_stats = self.get_live_char_int_stats()
+        matrix = self.catalog.get_effects_matrix(int_stats)
+
+        # The armour value caps are protected (so not in int_stats) but set_armour_value_caps reads them
+        caps = tuple(f"{av}_{cap}" for av in ss.armour_values for cap in ("min", "max"))
+        columns = tuple(sorted(int_stats)) + caps
+        col = {stat: i for i, stat in enumerate(columns)}
+        values = np.tile(
+            np.array([defaults[stat] for stat in columns], dtype=np.int64),
+            (len(mod_lists), 1),
+        )
+
+        sums, touched = matrix.totals_many(mod_lists)
+        for j, stat in enumerate(matrix.stats):
+            if stat in ss.min_1_skills or stat in ss.armour_values:
+                actual = col[stat + "_actual"]
+                values[:, actual] += sums[:, j]
+                values[:, col[stat]] = np.where(
+                    touched[:, j], values[:, actual], values[:, col[stat]]
+                )
+            else:
+                values[:, col[stat]] += sums[:, j]
 
-        # Skill Minimums
-        live_char = self.set_skill_minimums(live_char=live_char)
+        values = self.calc_derived_stats_many(values=values, columns=col)
+        return columns, values
 
-        # Recalculate initiative
-        live_char = self.calc_live_char_initiative(live_char=live_char)
+    def get_effect_ledger(self, live_char: LiveCharacterModel = None) -> EffectLedger:
+        """Requires: live_char (LiveCharacterModel); returns EffectLedger.
+        The ledger of mod deltas for live_char. There is one per session: a new one is started (and the old one
+        dropped) as soon as a different LiveCharacterModel is used."""
+        if not live_char:
+            live_char = self.live_char
 
-        # Recalculate Wound Thresholds for Physical, Smarts, Resources, Wyld and Divinity
-        live_char = self.calc_live_char_wound_thresholds(live_char=live_char)
+        if self.effect_ledger is None or not self.effect_ledger.tracks(live_char):
+            self.effect_ledger = EffectLedger(live_char)
 
-        # Check all AVs are 2 or greater and less than max_av allowed:
-        live_char = self.set_armour_value_caps(live_char=live_char)
+        return self.effect_ledger
 
-        # Bonus Languages
-        live_char = self.calc_bonus_languages(live_char=live_char)
+    def _effect_ledger_stats(self, skills: dict, touched_skills) -> tuple:
+        """Requires: skills (dict), touched_skills (tuple); returns tuple.
+        The live_char stats apply_mod_to_live_character can change for a mod: the modded skills (and their _actual
+        values), the _touched_by entries, the edge/trait/sliverware notes and applied_mods."""
+        stats: list = ["applied_mods"] + self.ets_note_stats
+        for x in skills:
+            if x != "replace_text" and x not in self.ss.protected_stats:
+                stats.extend((x, x + "_actual"))
+        stats.extend(skill + "_touched_by" for skill in touched_skills)
 
-        # Set Secondary Info (Weapons, Gear, Contact, Missions, Commendations, Reprimands etc)
-        live_char = self.set_secondary_info(live_char=live_char, char=char)
+        return tuple(stats)
 
-        # Append any saved notes
-        live_char = self.get_saved_notes(live_char=live_char, char=char)
+    @staticmethod
+    def _snapshot_live_char(live_char: LiveCharacterModel, stats) -> dict:
+        """Requires: live_char (LiveCharacterModel), stats (tuple); returns dict.
+        The current values of the stats that live_char has. Lists are copied, as mods append to them in place."""
+        return CharacterMethods._snapshot_values(values=live_char.__dict__, stats=stats)
 
-        # Calculate Current TPs and available TPs (this returns a tuple of (char, live_char):
-        tp_calc = self.calc_talent_points(char=char, live_char=live_char)
-        char = tp_calc[0]
-        live_char = tp_calc[1]
+    @staticmethod
+    def _snapshot_values(values: dict, stats) -> dict:
+        """Requires: values (dict), stats (tuple); returns dict.
+        _snapshot_live_char for the values of a live character held in a dict (see seed_effect_ledger)."""
+        snapshot: dict = {}
+        for stat in stats:
+            if stat in values:
+                value = values[stat]
+                snapshot[stat] = list(value) if type(value) is list else value
+
+        return snapshot
+
+    def seed_effect_ledger(
+        self, char: CharacterModel = None, live_char: LiveCharacterModel = None
+    ) -> EffectLedger:
+        """Requires: char (CharacterModel), live_char (LiveCharacterModel); returns EffectLedger.
+        Starts the effect ledger for a live character that was loaded or compiled rather than built up a mod at a
+        time, so its mods can still be taken off by delta. Each mod of char in live_char.applied_mods is applied again
+        to a blank live character held in a dict, in node order and by the same rules as apply_mod_to_live_character,
+        and its delta recorded. Deltas that no longer fit live_char (see EffectLedger.fits) are left out, so those
+        mods are removed by a rebuild."""
+        logging.info(f"{self.chk} {self.col['y']}[seed_effect_ledger]{self.col['w']}")
+        if not char:
+            char = self.char
+        if not live_char:
+            live_char = self.live_char
+
+        ledger = EffectLedger(live_char)
+        self.effect_ledger = ledger
+        if char is None or char.char_id != live_char.char_id:
+            return ledger
+
+        values: dict = self._blank_live_char_values()
+        values["text_replace_mods"] = {
+            x: dict(char.text_replace_mods[x]) for x in char.text_replace_mods
+        }
+
+        applied_mods = set(live_char.applied_mods or ())
+        for mod_location, mod_id in char.nodes.items():
+            if not mod_id or mod_id not in applied_mods or mod_id in ledger:
+                continue
+            record = self.catalog.get(mod_id)
+            touched_skills = self.catalog.get_skills_touched(mod_id)
+            skills = self.catalog.get_effects(mod_id) or {}
+            stats = self._effect_ledger_stats(
+                skills=skills, touched_skills=touched_skills
+            )
+            before = self._snapshot_values(values=values, stats=stats)
+
+            values["applied_mods"].append(mod_id)
+            for skill in touched_skills:
+                ts_name = skill + "_touched_by"
+                if ts_name in values:
+                    touched_by = values[ts_name]
+                    values[ts_name] = (
+                        f"{touched_by}, {record.name}"
+                        if touched_by
+                        else f"{record.name}"
+                    )
+            note = self._ets_note(mod_id=mod_id)
+            if note:
+                note_name = f"{note[0]}_note"
+                values[note_name] = self._appended_note(
+                    current_note=values.get(note_name, ""), note_value=note[1]
+                )
+            for stat, value in skills.items():
+                values.update(
+                    self._mod_effect_updates(
+                        values=values,
+                        stat=stat,
+                        value=value,
+                        mod_id=mod_id,
+                        mod_location=mod_location,
+                        mod_name=record.name,
+                        choose_text=record.choose_text == 1,
+                        char=char,
+                    )
+                )
+
+            ledger.record(
+                mod_id,
+                before,
+                self._snapshot_values(values=values, stats=stats),
+                replace_stats=self.ss.replace_stats,
+            )
+            if not ledger.fits(mod_id=mod_id, live_char=live_char):
+                ledger.forget(mod_id=mod_id)
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Seeded the effect ledger with {len(ledger)} of the "
+            f"{len(applied_mods)} mods applied to live_character:{self.col['g']}'{live_char.char_name}'"
+            f"{self.col['w']}."
+        )
+        return ledger
+
+    def remove_mod_delta(
+        self,
+        mod_id: str,
+        char: CharacterModel = None,
+        live_char: LiveCharacterModel = None,
+    ) -> LiveCharacterModel:
+        """Requires: mod_id (str), char (CharacterModel), live_char (LiveCharacterModel); returns LiveCharacterModel.
+        Takes a single mod's effects off live_char by reverting its delta in the effect ledger, then recalculates
+        only the derived stats that depend on what changed. Check can_remove_mod_delta first."""
+        logging.info(f"{self.chk} {self.col['y']}[remove_mod_delta]{self.col['w']}")
+        if not char:
+            char = self.char
+        if not live_char:
+            live_char = self.live_char
+
+        changed = self.get_effect_ledger(live_char=live_char).revert(
+            mod_id=mod_id, live_char=live_char
+        )
+        logging.info(
+            f"{self.chk} {self.py_txt} Reverted mod_id:{self.col['y']}{mod_id}{self.col['w']}, changing: "
+            f"{sorted(changed)}"
+        )
+        self.mark_dirty(stats=changed, live_char=live_char)
+        live_char = self.recalc_derived_stats(
+            changed=changed, char=char, live_char=live_char
+        )
+
+        self.live_char = live_char
+        return live_char
+
+    def can_remove_mod_delta(
+        self, mod_id: str, mod_location: str, live_char: LiveCharacterModel = None
+    ) -> bool:
+        """Requires: mod_id (str), mod_location (str), live_char (LiveCharacterModel); returns bool.
+        True if remove_mod_delta can take mod_id off live_char. It can't if the mod isn't in the ledger (it was
+        applied before the ledger was started and left out by seed_effect_ledger), or if it feeds the skill masteries
+        or sliverware completion, which housekeeping adds on top of the skills rather than recalculating."""
+        if not live_char:
+            live_char = self.live_char
+
+        ledger = self.get_effect_ledger(live_char=live_char)
+        if mod_id not in ledger or mod_location in self.ss.smx_slots:
+            return False
+
+        return not any(
+            stat in self.full_rebuild_stats for stat in ledger.deltas[mod_id]
+        )
+
+    def recalc_derived_stats(
+        self,
+        changed: set = None,
+        char: CharacterModel = None,
+        live_char: LiveCharacterModel = None,
+    ) -> LiveCharacterModel:
+        """Requires: changed (set), char (CharacterModel), live_char (LiveCharacterModel); returns
+        LiveCharacterModel.
+        Runs the housekeeping stages that recalculate a stat from scratch (derived_stages), but only those that read
+        one of the changed stats (all of them if changed is None). Stages run in housekeeping order, and what a stage
+        changes counts as changed for the stages after it. Everything that changed is marked dirty for the next
+        housekeeping."""
+        logging.info(f"{self.chk} {self.col['y']}[recalc_derived_stats]{self.col['w']}")
+        if not char:
+            char = self.char
+        if not live_char:
+            live_char = self.live_char
+
+        char, live_char, changed_by = self.run_housekeeping_stages(
+            dirty=changed,
+            char=char,
+            live_char=live_char,
+            stage_names=self.derived_stages,
+            char_changed=False,
+        )
+        self.mark_dirty(stats=set().union(*changed_by.values()), live_char=live_char)
+
+        self.live_char = live_char
+        return live_char
+
+    def get_housekeeping_pipeline(self) -> HousekeepingPipeline:
+        """Returns the housekeeping stages as a HousekeepingPipeline, building it on first use. The fields written
+        by applying the sliverware completion, lifestyle and skill mastery mods come from the catalog."""
+        if self.housekeeping_pipeline is None:
+            ss = self.ss
+            bscm = self.bscm
+
+            def mod_writes(mod_ids) -> set:
+                writes: set = set()
+                for mod_id in mod_ids:
+                    if self.check_mod_exists(mod_id=mod_id):
+                        writes.update(
+                            self._effect_ledger_stats(
+                                skills=self.get_modded_skills(mod_id=mod_id),
+                                touched_skills=self.get_touched_skills(mod_id=mod_id),
+                            )
+                        )
+                return writes
+
+            sliver_mods = [
+                x.replace("s_", "n_").replace("_n0", "")
+                for x in bscm.sliverware_complete
+            ]
+            smx_skills: set = set()
+            for x in ss.smx_slots:
+                for mod_id in self.get_node_candidates(node_location=x):
+                    smx_skills.update(self.get_modded_skills(mod_id=mod_id))
+            smx_names = {f"smx_name{i}" for i in range(1, len(ss.smx_slots) + 1)}
+            smx_values = {f"smx{i}" for i in range(1, len(ss.smx_slots) + 1)}
+            wt_reads = {
+                "physical_actual",
+                "endurance",
+                "scale",
+                "physical_wt_bonus",
+                "smarts_actual",
+                "control",
+                "smarts_wt_bonus",
+                "resources_actual",
+                "influence",
+                "resources_wt_bonus",
+                "wyld_actual",
+                "resistance",
+                "wyld_wt_bonus",
+                "divinity_actual",
+                "faith",
+                "divinity_wt_bonus",
+            }
+            wt_names = ("physical", "smarts", "resources", "wyld", "divinity", "mook")
+            tp_stats = {
+                "tp_total",
+                "tp_unspent",
+                "tp_create",
+                "tp_missions",
+                "tp_bonus",
+                "tp_spent",
+                "breed_tp_spent",
+                "breed_tp_bonus",
+            }
+
+            # The sliverware completion and lifestyle stages also read whether their mod is still there, so they put
+            # it back if it has been removed
+            stages = (
+                (
+                    "sliverware_completion",
+                    set(bscm.sliverware_complete) | {"applied_mods"},
+                    {"sliver_complete"} | mod_writes(sliver_mods),
+                    False,
+                ),
+                (
+                    "wyld_cancer_injuries",
+                    {"wyld_cancer", "wyld_cancer_mult", "wyld_cancer_perm_threshold"},
+                    {
+                        "healed_wyld_perm_injuries",
+                        "wyld_perm_injuries",
+                        "wyld_cancer_extra",
+                        "wyld_cancer_total",
+                        "wyld_perm_injuries_count",
+                        "warning_note",
+                    },
+                    True,
+                ),
+                (
+                    "lifestyle",
+                    {
+                        "resources",
+                        "influence",
+                        "social_class",
+                        "lifestyle_change",
+                        "lifestyle",
+                    },
+                    mod_writes(bscm.lifestyles),
+                    False,
+                ),
+                (
+                    "skill_masteries",
+                    smx_values | smx_skills,
+                    smx_names
+                    | smx_skills
+                    | {skill + "_touched_by" for skill in smx_skills},
+                    True,
+                ),
+                (
+                    "skill_minimums",
+                    {skill + "_actual" for skill in ss.min_1_skills},
+                    set(ss.min_1_skills),
+                    False,
+                ),
+                (
+                    "initiative",
+                    {"physical", "smarts", "resources", "initiative_bonus"},
+                    {"initiative"},
+                    False,
+                ),
+                (
+                    "wound_thresholds",
+                    wt_reads,
+                    {wt + "_wt" for wt in wt_names},
+                    False,
+                ),
+                (
+                    "armour_value_caps",
+                    {
+                        av + suffix
+                        for av in ss.armour_values
+                        for suffix in ("_actual", "_min", "_max")
+                    },
+                    set(ss.armour_values),
+                    False,
+                ),
+                (
+                    "bonus_languages",
+                    {"bonus_languages", "language_count"},
+                    {"total_languages", "warning_note", "general_note"},
+                    False,
+                ),
+                (
+                    "secondary_info",
+                    set(),
+                    set(ss.secondary_info)
+                    | {info + "_note" for info in ss.secondary_info},
+                    True,
+                ),
+                ("saved_notes", set(), {x + "_note" for x in ss.note_types}, True),
+                ("talent_points", set(), tp_stats, True),
+            )
+            self.housekeeping_pipeline = HousekeepingPipeline(
+                HousekeepingStage(
+                    name=name,
+                    reads=frozenset(reads),
+                    writes=frozenset(writes),
+                    reads_char=reads_char,
+                )
+                for name, reads, writes, reads_char in stages
+            )
+
+        return self.housekeeping_pipeline
+
+    def mark_dirty(self, stats, live_char: LiveCharacterModel = None) -> None:
+        """Requires: stats (iterable of str), live_char (LiveCharacterModel); returns None.
+        Records that stats of live_char have changed, so the next housekeeping re-runs the stages that read them.
+        Nothing is recorded for a live_character that isn't being tracked (its next housekeeping is a full one)."""
+        if not live_char:
+            live_char = self.live_char
+
+        if self.dirty_live_char is live_char and self.dirty_stats is not None:
+            self.dirty_stats.update(stats)
+
+    def get_dirty_stats(self, live_char: LiveCharacterModel = None):
+        """Requires: live_char (LiveCharacterModel); returns set or None.
+        The stats of live_char that have changed since its last housekeeping, or None if that isn't known (it hasn't
+        had a housekeeping in this session, e.g. it was just loaded, compiled or rebuilt)."""
+        if not live_char:
+            live_char = self.live_char
+
+        if self.dirty_live_char is not live_char or self.dirty_stats is None:
+            return None
+        return set(self.dirty_stats)
+
+    def housekeeping(
+        self,
+        char: CharacterModel = None,
+        live_char: LiveCharacterModel = None,
+        full: bool = False,
+    ) -> LiveCharacterModel:
+        """Requires: char (CharacterModel), live_char (LiveCharacterModel), full (bool); returns LiveCharacterModel.
+        This method performs all the general housekeeping tasks for CharacterModel that don't fit anywhere else,
+        such as applying the correct lifestyle.
+        Only the stages whose inputs have changed since live_char's last housekeeping are run (see
+        get_housekeeping_pipeline and get_dirty_stats), or all of them if full is True or that isn't known. With
+        verify_housekeeping switched on, every partial run is checked against a full one."""
+        logging.info(f"{self.chk} {self.col['y']}[char_housekeeping]{self.col['w']}")
+
+        if not char:
+            char = self.char
+        if not live_char:
+            live_char = self.live_char
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Performing CharacterModel housekeeping..."
+        )
+
+        dirty = None if full else self.get_dirty_stats(live_char=live_char)
+        verify = self.verify_housekeeping and dirty is not None
+        if verify:
+            full_char = char.copy(deep=True)
+            full_live_char = live_char.copy(deep=True)
+
+        char, live_char, changed_by = self.run_housekeeping_stages(
+            dirty=dirty, char=char, live_char=live_char
+        )
+        self.dirty_live_char = live_char
+        self.dirty_stats = self.get_housekeeping_pipeline().carry_over(changed_by)
+
+        if verify:
+            self._verify_housekeeping(
+                full_char=full_char,
+                full_live_char=full_live_char,
+                char=char,
+                live_char=live_char,
+            )
 
         self.live_char = live_char
         self.char = char
         return live_char
 
+    def run_housekeeping_stages(
+        self,
+        dirty: set = None,
+        char: CharacterModel = None,
+        live_char: LiveCharacterModel = None,
+        stage_names=None,
+        char_changed: bool = True,
+    ) -> tuple:
+        """Requires: dirty (set), char (CharacterModel), live_char (LiveCharacterModel), stage_names (tuple),
+        char_changed (bool); returns tuple.
+        Runs the housekeeping stages (only those in stage_names, if given) that read a dirty field, in order. A
+        field a stage changes is dirty for the stages after it. dirty None runs every stage, and char_changed False
+        skips the stages that only run because they read the CharacterModel.
+        Returns (CharacterModel, LiveCharacterModel, {stage name: fields it changed}) for the stages that ran."""
+        logging.info(
+            f"{self.chk} {self.col['y']}[run_housekeeping_stages]{self.col['w']}"
+        )
+        if not char:
+            char = self.char
+        if not live_char:
+            live_char = self.live_char
+
+        pipeline = self.get_housekeeping_pipeline()
+        if dirty is not None:
+            dirty = set(dirty)
+
+        changed_by: dict = {}
+        for stage in pipeline.stages:
+            if stage_names is not None and stage.name not in stage_names:
+                continue
+            if not pipeline.needs_run(stage, dirty, char_changed):
+                logging.info(
+                    f"{self.chk} {self.py_txt} Housekeeping stage {self.col['y']}{stage.name}{self.col['w']} "
+                    f"is up to date, so skipping..."
+                )
+                continue
+
+            before = self._snapshot_live_char(live_char=live_char, stats=stage.writes)
+            char, live_char = self._run_housekeeping_stage(
+                stage_name=stage.name, char=char, live_char=live_char
+            )
+            after = self._snapshot_live_char(live_char=live_char, stats=stage.writes)
+            changed = {stat for stat in after if after[stat] != before.get(stat)}
+            changed_by[stage.name] = changed
+            if dirty is not None:
+                dirty.update(changed)
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Ran housekeeping stages: {self.col['g']}{list(changed_by)}{self.col['w']}."
+        )
+        return char, live_char, changed_by
+
+    def _run_housekeeping_stage(
+        self, stage_name: str, char: CharacterModel, live_char: LiveCharacterModel
+    ) -> tuple:
+        """Runs one housekeeping stage and returns (CharacterModel, LiveCharacterModel)"""
+        match stage_name:
+            case "sliverware_completion":
+                # Apply Sliverware Completion Bonuses
+                live_char = self.calc_sliverware_completion_bonus(
+                    live_char=live_char, char=char
+                )
+            case "wyld_cancer_injuries":
+                # Calc Permanent Wyld Injuries & Also Total Wyld Cancer
+                live_char = self.calc_wyld_cancer_injuries(
+                    live_char=live_char, char=char
+                )
+            case "lifestyle":
+                # Apply Lifestyle_mod_id
+                lifestyle_mod_id = self.calc_lifestyle(live_char=live_char)
+                logging.info(
+                    f"{self.chk} {self.py_txt} Set lifestyle_mod_id:{self.col['g']}{lifestyle_mod_id}{self.col['w']}."
+                )
+                self.apply_lifestyle_mod_id(
+                    lifestyle_mod_id=lifestyle_mod_id, char=char
+                )
+            case "skill_masteries":
+                live_char = self.set_skill_masteries(char=char, live_char=live_char)
+            case "skill_minimums":
+                live_char = self.set_skill_minimums(live_char=live_char)
+            case "initiative":
+                live_char = self.calc_live_char_initiative(live_char=live_char)
+            case "wound_thresholds":
+                # Recalculate Wound Thresholds for Physical, Smarts, Resources, Wyld and Divinity
+                live_char = self.calc_live_char_wound_thresholds(live_char=live_char)
+            case "armour_value_caps":
+                # Check all AVs are 2 or greater and less than max_av allowed:
+                live_char = self.set_armour_value_caps(live_char=live_char)
+            case "bonus_languages":
+                live_char = self.calc_bonus_languages(live_char=live_char)
+            case "secondary_info":
+                # Set Secondary Info (Weapons, Gear, Contact, Missions, Commendations, Reprimands etc)
+                live_char = self.set_secondary_info(live_char=live_char, char=char)
+            case "saved_notes":
+                # Append any saved notes
+                live_char = self.get_saved_notes(live_char=live_char, char=char)
+            case "talent_points":
+                # Calculate Current TPs and available TPs (this returns a tuple of (char, live_char):
+                char, live_char = self.calc_talent_points(
+                    char=char, live_char=live_char
+                )
+            case _:
+                logging.error(
+                    f"{self.cross} {self.err_txt} {self.col['r']}Unknown housekeeping stage:{stage_name}"
+                    f"{self.col['w']}"
+                )
+
+        return char, live_char
+
+    def _verify_housekeeping(
+        self,
+        full_char: CharacterModel,
+        full_live_char: LiveCharacterModel,
+        char: CharacterModel,
+        live_char: LiveCharacterModel,
+    ) -> bool:
+        """Requires: full_char (CharacterModel), full_live_char (LiveCharacterModel), char (CharacterModel),
+        live_char (LiveCharacterModel); returns bool.
+        Debug check for verify_housekeeping: runs every housekeeping stage on full_char and full_live_char (copies
+        of the character from before a partial run) and compares the result with the partial run's char and
+        live_char. Logs any difference, counts it in housekeeping_verify_failures and makes the next housekeeping a
+        full one."""
+        # The full run goes through self.char/self.live_char and starts its own effect ledger, so put them back
+        session = (self.char, self.live_char, self.effect_ledger)
+        self.char = full_char
+        self.live_char = full_live_char
+        full_char, full_live_char, _ = self.run_housekeeping_stages(
+            char=full_char, live_char=full_live_char
+        )
+        self.char, self.live_char, self.effect_ledger = session
+
+        full_stats = full_live_char.dict()
+        stats = live_char.dict()
+        full_char_stats = full_char.dict()
+        char_stats = char.dict()
+        different = [x for x in full_stats if full_stats[x] != stats.get(x)] + [
+            f"char.{x}"
+            for x in full_char_stats
+            if full_char_stats[x] != char_stats.get(x)
+        ]
+        if different:
+            self.housekeeping_verify_failures += 1
+            self.dirty_stats = None
+            logging.error(
+                f"{self.cross} {self.err_txt} {self.col['r']}Partial housekeeping differs from a full run in: "
+                f"{different}{self.col['w']}"
+            )
+            return False
+
+        logging.info(
+            f"{self.chk} {self.py_txt} Partial housekeeping {self.col['g']}MATCHES{self.col['w']} a full run."
+        )
+        return True
+
     def set_char_int_val(
         self,
         user_key: str,
@@ -3945,6 +5847,7 @@ class CharacterMethods(UtilityMethods):
                                 f"{self.col['w']}'{char.char_name}'{self.col['g']}!{self.col['w']}"
                             )
 
+                    self.mark_dirty(stats={user_key}, live_char=live_char)
                     live_char = self.housekeeping(char=char, live_char=live_char)
                     char = self.char
                 else:
@@ -4537,34 +6440,9 @@ class CharacterMethods(UtilityMethods):
         smarts = live_char.smarts
         resources = live_char.resources
         psr = physical + smarts + resources
-        if psr < 0:
-            psr = 0
         initiative_bonus = live_char.initiative_bonus
-        match psr:
-            case 0 | 1 | 2:
-                psr_base = 1
-            case 3 | 4 | 5:
-                psr_base = 2
-            case 6 | 7 | 8:
-                psr_base = 3
-            case 9 | 10 | 11:
-                psr_base = 4
-            case 12 | 13 | 14:
-                psr_base = 5
-            case 15 | 16 | 17:
-                psr_base = 6
-            case 18 | 19 | 20:
-                psr_base = 7
-            case 21 | 22 | 23:
-                psr_base = 8
-            case 24 | 25 | 26:
-                psr_base = 9
-            case 27 | 28 | 29:
-                psr_base = 10
-            case 30 | 31 | 32:
-                psr_base = 11
-            case _:
-                psr_base = int(psr / 3)
+        # A negative psr is clamped to 0, the bottom of the table
+        psr_base = INITIATIVE_TABLE.lookup(psr)
 
         # Final Initiative calculation
         # initiative = psr_base + faith + sense + initiative_bonus
@@ -4583,63 +6461,15 @@ class CharacterMethods(UtilityMethods):
 
     @staticmethod
     def _wt_lookup(wt_base: int) -> int:
-
-        match wt_base:
-            case -2 | -1 | 0:
-                return 1
-            case 1 | 2 | 3:
-                return 2
-            case 4 | 5 | 6:
-                return 3
-            case 7 | 8 | 9:
-                return 4
-            case 10 | 11 | 12:
-                return 5
-            case 13 | 14 | 15:
-                return 6
-            case 16 | 17 | 18:
-                return 7
-            case 19 | 20 | 21:
-                return 8
-            case 22 | 23 | 24:
-                return 9
-            case 25 | 26 | 27:
-                return 10
-            case 28 | 29 | 30:
-                return 11
-            case 31 | 32 | 33:
-                return 12
-            case _:
-                return int(wt_base / 3) + 1
+        """Requires: wt_base (int); returns int.
+        Lookup table for Wound Thresholds (see stat_tables.WT_TABLE)"""
+        return WT_TABLE.lookup(wt_base)
 
     @staticmethod
     def _mook_wt_lookup(wt_base: int) -> int:
         """Requires: wt_base (int); returns int.
-        Simple lookup table for Mook Wound Thresholds"""
-
-        match wt_base:
-            case -2 | -1 | 0:
-                return 1
-            case 1 | 2 | 3 | 4 | 5 | 6 | 7:
-                return 2
-            case 8 | 9 | 10 | 11 | 12 | 13 | 14:
-                return 3
-            case 15 | 16 | 17 | 18 | 19 | 20 | 21:
-                return 4
-            case 22 | 23 | 24 | 25 | 26 | 27 | 28:
-                return 5
-            case 29 | 30 | 31 | 32 | 33 | 34 | 35:
-                return 6
-            case 36 | 37 | 38 | 39 | 40 | 41 | 42:
-                return 7
-            case 43 | 44 | 45 | 46 | 47 | 48 | 49:
-                return 8
-            case 50 | 51 | 52 | 53 | 54 | 55 | 56:
-                return 9
-            case 57 | 58 | 59 | 60 | 61 | 62 | 63:
-                return 10
-            case _:
-                return int(wt_base / 7) + 1
+        Lookup table for Mook Wound Thresholds (see stat_tables.MOOK_WT_TABLE)"""
+        return MOOK_WT_TABLE.lookup(wt_base)
 
     def calc_live_char_wound_thresholds(
         self, live_char: LiveCharacterModel = None
@@ -4732,6 +6562,17 @@ class CharacterMethods(UtilityMethods):
         else:
             return base_value
 
+    @staticmethod
+    def _min_max_caps_many(base_value: np.ndarray, min_cap, max_cap=100) -> np.ndarray:
+        """Requires: base_value (numpy array), min_cap (int or numpy array), max_cap (int or numpy array); returns
+        numpy array.
+        _min_max_caps for a whole array at once"""
+        return np.where(
+            base_value < min_cap,
+            min_cap,
+            np.where(base_value > max_cap, max_cap, base_value),
+        )
+
     def set_skill_minimums(
         self, live_char: LiveCharacterModel = None
     ) -> LiveCharacterModel:
@@ -4823,6 +6664,86 @@ class CharacterMethods(UtilityMethods):
         self.live_char = live_char
         return live_char
 
+    def calc_derived_stats_many(self, values: np.ndarray, columns: dict) -> np.ndarray:
+        """Requires: values (numpy array), columns (dict); returns numpy array.
+        set_skill_minimums, calc_live_char_initiative, calc_live_char_wound_thresholds and set_armour_value_caps (in
+        housekeeping order) for many live characters at once. values has one row per live character and columns is
+        {stat: column}, as compile_stats_many builds them. values is updated in place and returned."""
+        logging.info(
+            f"{self.chk} {self.col['y']}[calc_derived_stats_many]{self.col['w']}"
+        )
+
+        def stat(name: str) -> np.ndarray:
+            return values[:, columns[name]]
+
+        # Skill Minimums
+        for skill in self.ss.min_1_skills:
+            values[:, columns[skill]] = self._min_max_caps_many(
+                stat(skill + "_actual"), 1
+            )
+
+        # Initiative and Wound Thresholds
+        for stat_name, stat_values in self._thresholds_many(stat).items():
+            values[:, columns[stat_name]] = stat_values
+
+        # Armour Value caps
+        for av in self.ss.armour_values:
+            values[:, columns[av]] = self._min_max_caps_many(
+                stat(av + "_actual"), stat(av + "_min"), stat(av + "_max")
+            )
+
+        return values
+
+    @staticmethod
+    def _thresholds_many(stat) -> dict:
+        """Requires: stat (function); returns dict.
+        Initiative and the Wound Thresholds, as {stat: numpy array}, from stat(name), which gives the values of a
+        LiveCharacterModel stat as a numpy array (one per live character)."""
+        thresholds: dict = {}
+
+        # Initiative (see calc_live_char_initiative)
+        psr = stat("physical") + stat("smarts") + stat("resources")
+        thresholds["initiative"] = INITIATIVE_TABLE.lookup_many(psr) + stat(
+            "initiative_bonus"
+        )
+
+        # Wound Thresholds (see calc_live_char_wound_thresholds)
+        wt_bases = {
+            "physical": stat("physical_actual") + stat("endurance") + stat("scale") - 1,
+            "smarts": stat("smarts_actual") + stat("control"),
+            "resources": stat("resources_actual") + stat("influence"),
+            "wyld": stat("wyld_actual") + stat("resistance"),
+            "divinity": stat("divinity_actual") + stat("faith"),
+        }
+        for wt, wt_base in wt_bases.items():
+            wt_value = WT_TABLE.lookup_many(wt_base) + stat(wt + "_wt_bonus")
+            thresholds[wt + "_wt"] = np.maximum(wt_value, 1)
+        mook_wt = MOOK_WT_TABLE.lookup_many(sum(wt_bases.values())) + stat(
+            "wyld_wt_bonus"
+        )
+        thresholds["mook_wt"] = np.maximum(mook_wt, 1)
+
+        return thresholds
+
+    def calc_thresholds_many(self, live_chars: list) -> dict:
+        """Requires: live_chars (list of LiveCharacterModel); returns dict.
+        Initiative and the Wound Thresholds of many live characters at once (everyone in a fight, say), as
+        {stat: numpy array} in live_chars order, from their current stats. The live characters aren't changed."""
+        logging.info(f"{self.chk} {self.col['y']}[calc_thresholds_many]{self.col['w']}")
+
+        stat_cache: dict = {}
+
+        def stat(name: str) -> np.ndarray:
+            if name not in stat_cache:
+                stat_cache[name] = np.fromiter(
+                    (getattr(live_char, name) for live_char in live_chars),
+                    dtype=np.int64,
+                    count=len(live_chars),
+                )
+            return stat_cache[name]
+
+        return self._thresholds_many(stat)
+
     def set_skill_masteries(
         self, char: CharacterModel = None, live_char: LiveCharacterModel = None
     ) -> LiveCharacterModel:
@@ -5083,14 +7004,9 @@ class CharacterMethods(UtilityMethods):
         if note_type in self.ss.note_types:
             # Add it to the LiveCharacter
             note_name = f"{note_type}_note"
-            current_note = getattr(live_char, note_name, "")
-            if current_note:
-                if note_value not in current_note:
-                    updated_note = f"{current_note}, {note_value}"
-                else:
-                    updated_note = f"{current_note}"
-            else:
-                updated_note = f"{note_value}"
+            updated_note = self._appended_note(
+                current_note=getattr(live_char, note_name, ""), note_value=note_value
+            )
 
             setattr(live_char, note_name, updated_note)
 
@@ -5116,6 +7032,16 @@ class CharacterMethods(UtilityMethods):
             )
             return live_char
 
+    @staticmethod
+    def _appended_note(current_note: str, note_value: str) -> str:
+        """Requires: current_note (str), note_value (str); returns str.
+        current_note with note_value appended, as add_note does, unless it's already in there."""
+        if not current_note:
+            return f"{note_value}"
+        if note_value in current_note:
+            return f"{current_note}"
+        return f"{current_note}, {note_value}"
+
     def get_saved_notes(
         self, live_char: LiveCharacterModel = None, char: CharacterModel = None
     ) -> LiveCharacterModel:
@@ -5157,36 +7083,29 @@ class CharacterMethods(UtilityMethods):
         if not live_char:
             live_char = self.live_char
 
-        mod_info = self.get_mod_info(
-            mod_id=mod_id, optional_fields="name, category, type"
-        )
+        note = self._ets_note(mod_id=mod_id)
+        if note:
+            live_char = self.add_note(
+                note_type=note[0], note_value=note[1], live_char=live_char
+            )
+
+        self.live_char = live_char
+        return live_char
 
-        match mod_info[0][1]:
+    def _ets_note(self, mod_id: str) -> tuple:
+        """Requires: mod_id (str); returns tuple.
+        (note type, note) for a mod that is an Edge, Trait or Sliverware implant, as _if_mod_is_ets_add_note and
+        _compile_other_effects add it, otherwise ()."""
+        record = self.catalog.get(mod_id)
+        match record.category:
             case "edge":
-                live_char = self.add_note(
-                    note_type="edges",
-                    note_value=f"{mod_info[0][0]}",
-                    live_char=live_char,
-                )
+                return "edges", f"{record.name}"
             case "trait":
-                live_char = self.add_note(
-                    note_type="traits",
-                    note_value=f"{mod_info[0][0]} [{mod_info[0][2].upper()}]",
-                    live_char=live_char,
-                )
-
+                return "traits", f"{record.name} [{record.type.upper()}]"
             case "sliverware":
-                live_char = self.add_note(
-                    note_type="sliverware",
-                    note_value=f"{mod_info[0][0]} [{mod_info[0][2].upper()}]",
-                    live_char=live_char,
-                )
-
+                return "sliverware", f"{record.name} [{record.type.upper()}]"
             case _:
-                pass
-
-        self.live_char = live_char
-        return live_char
+                return ()
 
     def pc_exists_by_name(
         self,
@@ -5203,66 +7122,28 @@ class CharacterMethods(UtilityMethods):
         is_deleted: bool. Include pcs marked for deletion?
         pc: player, char or live_char
         player_id: int, enter a player_id if you want to also search by this and the other id
-        lower_case: bool, make the search case-insensitive by making search field and search item lower case
+        lower_case: bool, make the search case-insensitive (COLLATE NOCASE)
         """
         logging.info(f"{self.chk} {self.col['y']}[pc_exists_by_name]{self.col['w']}")
 
         if pc in self.pc_types:
-            match pc:
-                case "char":
-                    table = "characters"
-                    pc_name = "char_name"
-                case "live_char":
-                    table = "live_characters"
-                    pc_name = "char_name"
-                case _:
-                    table = "players"
-                    pc_name = "player_name"
-
-            if lower_case:
-                search_name = search_name.lower()
-
-            if is_deleted:
-                if player_id > -1:
-                    if lower_case:
-                        check_pc_sql = (
-                            f"SELECT * FROM {table} WHERE LOWER({pc_name})='{search_name}' AND "
-                            f"player_id={player_id}"
-                        )
-                    else:
-                        check_pc_sql = (
-                            f"SELECT * FROM {table} WHERE {pc_name}='{search_name}' AND "
-                            f"player_id={player_id}"
-                        )
-
-                else:
-                    if lower_case:
-                        check_pc_sql = f"SELECT * FROM {table} WHERE LOWER({pc_name})='{search_name}'"
-                    else:
-                        check_pc_sql = (
-                            f"SELECT * FROM {table} WHERE {pc_name}='{search_name}'"
-                        )
-
+            # lower_case matches with COLLATE NOCASE rather than LOWER(), so the name index is still used
+            check_pc_sql = queries.pc_by_name(
+                pc=pc,
+                lower_case=lower_case,
+                by_player_id=player_id > -1,
+                include_deleted=is_deleted,
+            )
+            if player_id > -1:
+                sql_data_tuple = (search_name, player_id)
             else:
-                if player_id > -1:
-                    if lower_case:
-                        check_pc_sql = (
-                            f"SELECT * FROM {table} WHERE LOWER({pc_name})='{search_name}' AND player_id={player_id} "
-                            f"AND deleted=0"
-                        )
-                    else:
-                        check_pc_sql = (
-                            f"SELECT * FROM {table} WHERE {pc_name}='{search_name}' AND player_id={player_id} "
-                            f"AND deleted=0"
-                        )
-                else:
-                    if lower_case:
-                        check_pc_sql = f"SELECT * FROM {table} WHERE LOWER({pc_name})='{search_name}' AND deleted=0"
-                    else:
-                        check_pc_sql = f"SELECT * FROM {table} WHERE {pc_name}='{search_name}' AND deleted=0"
+                sql_data_tuple = (search_name,)
 
             pc_exists = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], check_pc_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                check_pc_sql,
+                sql_data_tuple=sql_data_tuple,
             )
 
             return pc_exists
@@ -5286,32 +7167,16 @@ class CharacterMethods(UtilityMethods):
         logging.info(f"{self.chk} {self.col['y']}[pc_exists_by_id]{self.col['w']}")
 
         if pc in self.pc_types:
-            match pc:
-                case "char":
-                    table = "characters"
-                    pc_id = "char_id"
-                case "live_char":
-                    table = "live_characters"
-                    pc_id = "live_char_id"
-                case _:
-                    table = "players"
-                    pc_id = "player_id"
-
-            if is_deleted:
-                if lc:
-                    check_pc_sql = f"SELECT * FROM {table} WHERE char_id={search_id}"
-                else:
-                    check_pc_sql = f"SELECT * FROM {table} WHERE {pc_id}={search_id}"
-            else:
-                if lc:
-                    check_pc_sql = f"SELECT * FROM {table} WHERE char_id={search_id}"
-                else:
-                    check_pc_sql = (
-                        f"SELECT * FROM {table} WHERE {pc_id}={search_id} AND deleted=0"
-                    )
+            # Searching live_characters by char_id (lc) always includes those marked for deletion
+            check_pc_sql = queries.pc_by_id(
+                pc=pc, include_deleted=is_deleted or lc, by_char_id=lc
+            )
 
             pc_exists = self.db_fetch(
-                self.chardata_db["db"], self.chardata_db["db_path"], check_pc_sql
+                self.chardata_db["db"],
+                self.chardata_db["db_path"],
+                check_pc_sql,
+                sql_data_tuple=(search_id,),
             )
             return pc_exists
         else:
@@ -5356,14 +7221,20 @@ class CharacterMethods(UtilityMethods):
             f"{self.chk} {self.col['y']}[_convert_model_to_dict]{self.col['w']}"
         )
 
-        # Turns the CharacterModel, LiveCharacterModel, or PlayerModel into a dict for storage
-        model_dict = model.dict()
+        # Turns the CharacterModel, LiveCharacterModel, or PlayerModel into a dict for storage. None of them has
+        # models in its fields, so their __dict__ is the dict without .dict() copying every field again
+        if has_nested_models(model.__class__):
+            model_dict = model.dict()
+        else:
+            model_dict = model.__dict__
         # Convert it to valid JSON
         model_json = dumps(model_dict, default=str)
-        logging.debug(
-            f"{self.chk} {self.py_txt} Model Dict from _convert_model_to_dict is: {self.col['y']}"
-            f"{dumps(model_dict, indent=4, default=str)}{self.col['w']}"
-        )
+        # Only indent a second copy when it is going to be logged, it costs more than the conversion
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(
+                f"{self.chk} {self.py_txt} Model Dict from _convert_model_to_dict is: {self.col['y']}"
+                f"{dumps(model_dict, indent=4, default=str)}{self.col['w']}"
+            )
         logging.info(
             f"{self.chk} {self.py_txt} Converting player, character or live_character known as "
             f"{self.col['g']}{logging_name}{self.col['w']} Model to a dict for safe JSON storage in DB."
@@ -5397,25 +7268,21 @@ class CharacterMethods(UtilityMethods):
                     by_player_id = -1
                 case _:
                     table = "players"
-            pc_id = pc + "_id"
-            pc_name = pc + "_name"
-
-            if include_deleted:
-                if by_player_id >= 0:
-                    list_pc_sql = f"SELECT {pc_id}, {pc_name} FROM {table} WHERE player_id={by_player_id}"
-                else:
-                    list_pc_sql = f"SELECT {pc_id}, {pc_name} FROM {table}"
+            if by_player_id >= 0:
+                sql_data_tuple = (by_player_id,)
             else:
-                if by_player_id >= 0:
-                    list_pc_sql = f"SELECT {pc_id}, {pc_name} FROM {table} WHERE deleted=0 AND player_id={by_player_id}"
-                else:
-                    list_pc_sql = (
-                        f"SELECT {pc_id}, {pc_name} FROM {table} WHERE deleted=0"
-                    )
+                sql_data_tuple = ()
 
             pc_tuple = tuple(
                 self.db_fetch(
-                    self.chardata_db["db"], self.chardata_db["db_path"], list_pc_sql
+                    self.chardata_db["db"],
+                    self.chardata_db["db_path"],
+                    queries.pc_list(
+                        pc=pc,
+                        by_player_id=by_player_id >= 0,
+                        include_deleted=include_deleted,
+                    ),
+                    sql_data_tuple=sql_data_tuple,
                 )
             )
 
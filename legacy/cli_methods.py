@@ -4,12 +4,12 @@ __author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
 
 from character_dataclasses import (
     BSCMConfig,
-    BreedTemplates,
     CharacterModel,
     LiveCharacterModel,
     CLIMenus,
 )
 from delete_methods import DeleteMethods
+from gamedata_snapshot import load_breed_templates
 
 # from json import dumps
 from time import sleep
@@ -27,7 +27,7 @@ class CLIMethods(DeleteMethods):
         self.bscm = bscm
         menus = CLIMenus()
         self.menus = menus
-        bt = BreedTemplates()
+        bt = load_breed_templates(self.gamedata_db["db_path"])
         self.bt = bt
 
         which_app = "main.py"
@@ -584,7 +584,7 @@ class CLIMethods(DeleteMethods):
 
     def cli_create_new_char(self, header: bool = True, proceed: bool = False):
         """This method adds a CLI way to create a new character and save it to the DB."""
-        bt = BreedTemplates()
+        bt = self.bt
         char_name: str
         char_archetype: str
         char_type: str
@@ -750,7 +750,7 @@ class CLIMethods(DeleteMethods):
         char: CharacterModel,
         step: int = 0,
     ) -> CharacterModel:
-        bt = BreedTemplates()
+        bt = self.bt
         breeds_list: list = []
         breed_mod_name: str = ""
         char_name: str = char.char_name
@@ -1241,11 +1241,8 @@ class CLIMethods(DeleteMethods):
                         case _:
                             # Option 1
                             sliver_list = self.bscm.sliver_bodyweb
-                    for i in sliver_list:
-                        if search_text:
-                            search_text = f"{search_text}' OR mod_id='{i}"
-                        else:
-                            search_text = f"{i}"
+                    # The sliver search takes a comma separated list of mod_ids
+                    search_text = ", ".join(sliver_list)
                 case "bio":
                     mod_sliver = "sliverware"
                     search_type = "sliver"
@@ -1258,11 +1255,8 @@ class CLIMethods(DeleteMethods):
                         case _:
                             # Option 1
                             sliver_list = self.bscm.sliver_biosculpting
-                    for i in sliver_list:
-                        if search_text:
-                            search_text = f"{search_text}' OR mod_id='{i}"
-                        else:
-                            search_text = f"{i}"
+                    # The sliver search takes a comma separated list of mod_ids
+                    search_text = ", ".join(sliver_list)
                 case "skill":
                     pass
                 case "smx":
@@ -1610,7 +1604,8 @@ class CLIMethods(DeleteMethods):
             safe_input = search_text
             # safe_input = self.string_safe(input_string=search_text)
 
-        db_search = self.mod_name_search(
+        # Served from the in-memory prefix index, so no DB query per search
+        db_search = self.mod_autocomplete(
             search_text=safe_input,
             mod_cat=mod_cat,
             mod_type=mod_type,
@@ -2125,112 +2120,101 @@ class CLIMethods(DeleteMethods):
                     if mod_skl:
                         logging.info(f"search criteria: mod_cat, mod_type, mod_skl")
                         safe_input = mod_skl
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}' "
-                            f"AND mod_id='{mod_skl}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type, mod_skl)
                     elif mod_id:
                         logging.info(f"search criteria: mod_cat, mod_type, mod_id")
                         safe_input = mod_id
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}' "
-                            f"AND mod_id='{mod_id}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type, mod_id)
                     else:
                         logging.info(f"search criteria: mod_cat, mod_type")
                         safe_input = mod_cat
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type)
                 else:
                     if mod_skl:
                         logging.info(f"search criteria: mod_cat, mod_skl")
                         safe_input = mod_skl
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, "
-                            f"effects, ref FROM gamedata WHERE category='{mod_cat}' AND mod_id='{mod_skl}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_skl)
                     elif mod_id:
                         logging.info(f"search criteria: mod_cat, mod_id")
                         safe_input = mod_id
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}' "
-                            f"AND mod_id='{mod_id}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type, mod_id)
                     else:
                         logging.info(f"search criteria: mod_cat")
                         safe_input = mod_cat
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}'"
-                        )
+                        sql_search_like = queries.mod_search(by_category=True)
+                        sql_data_tuple = (mod_cat,)
             elif mod_type:
                 if mod_cat:
                     if mod_skl:
                         logging.info(f"search criteria: mod_cat, mod_type, mod_skl")
                         safe_input = mod_skl
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}' AND mod_id='{mod_skl}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type, mod_skl)
                     elif mod_id:
                         logging.info(f"search criteria: mod_cat, mod_type, mod_id")
                         safe_input = mod_id
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}' "
-                            f"AND mod_id='{mod_id}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type, mod_id)
                     else:
                         logging.info(f"search criteria: mod_cat, mod_type")
                         safe_input = mod_cat
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type)
                 else:
                     if mod_skl:
                         logging.info(f"search criteria: mod_type, mod_skl")
                         safe_input = mod_skl
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE type='{mod_type}' AND mod_id='{mod_skl}'"
+                        sql_search_like = queries.mod_search(
+                            by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_type, mod_skl)
                     elif mod_id:
                         logging.info(f"search criteria: mod_type, mod_id")
                         safe_input = mod_id
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE category='{mod_cat}' AND type='{mod_type}' "
-                            f"AND mod_id='{mod_id}'"
+                        sql_search_like = queries.mod_search(
+                            by_category=True, by_type=True, by_mod_id=True
                         )
+                        sql_data_tuple = (mod_cat, mod_type, mod_id)
                     else:
                         logging.info(f"search criteria: mod_type")
                         safe_input = mod_type
-                        sql_search_like = (
-                            f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                            f"FROM gamedata WHERE type='{mod_type}'"
-                        )
+                        sql_search_like = queries.mod_search(by_type=True)
+                        sql_data_tuple = (mod_type,)
             elif search_id:  # and not mod_cat and not mod_type and not search str
                 logging.info(f"search criteria: search_id")
                 safe_input = str(search_id)
-                sql_search_like = (
-                    f"SELECT * FROM {search_table} WHERE {id_field}={search_id}"
-                )
+                sql_search_like = queries.search_by_field(search_table, id_field)
+                sql_data_tuple = (search_id,)
             elif search_str:  # and not mod_cat and not mod_type and not search id
                 logging.info(f"search criteria: search_str")
                 safe_input = search_str
                 if mod_id:
-                    sql_search_like = (
-                        f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                        f"FROM gamedata WHERE mod_id='{mod_id}' "
-                    )
+                    sql_search_like = queries.mod_search(by_mod_id=True)
+                    sql_data_tuple = (mod_id,)
                 else:
-                    sql_search_like = f"SELECT * FROM {search_table} WHERE LOWER({search_field}) LIKE '{safe_input}%' "
+                    sql_search_like = queries.search_like(search_table, search_field)
+                    sql_data_tuple = (queries.like_prefix(safe_input),)
             else:
                 logging.info(f"search criteria: other")
                 input_like = input(
@@ -2241,19 +2225,21 @@ class CLIMethods(DeleteMethods):
                 )
                 safe_input = self.string_safe(input_string=input_like, to_lower=True)
                 if search_type == "mod":
-                    sql_search_like = (
-                        f"SELECT mod_id, name, description, category, type, prereqs, restriction, effects, ref "
-                        f"FROM gamedata WHERE LOWER({search_field}) LIKE '{safe_input}%' "
-                        f"ORDER BY {search_field}"
+                    sql_search_like = queries.search_like(
+                        "gamedata", search_field, queries.MOD_SEARCH_FIELDS
                     )
+                    sql_data_tuple = (queries.like_prefix(safe_input),)
                 else:
-                    sql_search_like = (
-                        f"SELECT * FROM {search_table} WHERE LOWER({search_field}) LIKE '{safe_input}%' "
-                        f"ORDER BY {search_field}"
-                    )
-
-            logging.info(f"SQL: {sql_search_like}")
-            db_search = self.db_fetch(db=db, db_path=db_path, fetch_sql=sql_search_like)
+                    sql_search_like = queries.search_like(search_table, search_field)
+                    sql_data_tuple = (queries.like_prefix(safe_input),)
+
+            logging.info(f"SQL: {sql_search_like} {sql_data_tuple}")
+            db_search = self.db_fetch(
+                db=db,
+                db_path=db_path,
+                fetch_sql=sql_search_like,
+                sql_data_tuple=sql_data_tuple,
+            )
         else:
             if search_type == "char":
                 if char.deleted:
@@ -0,0 +1,155 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+import sqlite3
+import logging
+import os
+
+logging.basicConfig(level=logging.WARNING)
+
+# Schema migrations for the gamedata and chardata DBs, tracked with PRAGMA user_version (0 = un-versioned). Each
+# one is applied in a single transaction with its version bump. APPEND new migrations, never edit a shipped one.
+
+GAMEDATA_MIGRATIONS: list = [
+    (
+        1,
+        "Real PRIMARY KEY on gamedata.mod_id, NOCASE name, indexes on (category, type), type and name",
+        [
+            "CREATE TABLE gamedata_v1 (mod_id VARCHAR PRIMARY KEY NOT NULL, name TEXT COLLATE NOCASE, "
+            "description TEXT, category TEXT, type VARCHAR, choose_text BOOL, allow_multiple BOOL, prereqs TEXT, "
+            "prereq_any BOOL, restriction TEXT, restriction_any BOOL, skills_touched TEXT, effects TEXT, ref TEXT)",
+            "INSERT INTO gamedata_v1 SELECT * FROM gamedata ORDER BY rowid",
+            "DROP TABLE gamedata",
+            "ALTER TABLE gamedata_v1 RENAME TO gamedata",
+            "CREATE INDEX gamedata_category_type ON gamedata (category, type)",
+            "CREATE INDEX gamedata_type ON gamedata (type)",
+            "CREATE INDEX gamedata_name ON gamedata (name)",
+        ],
+    ),
+    (
+        2,
+        "FTS5 full-text index (gamedata_fts) over name, description, category, type and effects",
+        [
+            # External content table: the text lives in gamedata, gamedata_fts only holds the index. It must be
+            # rebuilt whenever gamedata is rewritten (see ExcelImport.rebuild_gamedata_fts)
+            "DROP TABLE IF EXISTS gamedata_fts",
+            "CREATE VIRTUAL TABLE gamedata_fts USING fts5(name, description, category, type, effects, "
+            "content='gamedata', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')",
+            "INSERT INTO gamedata_fts (gamedata_fts) VALUES ('rebuild')",
+        ],
+    ),
+    (
+        3,
+        "gamedata_hashes: a hash of each exported gamedata row, for incremental exports",
+        [
+            # Filled in by run_gamedata_export.py. A DB without hashes is hashed from its rows on the next export
+            "DROP TABLE IF EXISTS gamedata_hashes",
+            "CREATE TABLE gamedata_hashes (mod_id VARCHAR PRIMARY KEY NOT NULL, row_hash TEXT NOT NULL)",
+        ],
+    ),
+]
+
+CHARDATA_MIGRATIONS: list = [
+    (
+        1,
+        "Real PRIMARY KEYs on player_id, char_id and live_char_id, NOCASE names, indexes on ids, names and deleted",
+        [
+            # players
+            "CREATE TABLE players_v1 (player_id INTEGER PRIMARY KEY NOT NULL, player_name TEXT COLLATE NOCASE, "
+            "player_real_name TEXT, player_email TEXT, player_json TEXT, deleted BOOL)",
+            "INSERT INTO players_v1 (player_id, player_name, player_real_name, player_email, player_json, deleted) "
+            "SELECT player_id, player_name, player_real_name, player_email, player_json, deleted FROM players",
+            "DROP TABLE players",
+            "ALTER TABLE players_v1 RENAME TO players",
+            "CREATE INDEX players_name ON players (player_name)",
+            "CREATE INDEX players_deleted ON players (deleted)",
+            # characters
+            "CREATE TABLE characters_v1 (char_id INTEGER PRIMARY KEY NOT NULL, char_name TEXT COLLATE NOCASE, "
+            "char_archetype TEXT, player_id INT, char_type TEXT, char_json TEXT, deleted BOOL)",
+            "INSERT INTO characters_v1 (char_id, char_name, char_archetype, player_id, char_type, char_json, deleted) "
+            "SELECT char_id, char_name, char_archetype, player_id, char_type, char_json, deleted FROM characters",
+            "DROP TABLE characters",
+            "ALTER TABLE characters_v1 RENAME TO characters",
+            "CREATE INDEX characters_player_id ON characters (player_id)",
+            "CREATE INDEX characters_name ON characters (char_name)",
+            "CREATE INDEX characters_deleted ON characters (deleted)",
+            # live_characters
+            "CREATE TABLE live_characters_v1 (live_char_id INTEGER PRIMARY KEY NOT NULL, char_id INT, player_id INT, "
+            "char_name TEXT COLLATE NOCASE, live_char_json TEXT, deleted BOOL)",
+            "INSERT INTO live_characters_v1 (live_char_id, char_id, player_id, char_name, live_char_json, deleted) "
+            "SELECT live_char_id, char_id, player_id, char_name, live_char_json, deleted FROM live_characters",
+            "DROP TABLE live_characters",
+            "ALTER TABLE live_characters_v1 RENAME TO live_characters",
+            "CREATE INDEX live_characters_char_id ON live_characters (char_id)",
+            "CREATE INDEX live_characters_player_id ON live_characters (player_id)",
+            "CREATE INDEX live_characters_name ON live_characters (char_name)",
+            "CREATE INDEX live_characters_deleted ON live_characters (deleted)",
+        ],
+    ),
+]
+
+# DB paths already brought up to date by this process
+_migrated: set = set()
+
+
+def get_schema_version(db: str, db_path: str) -> int:
+    """Requires: db (str), db_path (str); returns int.
+    Returns the schema version (PRAGMA user_version) of a DB."""
+    conn = sqlite3.connect(db_path + db)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_migration(conn, migration_version: int, statements: list) -> None:
+    """Requires: conn (sqlite3.Connection), migration_version (int), statements (list); returns None.
+    Runs one migration's statements and sets user_version to migration_version. Committing is left to the caller,
+    so a migration can be part of a larger transaction (see ExcelImport.create_gamedata_db)."""
+    for statement in statements:
+        conn.execute(statement)
+    # PRAGMA doesn't accept bound parameters, but migration_version is always an int from the lists above
+    conn.execute(f"PRAGMA user_version = {int(migration_version)}")
+
+
+def migrate_db(db: str, db_path: str, migrations: list, force: bool = False) -> int:
+    """Requires: db (str), db_path (str), migrations (list); returns int.
+    Applies every migration newer than the DB's current schema version and returns the new version. Each migration
+    runs in its own transaction and is rolled back completely on failure.
+    Only checks each DB once per process unless force = True."""
+    full_path = db_path + db
+    if full_path in _migrated and not force:
+        return migrations[-1][0] if migrations else 0
+
+    if not os.path.exists(full_path):
+        logging.warning(f"SQLite: can't migrate {full_path} as it doesn't exist")
+        return 0
+
+    conn = sqlite3.connect(full_path, isolation_level=None)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for migration_version, description, statements in migrations:
+            if migration_version <= version:
+                continue
+
+            logging.warning(
+                f"SQLite: migrating {full_path} from schema v{version} to v{migration_version}: {description}"
+            )
+            conn.execute("BEGIN")
+            try:
+                run_migration(conn, migration_version, statements)
+            except sqlite3.Error as e:
+                conn.rollback()
+                logging.error(
+                    f"SQLite: migration of {full_path} to v{migration_version} FAILED and was rolled back: {e}"
+                )
+                raise
+            else:
+                conn.commit()
+            version = migration_version
+    finally:
+        conn.close()
+
+    _migrated.add(full_path)
+    return version
@@ -3,6 +3,7 @@ __version__ = "2.1.50"
 __author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
 
 from character_methods import CharacterMethods
+import queries
 import logging
 
 logging.basicConfig(level=logging.WARNING)
@@ -39,12 +40,11 @@ class DeleteMethods(CharacterMethods):
         )
 
         # CHECK IF MARKED FOR DELETION OR NOT
-        delete_check_sql = f"SELECT {id_type} FROM {table} WHERE {id_type}={delete_id} AND deleted={delete_value}"
-
         delete_check = self.db_fetch(
             self.chardata_db["db"],
             self.chardata_db["db_path"],
-            delete_check_sql,
+            queries.pc_deleted_check(id_type.removesuffix("_id")),
+            sql_data_tuple=(delete_id, delete_value),
         )
 
         if delete_check:
@@ -93,11 +93,11 @@ class DeleteMethods(CharacterMethods):
             if check_in_db:
                 if table and pc_id:
                     # IS ID MARKED FOR DELETION IN DB?
-                    check_if_deleted_sql = f"SELECT {pc_id} FROM {table} WHERE {pc_id}={delete_id} and deleted=1"
                     is_deleted = self.db_fetch(
                         self.chardata_db["db"],
                         self.chardata_db["db_path"],
-                        check_if_deleted_sql,
+                        queries.pc_deleted_check(pc),
+                        sql_data_tuple=(delete_id, 1),
                     )
 
                     if is_deleted:
@@ -120,11 +120,11 @@ class DeleteMethods(CharacterMethods):
                             logging.info(
                                 f"{self.chk} {self.sql_txt} live_char_id:{lc_id}"
                             )
-                            lc_delete_sql = f"UPDATE live_characters SET deleted=1 WHERE live_char_id={lc_id}"
                             self.db_fetch(
                                 self.chardata_db["db"],
                                 self.chardata_db["db_path"],
-                                lc_delete_sql,
+                                queries.pc_set_deleted("live_char"),
+                                sql_data_tuple=(1, lc_id),
                                 allow_edit=True,
                             )
 
@@ -135,12 +135,11 @@ class DeleteMethods(CharacterMethods):
                         if check_id_exists:
                             # ID EXISTS -> MARK FOR DELETION
 
-                            delete_sql = f"UPDATE {table} SET deleted=1 WHERE {pc_id}={delete_id}"
-
                             self.db_fetch(
                                 self.chardata_db["db"],
                                 self.chardata_db["db_path"],
-                                delete_sql,
+                                queries.pc_set_deleted(pc),
+                                sql_data_tuple=(1, delete_id),
                                 allow_edit=True,
                             )
 
@@ -157,11 +156,11 @@ class DeleteMethods(CharacterMethods):
                                 logging.info(
                                     f"{self.chk} {self.sql_txt} live_char_id:{lc_id}"
                                 )
-                                lc_delete_sql = f"UPDATE live_characters SET deleted=1 WHERE live_char_id={lc_id}"
                                 self.db_fetch(
                                     self.chardata_db["db"],
                                     self.chardata_db["db_path"],
-                                    lc_delete_sql,
+                                    queries.pc_set_deleted("live_char"),
+                                    sql_data_tuple=(1, lc_id),
                                     allow_edit=True,
                                 )
 
@@ -222,11 +221,11 @@ class DeleteMethods(CharacterMethods):
             if check_in_db:
                 if table and pc_id:
                     # IS ID ALREADY MARKED FOR DELETION IN DB?
-                    check_if_deleted_sql = f"SELECT {pc_id} FROM {table} WHERE {pc_id}={delete_id} and deleted=1"
                     is_deleted = self.db_fetch(
                         self.chardata_db["db"],
                         self.chardata_db["db_path"],
-                        check_if_deleted_sql,
+                        queries.pc_deleted_check(pc),
+                        sql_data_tuple=(delete_id, 1),
                     )
 
                     if is_deleted:
@@ -236,14 +235,11 @@ class DeleteMethods(CharacterMethods):
                             f"{self.col['red']}REMOVING{self.col['white']} mark for deletion in DB."
                         )
 
-                        undelete_sql = (
-                            f"UPDATE {table} SET deleted=0 WHERE {pc_id}={delete_id}"
-                        )
-
                         self.db_fetch(
                             self.chardata_db["db"],
                             self.chardata_db["db_path"],
-                            undelete_sql,
+                            queries.pc_set_deleted(pc),
+                            sql_data_tuple=(0, delete_id),
                             allow_edit=True,
                         )
 
@@ -260,11 +256,11 @@ class DeleteMethods(CharacterMethods):
                             logging.info(
                                 f"{self.chk} {self.sql_txt} live_char_id:{lc_id}"
                             )
-                            lc_delete_sql = f"UPDATE live_characters SET deleted=0 WHERE live_char_id={lc_id}"
                             self.db_fetch(
                                 self.chardata_db["db"],
                                 self.chardata_db["db_path"],
-                                lc_delete_sql,
+                                queries.pc_set_deleted("live_char"),
+                                sql_data_tuple=(0, lc_id),
                                 allow_edit=True,
                             )
 
@@ -294,11 +290,11 @@ class DeleteMethods(CharacterMethods):
                                 logging.info(
                                     f"{self.chk} {self.sql_txt} live_char_id:{lc_id}"
                                 )
-                                lc_delete_sql = f"UPDATE live_characters SET deleted=0 WHERE live_char_id={lc_id}"
                                 self.db_fetch(
                                     self.chardata_db["db"],
                                     self.chardata_db["db_path"],
-                                    lc_delete_sql,
+                                    queries.pc_set_deleted("live_char"),
+                                    sql_data_tuple=(0, lc_id),
                                     allow_edit=True,
                                 )
                             return True
@@ -349,12 +345,10 @@ class DeleteMethods(CharacterMethods):
 
             if pc:
                 # CHECK IF ANY RECORDS ARE MARKED FOR DELETION
-                check_if_deleted_sql = f"SELECT * FROM {table} WHERE deleted=1"
-
                 need_delete = self.db_fetch(
                     self.chardata_db["db"],
                     self.chardata_db["db_path"],
-                    check_if_deleted_sql,
+                    queries.pc_marked_deleted(pc),
                 )
 
                 if not need_delete:
@@ -366,21 +360,18 @@ class DeleteMethods(CharacterMethods):
                     return False
                 else:
                     # RECORDS ARE MARKED FOR DELETION -> DELETE THEM
-                    purge_sql = f"DELETE FROM {table} WHERE deleted=1"
-
                     self.db_fetch(
                         self.chardata_db["db"],
                         self.chardata_db["db_path"],
-                        purge_sql,
+                        queries.pc_purge_deleted(pc),
                         allow_edit=True,
                     )
 
                     # CHECK ACTION COMPLETED CORRECTLY
-                    purge_check_sql = f"SELECT * FROM {table} WHERE deleted=1"
                     purge_check_check = self.db_fetch(
                         self.chardata_db["db"],
                         self.chardata_db["db_path"],
-                        purge_check_sql,
+                        queries.pc_marked_deleted(pc),
                     )
 
                     if not purge_check_check:
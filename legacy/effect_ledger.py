@@ -0,0 +1,143 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+# What each mod applied did to a LiveCharacterModel (see EffectLedger.record), so it can be taken off again
+# without rebuilding the live character.
+
+# Separators apply_mod_to_live_character, write_touched_entry and add_note put between appended text
+TEXT_SEPARATORS: tuple = (". \n", ", ")
+
+
+class EffectLedger:
+    """The deltas of the mods applied to one LiveCharacterModel, keyed by mod_id (a mod's effects are only ever
+    applied once, see applied_mods_check). Only mods applied while the ledger existed, or replayed into it by
+    CharacterMethods.seed_effect_ledger, are in it."""
+
+    def __init__(self, live_char):
+        self.live_char = live_char
+        self.deltas: dict = {}
+
+    def __contains__(self, mod_id):
+        return mod_id in self.deltas
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def tracks(self, live_char) -> bool:
+        """Requires: live_char (LiveCharacterModel); returns bool.
+        True if this is the ledger for that LiveCharacterModel (the same object, not just the same live_char_id)."""
+        return self.live_char is live_char
+
+    def fork(self, live_char) -> "EffectLedger":
+        """Requires: live_char (LiveCharacterModel); returns EffectLedger.
+        A ledger for live_char (a copy of the live character this one tracks) with the same deltas, so mods applied
+        before the copy was made can still be taken off it."""
+        ledger = EffectLedger(live_char)
+        ledger.deltas = dict(self.deltas)
+        return ledger
+
+    def record(self, mod_id: str, before: dict, after: dict, replace_stats=()) -> dict:
+        """Requires: mod_id (str), before (dict), after (dict), replace_stats (list); returns dict.
+        Stores the delta between two snapshots of stat: value (lists copied) for mod_id and returns it. Stats in
+        replace_stats are always recorded as "set"."""
+        delta: dict = {}
+        for stat, old in before.items():
+            new = after.get(stat)
+            if new == old and type(new) is type(old):
+                continue
+            if stat in replace_stats:
+                delta[stat] = ("set", old, new)
+            elif type(old) is int and type(new) is int:
+                delta[stat] = ("add", new - old)
+            elif type(old) is str and type(new) is str and new.startswith(old):
+                delta[stat] = ("append" if old else "prefix", new[len(old) :])
+            elif type(old) is list and type(new) is list and new[: len(old)] == old:
+                delta[stat] = ("extend", new[len(old) :])
+            else:
+                delta[stat] = ("set", old, new)
+
+        self.deltas[mod_id] = delta
+        return delta
+
+    def fits(self, mod_id: str, live_char) -> bool:
+        """Requires: mod_id (str), live_char (LiveCharacterModel); returns bool.
+        True if mod_id's delta could still be reverted on live_char: the text it appended and the list items it added
+        are still there, the stats it set still have the value it set them to and the stats it added to are still
+        ints."""
+        for stat, change in self.deltas.get(mod_id, {}).items():
+            if not hasattr(live_char, stat):
+                return False
+            current = getattr(live_char, stat)
+            match change[0]:
+                case "add":
+                    fits = type(current) is int
+                case "prefix" | "append":
+                    fits = type(current) is str and change[1] in current
+                case "extend":
+                    fits = type(current) is list and all(
+                        x in current for x in change[1]
+                    )
+                case _:
+                    fits = current == change[2]
+            if not fits:
+                return False
+
+        return True
+
+    def forget(self, mod_id: str) -> None:
+        """Requires: mod_id (str); returns None.
+        Drops mod_id's delta, so taking it off has to rebuild the live character."""
+        self.deltas.pop(mod_id, None)
+
+    def revert(self, mod_id: str, live_char) -> set:
+        """Requires: mod_id (str), live_char (LiveCharacterModel); returns set.
+        Takes mod_id's delta off live_char and forgets it. Returns the names of the stats that were changed, so the
+        caller knows which derived stats to recalculate."""
+        delta = self.deltas.pop(mod_id, {})
+        changed: set = set()
+        for stat, change in delta.items():
+            current = getattr(live_char, stat)
+            match change[0]:
+                case "add":
+                    new = current - change[1]
+                case "prefix" | "append":
+                    new = self.cut_text(current, change[1], change[0] == "prefix")
+                case "extend":
+                    new = list(current)
+                    for item in change[1]:
+                        if item in new:
+                            new.remove(item)
+                case _:
+                    if current != change[2]:
+                        logging.info(
+                            f"EffectLedger: {stat} has been changed since {mod_id} set it, so leaving it"
+                        )
+                        continue
+                    new = change[1]
+
+            setattr(live_char, stat, new)
+            changed.add(stat)
+
+        return changed
+
+    @staticmethod
+    def cut_text(text: str, segment: str, prefix: bool = False) -> str:
+        """Requires: text (str), segment (str), prefix (bool); returns str.
+        Removes a segment of text written by a mod. A prefix segment was written to an empty stat, so it is cut
+        from the start along with the separator of whatever was appended after it."""
+        if prefix and text.startswith(segment):
+            text = text[len(segment) :]
+            if text.startswith(". \n**") and ":** " in text:
+                # general_note style: the first entry has no "**mod name:** " heading, so the next one loses its
+                return text.split(":** ", maxsplit=1)[1]
+            for separator in TEXT_SEPARATORS:
+                if text.startswith(separator):
+                    return text[len(separator) :]
+            return text
+
+        return text.replace(segment, "", 1)
@@ -0,0 +1,232 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from typing import Optional
+from character_dataclasses import NodeMap, BreedTemplates
+from json import dumps
+import hashlib
+import logging
+import pickle
+import struct
+import os
+
+logging.basicConfig(level=logging.WARNING)
+
+# Pickled snapshot of the gamedata catalog, NodeMap and BreedTemplates, only used while its magic, version, xlsx
+# hash and defaults hash all match (see load_snapshot). It is only ever read back by this program, never from
+# anywhere else.
+
+SNAPSHOT_MAGIC: bytes = b"BSGDSNAP"
+SNAPSHOT_VERSION: int = 2
+SNAPSHOT_FILE: str = "broken_shield_gamedata.snapshot"
+SNAPSHOT_XLSX: str = "broken_shield_gamedata.xlsx"
+
+# SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SHA-256 of the xlsx, SHA-256 of the defaults (defaults_hash); the pickled dict
+# follows. Bump SNAPSHOT_VERSION whenever any of it changes
+_header = struct.Struct("<8sH32s32s")
+
+# Loaded snapshots (or None where there isn't a usable one), keyed by gamedata directory
+_snapshots: dict = {}
+
+
+def source_hash(file_path: str) -> bytes:
+    """Requires: file_path (str); returns bytes.
+    SHA-256 digest of a file, or 32 zero bytes if it doesn't exist."""
+    try:
+        with open(file_path, "rb") as source:
+            return hashlib.sha256(source.read()).digest()
+    except OSError:
+        return bytes(32)
+
+
+def model_defaults(model_class) -> dict:
+    """Requires: model_class (pydantic model class); returns dict.
+    The field values of a model_class built with no arguments, read from its fields rather than by building (and
+    validating) one. NodeMap and BreedTemplates have no validators, so this is what model_class().dict() gives."""
+    return {
+        name: field.default_factory() if field.default_factory else field.default
+        for name, field in model_class.__fields__.items()
+    }
+
+
+def defaults_hash() -> bytes:
+    """Returns the SHA-256 digest of the NodeMap and BreedTemplates defaults, the part of character_dataclasses.py
+    the snapshot holds."""
+    payload = dumps(
+        [model_defaults(NodeMap), model_defaults(BreedTemplates)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+class GamedataSnapshot:
+    """A loaded snapshot. The catalog data is shared (treat it as read-only, as with ModCatalog). NodeMap and
+    BreedTemplates are kept pickled and unpickled on every call, so each caller gets its own copy just as
+    NodeMap() would give them."""
+
+    def __init__(self, path: str, data: dict):
+        self.path = path
+        self.db: str = data["db"]
+        self.table: str = data["table"]
+        self.catalog_rows: tuple = data["catalog_rows"]
+        self.catalog_parsed: tuple = data["catalog_parsed"]
+        self._node_map: bytes = data["node_map"]
+        self._breed_templates: bytes = data["breed_templates"]
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.path}, {len(self.catalog_rows)} mods)"
+
+    def matches(self, db: str, table: str) -> bool:
+        """Requires: db (str), table (str); returns bool.
+        True if the snapshot was taken from this gamedata DB and table."""
+        return self.db == db and self.table == table
+
+    def node_map(self) -> NodeMap:
+        """Returns a NodeMap built from the snapshot, skipping pydantic validation."""
+        return NodeMap.construct(**pickle.loads(self._node_map))
+
+    def breed_templates(self) -> BreedTemplates:
+        """Returns a BreedTemplates built from the snapshot, skipping pydantic validation."""
+        return BreedTemplates.construct(**pickle.loads(self._breed_templates))
+
+
+def write_snapshot(
+    catalog,
+    db_path: str = "./gamedata/",
+    snapshot_file: str = SNAPSHOT_FILE,
+    xlsx: str = SNAPSHOT_XLSX,
+) -> str:
+    """Requires: catalog (ModCatalog); returns str.
+    Writes the snapshot of a loaded catalog (plus the current NodeMap and BreedTemplates) to db_path and returns its
+    path. The file is written to a temporary name first and then renamed, so a reader never sees half a snapshot."""
+    if not catalog.loaded:
+        catalog.load(from_db=True)
+
+    data = {
+        "db": catalog.db,
+        "table": catalog.table,
+        "catalog_rows": tuple(tuple(record) for record in catalog.records.values()),
+        "catalog_parsed": (
+            catalog.prereqs,
+            catalog.restrictions,
+            catalog.skills_touched,
+            catalog.effects,
+        ),
+        "node_map": pickle.dumps(NodeMap().dict(), protocol=pickle.HIGHEST_PROTOCOL),
+        "breed_templates": pickle.dumps(
+            BreedTemplates().dict(), protocol=pickle.HIGHEST_PROTOCOL
+        ),
+    }
+    header = _header.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        source_hash(db_path + xlsx),
+        defaults_hash(),
+    )
+
+    snapshot_path = db_path + snapshot_file
+    with open(snapshot_path + ".tmp", "wb") as snapshot:
+        snapshot.write(header)
+        snapshot.write(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    os.replace(snapshot_path + ".tmp", snapshot_path)
+
+    logging.info(f"Snapshot: wrote {len(data['catalog_rows'])} mods to {snapshot_path}")
+    return snapshot_path
+
+
+def load_snapshot(
+    db_path: str = "./gamedata/",
+    snapshot_file: str = SNAPSHOT_FILE,
+    xlsx: str = SNAPSHOT_XLSX,
+) -> Optional[GamedataSnapshot]:
+    """Requires: db_path (str); returns GamedataSnapshot or None.
+    Reads the snapshot in db_path with a single read. Returns None (so the caller falls back to SQLite) if there
+    isn't one, it is from another SNAPSHOT_VERSION, or it is out of date with the xlsx or the NodeMap and
+    BreedTemplates defaults."""
+    snapshot_path = db_path + snapshot_file
+    try:
+        with open(snapshot_path, "rb") as snapshot:
+            raw = snapshot.read()
+    except OSError:
+        logging.info(f"Snapshot: no snapshot at {snapshot_path}, using SQLite")
+        return None
+
+    if len(raw) < _header.size:
+        logging.warning(f"Snapshot: {snapshot_path} is truncated, using SQLite")
+        return None
+
+    magic, version, xlsx_hash, code_hash = _header.unpack_from(raw)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        logging.warning(
+            f"Snapshot: {snapshot_path} is not a v{SNAPSHOT_VERSION} snapshot, using SQLite"
+        )
+        return None
+    if xlsx_hash != source_hash(db_path + xlsx) or code_hash != defaults_hash():
+        logging.warning(
+            f"Snapshot: {snapshot_path} is out of date with {xlsx} or the NodeMap and BreedTemplates defaults, using "
+            f"SQLite. Run gamedata_snapshot.py (or run_gamedata_export.py if {xlsx} has changed) to refresh it."
+        )
+        return None
+
+    try:
+        data = pickle.loads(memoryview(raw)[_header.size :])
+    except Exception as e:
+        logging.warning(f"Snapshot: {snapshot_path} can't be read ({e}), using SQLite")
+        return None
+
+    return GamedataSnapshot(snapshot_path, data)
+
+
+def get_snapshot(db_path: str = "./gamedata/") -> Optional[GamedataSnapshot]:
+    """Requires: db_path (str); returns GamedataSnapshot or None.
+    The snapshot for a gamedata directory, loaded once per process."""
+    if db_path not in _snapshots:
+        _snapshots[db_path] = load_snapshot(db_path)
+
+    return _snapshots[db_path]
+
+
+def clear_snapshot_cache() -> None:
+    """Forgets every loaded snapshot, so the next get_snapshot re-reads (and re-checks) the file. Call this after
+    the snapshot has been rewritten."""
+    _snapshots.clear()
+
+
+def load_node_map(db_path: str = "./gamedata/") -> NodeMap:
+    """Requires: db_path (str); returns NodeMap.
+    NodeMap from the snapshot if there is an up-to-date one, otherwise the usual NodeMap()."""
+    snapshot = get_snapshot(db_path)
+    if snapshot is None:
+        return NodeMap()
+
+    return snapshot.node_map()
+
+
+def load_breed_templates(db_path: str = "./gamedata/") -> BreedTemplates:
+    """Requires: db_path (str); returns BreedTemplates.
+    BreedTemplates from the snapshot if there is an up-to-date one, otherwise the usual BreedTemplates()."""
+    snapshot = get_snapshot(db_path)
+    if snapshot is None:
+        return BreedTemplates()
+
+    return snapshot.breed_templates()
+
+
+# Load the default snapshot at import time, so the first CharacterMethods doesn't have to
+get_snapshot()
+
+
+if __name__ == "__main__":
+    # Refresh the snapshot from the gamedata DB as it is, without a full export. The catalog is read from SQLite so
+    # an out-of-date snapshot is never copied into the new one
+    from mod_catalog import ModCatalog
+
+    catalog = ModCatalog()
+    catalog.load(from_db=True)
+    path = write_snapshot(catalog)
+    clear_snapshot_cache()
+    print(
+        f"Snapshot: wrote {len(catalog)} mods to {path}, up to date: {get_snapshot() is not None}"
+    )
@@ -0,0 +1,69 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from typing import NamedTuple
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+# Housekeeping stages and the LiveCharacterModel fields they read and write, so a housekeeping run only runs the
+# stages whose inputs are dirty.
+
+
+class HousekeepingStage(NamedTuple):
+    """One housekeeping step (see CharacterMethods._run_housekeeping_stage) and the LiveCharacterModel fields it
+    reads and writes. reads_char stages also read the CharacterModel."""
+
+    name: str
+    reads: frozenset
+    writes: frozenset
+    reads_char: bool = False
+
+
+class HousekeepingPipeline:
+    """The housekeeping stages in the order they run. Build it with CharacterMethods.get_housekeeping_pipeline and
+    treat it as read-only."""
+
+    def __init__(self, stages):
+        self.stages: tuple = tuple(stages)
+        self.index: dict = {stage.name: i for i, stage in enumerate(self.stages)}
+        if len(self.index) != len(self.stages):
+            raise ValueError("Housekeeping stage names must be unique")
+
+        # field: index of the first stage that reads it
+        first_reader: dict = {}
+        for i, stage in enumerate(self.stages):
+            for field in stage.reads:
+                first_reader.setdefault(field, i)
+        self.first_reader: dict = first_reader
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    @staticmethod
+    def needs_run(stage: HousekeepingStage, dirty, char_changed: bool = True) -> bool:
+        """Requires: stage (HousekeepingStage), dirty (set or None), char_changed (bool); returns bool.
+        True if stage has to run: dirty is None (nothing is known, so everything runs), the stage reads the
+        CharacterModel and that may have changed, or it reads a dirty field."""
+        if dirty is None:
+            return True
+        if stage.reads_char and char_changed:
+            return True
+        return not stage.reads.isdisjoint(dirty)
+
+    def carry_over(self, changed_by: dict) -> set:
+        """Requires: changed_by (dict); returns set.
+        The fields to start the next run with, from {stage name: fields it changed} of this run: those changed by a
+        stage that it or an earlier stage reads, as a full run would see the new value there."""
+        carry: set = set()
+        for name, changed in changed_by.items():
+            i = self.index[name]
+            carry.update(
+                field for field in changed if self.first_reader.get(field, i + 1) <= i
+            )
+
+        return carry
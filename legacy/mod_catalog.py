@@ -0,0 +1,788 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from typing import NamedTuple, Optional
+from bisect import bisect_left
+from collections import OrderedDict
+from json import loads
+from utility_methods import UtilityMethods
+from gamedata_snapshot import get_snapshot
+import numpy as np
+import sqlite3
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+
+class ModRecord(NamedTuple):
+    """A single row of the gamedata table. Field order matches the gamedata table so a ModRecord can stand in for
+    a row returned by 'SELECT * FROM gamedata'."""
+
+    mod_id: str
+    name: str
+    description: str
+    category: str
+    type: str
+    choose_text: int
+    allow_multiple: int
+    prereqs: str
+    prereq_any: int
+    restriction: str
+    restriction_any: int
+    skills_touched: str
+    effects: str
+    ref: str
+
+
+class ModCatalog:
+    """In-memory copy of the gamedata table. The gamedata DB is read-only at runtime (only run_gamedata_export.py
+    writes to it) so every mod is loaded once and looked up from dicts rather than a SQL query per call.
+    Records are indexed by mod_id, lower case mod_id, category, type and (category, type).
+    The prereqs, restriction, skills_touched and effects strings are also parsed once at load time (lists become
+    tuples, effects become dicts) so callers never re-parse them. Treat the parsed values as read-only.
+    Use ModCatalog.shared() to get the catalog for a DB, and ModCatalog.invalidate_all() after the gamedata DB has
+    been regenerated."""
+
+    # Shared catalogs, keyed by full DB path
+    _catalogs: dict = {}
+
+    def __init__(
+        self,
+        db: str = "broken_shield_gamedata.sqlite",
+        db_path: str = "./gamedata/",
+        table: str = "gamedata",
+    ):
+        self.db = db
+        self.db_path = db_path
+        self.table = table
+
+        self.loaded: bool = False
+        self.load_count: int = 0
+        self.records: dict = {}
+        self.lower_ids: dict = {}
+        self.by_category: dict = {}
+        self.by_type: dict = {}
+        self.by_category_type: dict = {}
+        self.prereqs: dict = {}
+        self.restrictions: dict = {}
+        self.skills_touched: dict = {}
+        self.effects: dict = {}
+        self.prefix_index: Optional[ModPrefixIndex] = None
+        self.rule_index: Optional[ModRuleIndex] = None
+        self.effects_matrix: Optional[ModEffectsMatrix] = None
+        # check_mod_allowed's answers, emptied whenever the records are (re)loaded or dropped
+        self.allowed_cache: ModAllowedCache = ModAllowedCache()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.db_path}{self.db}, {len(self.records)} mods)"
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.records)
+
+    def __contains__(self, mod_id):
+        self._ensure_loaded()
+        return mod_id in self.records
+
+    @classmethod
+    def shared(
+        cls,
+        db: str = "broken_shield_gamedata.sqlite",
+        db_path: str = "./gamedata/",
+        table: str = "gamedata",
+    ) -> "ModCatalog":
+        """Requires: db (str), db_path (str), table (str); returns ModCatalog.
+        Returns the catalog shared by every caller using the same gamedata DB. The catalog is loaded lazily on its
+        first lookup."""
+        key = (db_path + db, table)
+        catalog = cls._catalogs.get(key)
+        if catalog is None:
+            catalog = cls(db=db, db_path=db_path, table=table)
+            cls._catalogs[key] = catalog
+
+        return catalog
+
+    @classmethod
+    def invalidate_all(cls) -> None:
+        """Invalidates every shared catalog so the next lookup reloads from the gamedata DB. Call this whenever the
+        gamedata DB is regenerated (see run_gamedata_export.py)."""
+        for catalog in cls._catalogs.values():
+            catalog.invalidate()
+
+    def invalidate(self) -> None:
+        """Drops all cached records. The next lookup reloads them from the gamedata DB."""
+        logging.info(f"Catalog: invalidating {self.db_path}{self.db}")
+        self.loaded = False
+        self.records = {}
+        self.lower_ids = {}
+        self.by_category = {}
+        self.by_type = {}
+        self.by_category_type = {}
+        self.prereqs = {}
+        self.restrictions = {}
+        self.skills_touched = {}
+        self.effects = {}
+        self.prefix_index = None
+        self.rule_index = None
+        self.effects_matrix = None
+        self.allowed_cache.clear()
+
+    def reload(self) -> None:
+        """Forces an immediate reload of all records from the gamedata DB."""
+        self.invalidate()
+        self.load()
+
+    def load(self, from_db: bool = False) -> None:
+        """Loads every mod (in table order) and builds the indexes. Mods come from the gamedata snapshot next to the
+        DB if it is up to date (see gamedata_snapshot.py), otherwise from the gamedata table.
+        Setting from_db to True always reads the gamedata table."""
+        snapshot = None if from_db else get_snapshot(self.db_path)
+        if snapshot is not None and snapshot.matches(self.db, self.table):
+            rows = snapshot.catalog_rows
+            parsed = snapshot.catalog_parsed
+            source = snapshot.path
+        else:
+            conn = sqlite3.connect(self.db_path + self.db)
+            try:
+                rows = conn.execute(
+                    f"SELECT {', '.join(ModRecord._fields)} FROM {self.table} ORDER BY rowid"
+                ).fetchall()
+            finally:
+                conn.close()
+            parsed = None
+            source = self.db_path + self.db
+
+        records: dict = {}
+        lower_ids: dict = {}
+        by_category: dict = {}
+        by_type: dict = {}
+        by_category_type: dict = {}
+        prereqs: dict = {}
+        restrictions: dict = {}
+        skills_touched: dict = {}
+        effects: dict = {}
+        for row in rows:
+            record = ModRecord(*row)
+            # Duplicate mod_ids keep the first row, as a 'WHERE mod_id=' lookup with [0] would
+            if record.mod_id in records:
+                continue
+            records[record.mod_id] = record
+            lower_ids.setdefault(record.mod_id.lower(), record.mod_id)
+            by_category.setdefault(record.category, []).append(record.mod_id)
+            by_type.setdefault(record.type, []).append(record.mod_id)
+            by_category_type.setdefault((record.category, record.type), []).append(
+                record.mod_id
+            )
+            if parsed is None:
+                prereqs[record.mod_id] = self.parse_list(record.prereqs)
+                restrictions[record.mod_id] = self.parse_list(record.restriction)
+                skills_touched[record.mod_id] = self.parse_list(record.skills_touched)
+                effects[record.mod_id] = self.parse_effects(record.effects)
+
+        if parsed is not None:
+            # The snapshot stores the parsed columns, so there is nothing to parse
+            prereqs, restrictions, skills_touched, effects = parsed
+
+        self.records = records
+        self.lower_ids = lower_ids
+        self.by_category = {k: tuple(v) for k, v in by_category.items()}
+        self.by_type = {k: tuple(v) for k, v in by_type.items()}
+        self.by_category_type = {k: tuple(v) for k, v in by_category_type.items()}
+        self.prereqs = prereqs
+        self.restrictions = restrictions
+        self.skills_touched = skills_touched
+        self.effects = effects
+        self.allowed_cache.clear()
+        self.loaded = True
+        self.load_count += 1
+
+        logging.info(
+            f"Catalog: loaded {len(records)} mods from {source} (load {self.load_count})"
+        )
+
+    @staticmethod
+    def parse_list(string_list: str) -> tuple:
+        """Requires: string_list (str); returns tuple.
+        Parses a JSON list column (prereqs, restriction, skills_touched) exactly as
+        split_string_list_to_true_list does, so "null" becomes ("null",)."""
+        return tuple(UtilityMethods.split_string_list_to_true_list(string_list))
+
+    @staticmethod
+    def parse_effects(effects: str) -> Optional[dict]:
+        """Requires: effects (str); returns dict (or None for mods with no effects).
+        Parses the effects column. List values (e.g. children) become tuples."""
+        effects_dict = loads(effects)
+        if effects_dict:
+            for effect in effects_dict:
+                if type(effects_dict[effect]) is list:
+                    effects_dict[effect] = tuple(effects_dict[effect])
+
+        return effects_dict
+
+    def _ensure_loaded(self) -> None:
+        if not self.loaded:
+            self.load()
+
+    def get(self, mod_id: str, lower_case: bool = False) -> Optional[ModRecord]:
+        """Requires: mod_id (str), lower_case (bool); returns ModRecord or None.
+        Returns the record for mod_id, or None if it doesn't exist. Setting lower_case to True makes the lookup
+        case-insensitive."""
+        self._ensure_loaded()
+        if lower_case:
+            mod_id = self.lower_ids.get(str(mod_id).lower(), "")
+
+        return self.records.get(mod_id)
+
+    def exists(self, mod_id: str, lower_case: bool = False) -> bool:
+        """Requires: mod_id (str), lower_case (bool); returns bool.
+        True if mod_id is in the catalog."""
+        return self.get(mod_id, lower_case=lower_case) is not None
+
+    @staticmethod
+    def parse_fields(optional_fields: str = "") -> tuple:
+        """Requires: optional_fields (str); returns tuple.
+        Converts an SQL style field list ("prereqs, restriction") into a tuple of field names. Blank or "*" means
+        every field."""
+        if not optional_fields or optional_fields.strip() == "*":
+            return ModRecord._fields
+
+        fields = tuple(field.strip() for field in optional_fields.split(","))
+        for field in fields:
+            if field not in ModRecord._fields:
+                raise KeyError(f"Unknown gamedata field: {field}")
+
+        return fields
+
+    def fetch(
+        self, mod_id: str, optional_fields: str = "", lower_case: bool = False
+    ) -> list:
+        """Requires: mod_id (str), optional_fields (str), lower_case (bool); returns list.
+        Drop-in replacement for 'SELECT {optional_fields} FROM gamedata WHERE mod_id=...'. Returns a list holding a
+        single tuple of the requested fields, or an empty list if the mod_id doesn't exist."""
+        record = self.get(mod_id, lower_case=lower_case)
+        if record is None:
+            return []
+
+        fields = self.parse_fields(optional_fields)
+        if fields == ModRecord._fields:
+            return [tuple(record)]
+
+        return [tuple(getattr(record, field) for field in fields)]
+
+    def get_prereqs(self, mod_id: str) -> tuple:
+        """Requires: mod_id (str); returns tuple.
+        The parsed Prerequisite mod_ids of mod_id, ("null",) if it has none."""
+        self._ensure_loaded()
+        return self.prereqs[mod_id]
+
+    def get_restrictions(self, mod_id: str) -> tuple:
+        """Requires: mod_id (str); returns tuple.
+        The parsed Restriction mod_ids of mod_id, ("null",) if it has none."""
+        self._ensure_loaded()
+        return self.restrictions[mod_id]
+
+    def get_skills_touched(self, mod_id: str) -> tuple:
+        """Requires: mod_id (str); returns tuple.
+        The parsed list of skills touched by mod_id."""
+        self._ensure_loaded()
+        return self.skills_touched[mod_id]
+
+    def get_effects(self, mod_id: str) -> Optional[dict]:
+        """Requires: mod_id (str); returns dict.
+        The parsed effects of mod_id. This is the cached dict, so don't modify it."""
+        self._ensure_loaded()
+        return self.effects[mod_id]
+
+    def fetch_many(
+        self, mod_ids, optional_fields: str = "", lower_case: bool = False
+    ) -> dict:
+        """Requires: mod_ids (iterable of str), optional_fields (str), lower_case (bool); returns dict.
+        Batch version of fetch. Returns {mod_id: tuple of the requested fields} for every mod_id that exists, keyed
+        by the mod_id as it was requested. mod_ids that don't exist are left out."""
+        self._ensure_loaded()
+        fields = self.parse_fields(optional_fields)
+        all_fields = fields == ModRecord._fields
+
+        return_data: dict = {}
+        for mod_id in mod_ids:
+            if mod_id in return_data:
+                continue
+            record = self.get(mod_id, lower_case=lower_case)
+            if record is None:
+                continue
+            if all_fields:
+                return_data[mod_id] = tuple(record)
+            else:
+                return_data[mod_id] = tuple(getattr(record, field) for field in fields)
+
+        return return_data
+
+    def get_prefix_index(self) -> "ModPrefixIndex":
+        """Returns the autocomplete index of mod names and mod_ids, building it on first use."""
+        self._ensure_loaded()
+        if self.prefix_index is None:
+            self.prefix_index = ModPrefixIndex(self.records.values())
+
+        return self.prefix_index
+
+    def get_rule_index(self) -> "ModRuleIndex":
+        """Returns the prerequisite/restriction bitsets of every mod, compiling them on first use."""
+        self._ensure_loaded()
+        if self.rule_index is None:
+            self.rule_index = ModRuleIndex(
+                self.records.values(), self.prereqs, self.restrictions
+            )
+
+        return self.rule_index
+
+    def get_effects_matrix(self, int_stats) -> "ModEffectsMatrix":
+        """Requires: int_stats (iterable of str); returns ModEffectsMatrix.
+        Returns the integer effects of every mod as a matrix over int_stats (the LiveCharacterModel stats that are
+        added to), building it on first use or when int_stats changes."""
+        self._ensure_loaded()
+        int_stats = frozenset(int_stats)
+        if self.effects_matrix is None or self.effects_matrix.int_stats != int_stats:
+            self.effects_matrix = ModEffectsMatrix(
+                self.records.values(), self.effects, int_stats
+            )
+
+        return self.effects_matrix
+
+    def mod_ids_by_category_type(self, category: str, mod_type: str) -> tuple:
+        """Requires: category (str), mod_type (str); returns tuple.
+        All mod_ids in category with type mod_type, in table order."""
+        self._ensure_loaded()
+        return self.by_category_type.get((category, mod_type), ())
+
+    def mod_ids_by_category(self, category: str) -> tuple:
+        """Requires: category (str); returns tuple.
+        All mod_ids in category, in table order."""
+        self._ensure_loaded()
+        return self.by_category.get(category, ())
+
+    def mod_ids_by_type(self, mod_type: str) -> tuple:
+        """Requires: mod_type (str); returns tuple.
+        All mod_ids of type mod_type, in table order."""
+        self._ensure_loaded()
+        return self.by_type.get(mod_type, ())
+
+
+class ModPrefixIndex:
+    """In-memory autocomplete index over mod names and mod_ids, built from the catalog (ModCatalog.get_prefix_index).
+    Names and mod_ids are kept in sorted lists, so the mods beginning with a prefix are one contiguous slice found
+    with bisect, and typing another character only has to search the previous slice (see PrefixSearch).
+    Every category and type is given a bit, so category/type filters are a bitwise AND per mod.
+
+    Matching and ordering follow the SQL searches it replaces: prefixes match case-insensitively for ASCII only (as
+    LIKE does) and names sort as COLLATE NOCASE, with ties left in table order."""
+
+    def __init__(self, records):
+        self.records: tuple = tuple(records)
+        self.mod_ids: tuple = tuple(record.mod_id for record in self.records)
+        self.positions: dict = {mod_id: i for i, mod_id in enumerate(self.mod_ids)}
+
+        self.category_bits: dict = {}
+        self.type_bits: dict = {}
+        for record in self.records:
+            self.category_bits.setdefault(record.category, 1 << len(self.category_bits))
+            self.type_bits.setdefault(record.type, 1 << len(self.type_bits))
+        self.mod_category_bits: tuple = tuple(
+            self.category_bits[record.category] for record in self.records
+        )
+        self.mod_type_bits: tuple = tuple(
+            self.type_bits[record.type] for record in self.records
+        )
+
+        # Sorted (key, table position) pairs split into parallel lists for bisect
+        self.keys: dict = {}
+        self.key_positions: dict = {}
+        for field in ("name", "mod_id"):
+            pairs = sorted(
+                (self.fold(getattr(record, field)), i)
+                for i, record in enumerate(self.records)
+            )
+            self.keys[field] = [key for key, i in pairs]
+            self.key_positions[field] = [i for key, i in pairs]
+
+        # Sort ranks for 'ORDER BY name' and 'ORDER BY category, name'
+        self.name_rank: list = [0] * len(self.records)
+        for rank, i in enumerate(self.key_positions["name"]):
+            self.name_rank[i] = rank
+        self.category_name_rank: list = [0] * len(self.records)
+        for rank, i in enumerate(
+            sorted(
+                range(len(self.records)),
+                key=lambda i: (self.records[i].category, self.name_rank[i]),
+            )
+        ):
+            self.category_name_rank[i] = rank
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def fold(text) -> bytes:
+        """Requires: text (str); returns bytes.
+        The search/sort key for text: UTF-8 with ASCII letters lower cased, which is how SQLite's LIKE and NOCASE
+        compare strings."""
+        return str(text).encode().lower()
+
+    @staticmethod
+    def _as_set(values) -> tuple:
+        if not values:
+            return ()
+        if isinstance(values, str):
+            return (values,)
+        return tuple(values)
+
+    def category_mask(self, categories=None) -> int:
+        """Requires: categories (str or iterable of str); returns int.
+        Bitmask matching any of categories. No categories matches every category."""
+        categories = self._as_set(categories)
+        if not categories:
+            return -1
+        return sum({self.category_bits.get(category, 0) for category in categories})
+
+    def type_mask(self, mod_types=None) -> int:
+        """Requires: mod_types (str or iterable of str); returns int.
+        Bitmask matching any of mod_types. No mod_types matches every type."""
+        mod_types = self._as_set(mod_types)
+        if not mod_types:
+            return -1
+        return sum({self.type_bits.get(mod_type, 0) for mod_type in mod_types})
+
+    def prefix_range(
+        self, prefix: str, field: str = "name", lo: int = 0, hi: int = None
+    ) -> tuple:
+        """Requires: prefix (str), field (str); returns tuple.
+        (lo, hi) slice of the sorted field ("name" or "mod_id") holding every key that begins with prefix. Pass the
+        range from a shorter prefix as lo and hi to search only inside it."""
+        keys = self.keys[field]
+        if hi is None:
+            hi = len(keys)
+        key = self.fold(prefix)
+        start = bisect_left(keys, key, lo, hi)
+        # 0xff never occurs in UTF-8, so it sorts after every key beginning with prefix
+        end = bisect_left(keys, key + b"\xff", start, hi)
+        return start, end
+
+    def filter_positions(
+        self, positions, category_mask: int = -1, type_mask: int = -1
+    ) -> list:
+        """Requires: positions (iterable of int), category_mask (int), type_mask (int); returns list.
+        The table positions whose category and type are both in the masks."""
+        if category_mask == -1 and type_mask == -1:
+            return list(positions)
+
+        mod_category_bits = self.mod_category_bits
+        mod_type_bits = self.mod_type_bits
+        return [
+            i
+            for i in positions
+            if mod_category_bits[i] & category_mask and mod_type_bits[i] & type_mask
+        ]
+
+    def complete(
+        self,
+        prefix: str = "",
+        categories=None,
+        mod_types=None,
+        field: str = "name",
+        order_by: str = "category",
+        limit: int = 0,
+    ) -> list:
+        """Requires: prefix (str); returns list.
+        ModRecords of every mod whose name (or mod_id) begins with prefix, filtered to categories and mod_types.
+        Available Options:
+        field: "name", "mod_id" or "both" (a mod matching on both is only returned once)
+        order_by: "category" (category, then name), "name" or "table" (gamedata table order)
+        limit: maximum number of records to return, 0 for all"""
+        search = PrefixSearch(
+            self, categories=categories, mod_types=mod_types, field=field
+        )
+        return search.narrow(prefix, order_by=order_by, limit=limit)
+
+    def sort_positions(self, positions, order_by: str = "category") -> list:
+        """Requires: positions (iterable of int), order_by (str); returns list.
+        Sorts table positions by "category" (category, then name), "name" or "table"."""
+        match order_by:
+            case "name":
+                return sorted(positions, key=self.name_rank.__getitem__)
+            case "table":
+                return sorted(positions)
+            case _:
+                return sorted(positions, key=self.category_name_rank.__getitem__)
+
+
+class PrefixSearch:
+    """Incremental autocomplete over a ModPrefixIndex. Each call to narrow() with a longer version of the previous
+    prefix only searches the slice the previous prefix matched; any other prefix starts again from the full index.
+    Example:
+    search = PrefixSearch(catalog.get_prefix_index(), categories="edge")
+    search.narrow("g")
+    search.narrow("gi")"""
+
+    def __init__(
+        self,
+        index: ModPrefixIndex,
+        categories=None,
+        mod_types=None,
+        field: str = "name",
+    ):
+        self.index = index
+        self.filters: tuple = (categories, mod_types, field)
+        self.category_mask = index.category_mask(categories)
+        self.type_mask = index.type_mask(mod_types)
+        self.fields: tuple = ("name", "mod_id") if field == "both" else (field,)
+        self.prefix: str = ""
+        self.ranges: dict = {field: (0, len(index)) for field in self.fields}
+
+    def matches(
+        self,
+        index: ModPrefixIndex,
+        categories=None,
+        mod_types=None,
+        field: str = "name",
+    ) -> bool:
+        """Requires: index (ModPrefixIndex); returns bool.
+        True if this search is over index with the same filters, so narrow() can carry on from its last prefix."""
+        return self.index is index and self.filters == (categories, mod_types, field)
+
+    def narrow(self, prefix: str, order_by: str = "category", limit: int = 0) -> list:
+        """Requires: prefix (str); returns list.
+        ModRecords matching prefix (see ModPrefixIndex.complete for order_by and limit)."""
+        index = self.index
+        folded = index.fold(prefix)
+        if not folded.startswith(index.fold(self.prefix)):
+            self.ranges = {field: (0, len(index)) for field in self.fields}
+        self.prefix = prefix
+
+        positions: set = set()
+        for field in self.fields:
+            lo, hi = index.prefix_range(prefix, field, *self.ranges[field])
+            self.ranges[field] = (lo, hi)
+            positions.update(index.key_positions[field][lo:hi])
+
+        positions = index.filter_positions(
+            positions, self.category_mask, self.type_mask
+        )
+        positions = index.sort_positions(positions, order_by=order_by)
+        if limit:
+            positions = positions[:limit]
+
+        return [index.records[i] for i in positions]
+
+
+class ModRuleIndex:
+    """Prerequisites and restrictions compiled to bitsets, built from the catalog (ModCatalog.get_rule_index).
+    Every mod_id in the catalog, plus any other mod_id named in a prerequisite or restriction, is given a bit, so a
+    character's mods become a single int (char_bits, see mask) and each check is one bitwise AND.
+
+    The answers are the same as check_prerequisite and check_restriction give, quirks included: a multi-mod 'ALL'
+    list is checked with multi_check, which is satisfied by ANY one of the mods. So whatever prereq_any and
+    restriction_any say, prerequisites are met if the list is null or the character has one of its mods, and
+    restrictions are met if the list is null or the character has none of its mods."""
+
+    def __init__(self, records, prereqs: dict, restrictions: dict):
+        self.bits: dict = {}
+        for record in records:
+            self.bits.setdefault(record.mod_id, len(self.bits))
+
+        self.prereq_masks: dict = {
+            mod_id: self._compile(mod_list) for mod_id, mod_list in prereqs.items()
+        }
+        self.restriction_masks: dict = {
+            mod_id: self._compile(mod_list) for mod_id, mod_list in restrictions.items()
+        }
+        # Every mod named in a mod's prerequisites or restrictions: the only ones its checks look at
+        self.rule_masks: dict = {
+            mod_id: self.prereq_masks.get(mod_id, 0)
+            | self.restriction_masks.get(mod_id, 0)
+            for mod_id in self.prereq_masks.keys() | self.restriction_masks.keys()
+        }
+
+    def __len__(self):
+        return len(self.bits)
+
+    def _compile(self, mod_list: tuple) -> int:
+        if not mod_list or mod_list[0] == "null":
+            return 0
+
+        mask = 0
+        for mod_id in mod_list:
+            mask |= 1 << self.bits.setdefault(mod_id, len(self.bits))
+        return mask
+
+    def mask(self, mod_ids) -> int:
+        """Requires: mod_ids (iterable of str); returns int.
+        Bitset of mod_ids. mod_ids without a bit are left out, as no prerequisite or restriction names them."""
+        bits = self.bits
+        mask = 0
+        for mod_id in mod_ids:
+            if mod_id in bits:
+                mask |= 1 << bits[mod_id]
+        return mask
+
+    def prerequisites_met(self, mod_id: str, char_bits: int) -> bool:
+        """Requires: mod_id (str), char_bits (int); returns bool."""
+        prereq_mask = self.prereq_masks[mod_id]
+        return not prereq_mask or bool(char_bits & prereq_mask)
+
+    def restrictions_met(self, mod_id: str, char_bits: int) -> bool:
+        """Requires: mod_id (str), char_bits (int); returns bool."""
+        return not char_bits & self.restriction_masks[mod_id]
+
+    def check(self, mod_id: str, char_bits: int) -> tuple:
+        """Requires: mod_id (str), char_bits (int); returns tuple.
+        (Prerequisites met, Restrictions met), as check_preq_restrict_all returns them."""
+        return (
+            self.prerequisites_met(mod_id, char_bits),
+            self.restrictions_met(mod_id, char_bits),
+        )
+
+
+class ModAllowedCache:
+    """Least recently used memo of check_mod_allowed, held by the catalog (ModCatalog.allowed_cache) so it is
+    emptied whenever the mods are reloaded. Keys are built by CharacterMethods.check_mod_allowed from the mod_id and
+    only the parts of the character's mods its answer depends on: the mods named in its prerequisites and
+    restrictions (ModRuleIndex.rule_masks) and whether there is already more than one copy of it. So characters that
+    differ in everything else share an entry.
+    hits, misses and evictions count lookups since the cache was made (clear doesn't reset them)."""
+
+    def __init__(self, maxsize: int = 8192):
+        self.maxsize: int = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key) -> Optional[bool]:
+        """Requires: key (tuple); returns bool (or None).
+        The cached answer for key, or None if there isn't one."""
+        allowed = self.entries.get(key)
+        if allowed is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return allowed
+
+    def put(self, key, allowed: bool) -> None:
+        """Requires: key (tuple), allowed (bool); returns None.
+        Stores an answer, dropping the least recently used one if the cache is full."""
+        self.entries[key] = allowed
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drops every cached answer."""
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """Returns the hit/miss/eviction counters, the current size and maxsize."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
+
+
+class ModEffectsMatrix:
+    """The integer effects of every mod as a NumPy matrix (one row per mod, one column per stat), built from the
+    catalog (ModCatalog.get_effects_matrix). The integer stats of a set of mods are then a single sum over their rows
+    rather than a getattr/setattr per effect.
+    Only int effect values on stats in int_stats go in the matrix. Everything else (text, bools, lists, replace_text,
+    replace stats and stats outside int_stats) is left in other_effects for the slow path."""
+
+    def __init__(self, records, effects: dict, int_stats: frozenset):
+        self.int_stats: frozenset = int_stats
+        self.rows: dict = {}
+        for record in records:
+            self.rows.setdefault(record.mod_id, len(self.rows))
+
+        stats: set = set()
+        for mod_id in self.rows:
+            for stat, value in (effects[mod_id] or {}).items():
+                if type(value) is int and stat in int_stats:
+                    stats.add(stat)
+        self.stats: tuple = tuple(sorted(stats))
+        self.columns: dict = {stat: i for i, stat in enumerate(self.stats)}
+
+        # touched records which stats a mod has an effect on, as an effect of 0 still counts as touching a stat
+        self.matrix = np.zeros((len(self.rows), len(self.stats)), dtype=np.int64)
+        self.touched = np.zeros((len(self.rows), len(self.stats)), dtype=bool)
+        self.other_effects: dict = {}
+        for mod_id, row in self.rows.items():
+            other: dict = {}
+            for stat, value in (effects[mod_id] or {}).items():
+                if stat in self.columns and type(value) is int:
+                    self.matrix[row, self.columns[stat]] = value
+                    self.touched[row, self.columns[stat]] = True
+                else:
+                    other[stat] = value
+            self.other_effects[mod_id] = other
+
+        # matrix and touched side by side as floats, so many characters' totals are one BLAS matrix product
+        # (float32 is exact, as the sums are far below 2**24)
+        self.weights = np.hstack((self.matrix, self.touched)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_ids(self, mod_ids) -> np.ndarray:
+        """Requires: mod_ids (iterable of str); returns numpy array.
+        The matrix rows of mod_ids. mod_ids that aren't in the catalog are left out."""
+        rows = self.rows
+        return np.fromiter(
+            (rows[mod_id] for mod_id in mod_ids if mod_id in rows), dtype=np.intp
+        )
+
+    def totals(self, mod_ids) -> dict:
+        """Requires: mod_ids (iterable of str); returns dict.
+        {stat: summed effect} over mod_ids, for every stat at least one of them touches."""
+        row_ids = self.row_ids(mod_ids)
+        sums = self.matrix[row_ids].sum(axis=0)
+        touched = self.touched[row_ids].any(axis=0)
+
+        return {self.stats[i]: int(sums[i]) for i in np.flatnonzero(touched)}
+
+    def incidence(self, mod_lists) -> np.ndarray:
+        """Requires: mod_lists (list of iterables of str); returns numpy array.
+        The characters x mods incidence matrix: one row per mod list, with a 1 in the column of each mod in it (a mod
+        in a list twice still counts once). mod_ids that aren't in the catalog are left out."""
+        rows = self.rows
+        char_ids: list = []
+        row_ids: list = []
+        for i, mod_ids in enumerate(mod_lists):
+            found = [rows[mod_id] for mod_id in mod_ids if mod_id in rows]
+            row_ids.extend(found)
+            char_ids.extend([i] * len(found))
+
+        incidence = np.zeros((len(mod_lists), len(rows)), dtype=np.float32)
+        incidence[char_ids, row_ids] = 1.0
+        return incidence
+
+    def totals_many(self, mod_lists, chunk_size: int = 1024) -> tuple:
+        """Requires: mod_lists (list of iterables of str), chunk_size (int); returns tuple.
+        totals for many characters at once: (sums, touched), both with one row per mod list and one column per stat
+        in self.stats. sums is int64, touched is bool (True where at least one of the mods touches the stat).
+        The incidence matrix is built and multiplied chunk_size characters at a time, to keep memory down."""
+        width = len(self.stats)
+        sums = np.zeros((len(mod_lists), width), dtype=np.int64)
+        touched = np.zeros((len(mod_lists), width), dtype=bool)
+        for start in range(0, len(mod_lists), chunk_size):
+            block = self.incidence(mod_lists[start : start + chunk_size]) @ self.weights
+            end = start + len(block)
+            sums[start:end] = np.rint(block[:, :width])
+            touched[start:end] = block[:, width:] > 0
+
+        return sums, touched
@@ -0,0 +1,217 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from collections import Counter
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+# The NodeMap compiled to int ids and adjacency sets, so a character's free nodes are a set union over its filled
+# nodes. FreeNodeFrontier keeps them up to date while a character is built.
+
+
+class NodeGraph:
+    """The NodeMap compiled to int ids and adjacency sets. Build it from NodeMap().dict() (see
+    CharacterMethods.get_node_graph) and treat it as read-only."""
+
+    def __init__(self, nm_dict: dict):
+        self.names: tuple = tuple(
+            location
+            for location, node_info in nm_dict.items()
+            if isinstance(node_info, dict) and "category" in node_info
+        )
+        self.ids: dict = {location: i for i, location in enumerate(self.names)}
+
+        forward: list = []
+        closed: set = set()
+        entry: set = set()
+        req: dict = {}
+        for i, location in enumerate(self.names):
+            node_info = nm_dict[location]
+            cxn_list = node_info.get("cxn", ["null"])
+            # cxn entries that aren't nodes ("entry_node", "null", "drug" etc.) don't connect to anything
+            forward.append(
+                frozenset(self.ids[cxn] for cxn in cxn_list if cxn in self.ids)
+            )
+            if not cxn_list or cxn_list[0] == "null":
+                closed.add(i)
+            elif "entry_node" in cxn_list:
+                entry.add(i)
+            if node_info.get("req"):
+                req[i] = frozenset(node_info["req"])
+
+        req_by_mod: dict = {}
+        for i, node_req in req.items():
+            for mod_id in node_req:
+                req_by_mod.setdefault(mod_id, set()).add(i)
+
+        reverse: list = [set() for _ in self.names]
+        for i, targets in enumerate(forward):
+            for target in targets:
+                reverse[target].add(i)
+
+        self.forward: tuple = tuple(forward)
+        self.reverse: tuple = tuple(frozenset(sources) for sources in reverse)
+        self.closed: frozenset = frozenset(closed)
+        self.entry: frozenset = frozenset(entry)
+        self.req: dict = req
+        # mod_id: ids of the nodes with that mod in their req list
+        self.req_by_mod: dict = {
+            mod_id: frozenset(ids) for mod_id, ids in req_by_mod.items()
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, location):
+        return location in self.ids
+
+    def node_ids(self, locations) -> set:
+        """Requires: locations (iterable of str); returns set.
+        The ids of locations. Locations that aren't in the NodeMap are left out."""
+        ids = self.ids
+        return {ids[location] for location in locations if location in ids}
+
+    def reachable(self, filled_ids) -> set:
+        """Requires: filled_ids (iterable of int); returns set.
+        Ids of every node connected to a filled node, plus the entry nodes, minus the closed ("null") nodes.
+        Doesn't check req or whether the nodes are already filled."""
+        reachable = set(self.entry)
+        forward = self.forward
+        for i in filled_ids:
+            reachable.update(forward[i])
+        reachable.difference_update(self.closed)
+        return reachable
+
+    def req_met(self, node_id: int, char_mods) -> bool:
+        """Requires: node_id (int), char_mods (set); returns bool.
+        True if the character has every mod in the node's req list (or it has none)."""
+        node_req = self.req.get(node_id)
+        return node_req is None or node_req <= char_mods
+
+    def free_nodes(self, char_nodes: dict, char_mods) -> list:
+        """Requires: char_nodes (dict), char_mods (set); returns list.
+        The character's empty locations (in char_nodes order) that can take a mod. char_nodes is CharacterModel.nodes
+        and char_mods the set of mods the character has (for req)."""
+        ids = self.ids
+        reachable = self.reachable(
+            ids[location]
+            for location, mod_id in char_nodes.items()
+            if mod_id and location in ids
+        )
+
+        return [
+            location
+            for location, mod_id in char_nodes.items()
+            if not mod_id
+            and location in ids
+            and ids[location] in reachable
+            and self.req_met(ids[location], char_mods)
+        ]
+
+
+class FreeNodeFrontier:
+    """The free nodes of one character's nodes dict, kept up to date as mods are added and removed (see
+    CharacterMethods.get_free_node_frontier). It holds its own copy of the nodes dict, so in_sync tells whether it
+    still describes a character."""
+
+    def __init__(self, graph: NodeGraph, char_nodes: dict):
+        self.graph = graph
+        self.nodes: dict = dict(char_nodes)
+        # Position of each location in char_nodes, so free_nodes keeps the same order as NodeGraph.free_nodes
+        self.order: dict = {location: i for i, location in enumerate(self.nodes)}
+        self.mods: Counter = Counter(mod_id for mod_id in self.nodes.values() if mod_id)
+
+        ids = graph.ids
+        # Number of filled nodes connected to each node
+        support: list = [0] * len(graph)
+        for location, mod_id in self.nodes.items():
+            if mod_id and location in ids:
+                for target in graph.forward[ids[location]]:
+                    support[target] += 1
+        self.support: list = support
+
+        self.free: set = set()
+        for location in self.nodes:
+            if location in ids:
+                self._check(ids[location])
+
+    def __contains__(self, location):
+        return location in self.free
+
+    def __len__(self):
+        return len(self.free)
+
+    def copy(self) -> "FreeNodeFrontier":
+        """Returns a FreeNodeFrontier for a copy of the same nodes dict, without rebuilding it from the NodeGraph."""
+        frontier = FreeNodeFrontier.__new__(FreeNodeFrontier)
+        frontier.graph = self.graph
+        frontier.nodes = dict(self.nodes)
+        frontier.order = dict(self.order)
+        frontier.mods = Counter(self.mods)
+        frontier.support = list(self.support)
+        frontier.free = set(self.free)
+        return frontier
+
+    def in_sync(self, char_nodes: dict) -> bool:
+        """Requires: char_nodes (dict); returns bool.
+        True if the frontier was built (or kept up to date) for exactly this nodes dict."""
+        return self.nodes == char_nodes
+
+    def free_nodes(self) -> list:
+        """Returns the free locations in char_nodes order, the same list NodeGraph.free_nodes gives."""
+        return sorted(self.free, key=self.order.__getitem__)
+
+    def set_node(self, location: str, mod_id: str) -> None:
+        """Requires: location (str), mod_id (str); returns None.
+        Records that location now holds mod_id ("" when the mod has been removed) and re-checks only the nodes
+        that could have changed: the location, its forward neighbours and the nodes whose req list names the
+        old or new mod."""
+        old_mod_id = self.nodes.get(location, "")
+        if old_mod_id == mod_id:
+            return
+        if location not in self.order:
+            self.order[location] = len(self.order)
+        self.nodes[location] = mod_id
+
+        graph = self.graph
+        affected: set = set()
+        if old_mod_id:
+            self.mods[old_mod_id] -= 1
+            if not self.mods[old_mod_id]:
+                del self.mods[old_mod_id]
+                affected.update(graph.req_by_mod.get(old_mod_id, ()))
+        if mod_id:
+            self.mods[mod_id] += 1
+            if self.mods[mod_id] == 1:
+                affected.update(graph.req_by_mod.get(mod_id, ()))
+
+        node_id = graph.ids.get(location)
+        if node_id is not None:
+            affected.add(node_id)
+            # Only filling an empty node (or emptying a filled one) changes what it connects to
+            if bool(old_mod_id) != bool(mod_id):
+                step = 1 if mod_id else -1
+                support = self.support
+                for target in graph.forward[node_id]:
+                    support[target] += step
+                affected.update(graph.forward[node_id])
+
+        for node_id in affected:
+            self._check(node_id)
+
+    def _check(self, node_id: int) -> None:
+        """Adds node_id's location to (or removes it from) the free set."""
+        graph = self.graph
+        location = graph.names[node_id]
+        if (
+            location in self.nodes
+            and not self.nodes[location]
+            and node_id not in graph.closed
+            and (node_id in graph.entry or self.support[node_id])
+            and graph.req_met(node_id, self.mods.keys())
+        ):
+            self.free.add(location)
+        else:
+            self.free.discard(location)
@@ -0,0 +1,317 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from functools import lru_cache
+import logging
+import re
+
+logging.basicConfig(level=logging.WARNING)
+
+# Named SQL for the gamedata and chardata DBs. Values are always bound '?' parameters; only table and column names
+# from PC_TABLES or the constants below are put into the SQL, so each statement is always the same string.
+
+# pc: (table, id field, name field)
+PC_TABLES: dict = {
+    "player": ("players", "player_id", "player_name"),
+    "char": ("characters", "char_id", "char_name"),
+    "live_char": ("live_characters", "live_char_id", "char_name"),
+}
+
+# Fields returned by the CLI mod searches
+MOD_SEARCH_FIELDS: str = (
+    "mod_id, name, description, category, type, prereqs, restriction, effects, ref"
+)
+
+# -------------------------------------------------------------------------------------------------------------------
+# gamedata
+# -------------------------------------------------------------------------------------------------------------------
+MOD_BY_ID: str = "SELECT * FROM gamedata WHERE mod_id = ?"
+MOD_EXISTS: str = "SELECT * FROM gamedata WHERE mod_id = ? LIMIT 1"
+
+# mod_name_search: search_type -> (SQL, names of the parameters to bind, in order)
+MOD_NAME_SEARCH: dict = {
+    "cat": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE category = ? ORDER BY name",
+        ("mod_cat",),
+    ),
+    "type": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE type = ? ORDER BY name",
+        ("mod_type",),
+    ),
+    "sliver": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE category = ? AND type = ? AND mod_id = ? "
+        "ORDER BY name",
+        ("mod_cat", "mod_type", "search_text"),
+    ),
+    "name_cat": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE name LIKE ? ESCAPE '\\' AND category = ? "
+        "ORDER BY category, name",
+        ("search_like", "mod_cat"),
+    ),
+    "name_type": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE name LIKE ? ESCAPE '\\' AND type = ? "
+        "ORDER BY category, name",
+        ("search_like", "mod_type"),
+    ),
+    "cat_type": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE name LIKE ? ESCAPE '\\' AND category = ? "
+        "AND type = ? ORDER BY category, name",
+        ("search_like", "mod_cat", "mod_type"),
+    ),
+    "name": (
+        "SELECT mod_id, name, category, type FROM gamedata WHERE name LIKE ? ESCAPE '\\' "
+        "ORDER BY category, name",
+        ("search_like",),
+    ),
+}
+MOD_NAME_SEARCH["all"] = MOD_NAME_SEARCH["cat_type"]
+
+# Full-text search (GAMEDATA_MIGRATIONS v2). bm25 column weights, in gamedata_fts column order: name, description,
+# category, type, effects. A match in the name counts for far more than one in the description or effects.
+FTS_WEIGHTS: tuple = (10.0, 1.0, 2.0, 2.0, 1.0)
+FTS_RANK: str = f"bm25(gamedata_fts, {', '.join(str(w) for w in FTS_WEIGHTS)})"
+MOD_NAME_SEARCH["text"] = (
+    "SELECT gamedata.mod_id, gamedata.name, gamedata.category, gamedata.type FROM gamedata_fts "
+    "JOIN gamedata ON gamedata.rowid = gamedata_fts.rowid WHERE gamedata_fts MATCH ? "
+    f"ORDER BY {FTS_RANK}",
+    ("search_match",),
+)
+
+
+@lru_cache(maxsize=None)
+def mod_fts_search(by_category: bool = False, by_type: bool = False) -> str:
+    """Requires: by_category (bool), by_type (bool); returns str.
+    Ranked full-text search of gamedata_fts returning (mod_id, name, category, type, rank), best match first.
+    Bind fts_match(search_text), then the category and/or type if switched on, then the LIMIT."""
+    sql = (
+        f"SELECT gamedata.mod_id, gamedata.name, gamedata.category, gamedata.type, {FTS_RANK} AS rank "
+        f"FROM gamedata_fts JOIN gamedata ON gamedata.rowid = gamedata_fts.rowid WHERE gamedata_fts MATCH ?"
+    )
+    if by_category:
+        sql = f"{sql} AND gamedata.category = ?"
+    if by_type:
+        sql = f"{sql} AND gamedata.type = ?"
+    return f"{sql} ORDER BY rank LIMIT ?"
+
+
+@lru_cache(maxsize=None)
+def mod_search(
+    by_category: bool = False, by_type: bool = False, by_mod_id: bool = False
+) -> str:
+    """Requires: by_category (bool), by_type (bool), by_mod_id (bool); returns str.
+    CLI mod search returning MOD_SEARCH_FIELDS. Bind the category, type and mod_id (in that order) for each filter
+    that is switched on."""
+    where = []
+    if by_category:
+        where.append("category = ?")
+    if by_type:
+        where.append("type = ?")
+    if by_mod_id:
+        where.append("mod_id = ?")
+
+    sql = f"SELECT {MOD_SEARCH_FIELDS} FROM gamedata"
+    if where:
+        sql = f"{sql} WHERE {' AND '.join(where)}"
+    return sql
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# chardata
+# -------------------------------------------------------------------------------------------------------------------
+INSERT_PLAYER: str = (
+    "INSERT INTO players (player_id, player_name, player_real_name, player_email, player_json, deleted) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+UPDATE_PLAYER: str = (
+    "UPDATE players SET player_real_name = ?, player_email = ?, player_json = ? WHERE player_id = ?"
+)
+
+INSERT_CHAR: str = (
+    "INSERT INTO characters (char_id, char_name, char_archetype, player_id, char_type, char_json, deleted) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+UPDATE_CHAR: str = (
+    "UPDATE characters SET char_name = ?, char_archetype = ?, char_type = ?, char_json = ? WHERE char_id = ?"
+)
+
+INSERT_LIVE_CHAR: str = (
+    "INSERT INTO live_characters (live_char_id, char_id, player_id, char_name, live_char_json, deleted) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+UPDATE_LIVE_CHAR: str = (
+    "UPDATE live_characters SET char_id = ?, char_name = ?, live_char_json = ? WHERE live_char_id = ?"
+)
+LIVE_CHAR_BY_CHAR_AND_PLAYER: str = (
+    "SELECT * FROM live_characters WHERE char_id = ? AND player_id = ?"
+)
+
+# Most ids bound to one pc_by_ids statement (older SQLite builds allow 999 parameters)
+MAX_BOUND_IDS: int = 500
+
+
+@lru_cache(maxsize=None)
+def pc_by_id(
+    pc: str = "player", include_deleted: bool = True, by_char_id: bool = False
+) -> str:
+    """Requires: pc (str), include_deleted (bool), by_char_id (bool); returns str.
+    'SELECT * FROM {table} WHERE {pc_id} = ?'. Bind the id.
+    Available Options:
+    include_deleted: False adds 'AND deleted = 0'
+    by_char_id: search by char_id rather than the table's own id (e.g. live_characters by char_id)"""
+    table, pc_id, _ = PC_TABLES[pc]
+    if by_char_id:
+        pc_id = "char_id"
+
+    sql = f"SELECT * FROM {table} WHERE {pc_id} = ?"
+    if not include_deleted:
+        sql = f"{sql} AND deleted = 0"
+    return sql
+
+
+@lru_cache(maxsize=None)
+def pc_by_ids(pc: str = "player", count: int = 1, by_char_id: bool = False) -> str:
+    """Requires: pc (str), count (int), by_char_id (bool); returns str.
+    'SELECT * FROM {table} WHERE {pc_id} IN (?, ...)' with count parameters. Bind the ids.
+    Available Options:
+    by_char_id: search by char_id rather than the table's own id (e.g. live_characters by char_id)
+    Keep count under SQLite's bound parameter limit (see MAX_BOUND_IDS)."""
+    table, pc_id, _ = PC_TABLES[pc]
+    if by_char_id:
+        pc_id = "char_id"
+
+    return f"SELECT * FROM {table} WHERE {pc_id} IN ({', '.join('?' * count)})"
+
+
+@lru_cache(maxsize=None)
+def pc_by_name(
+    pc: str = "player",
+    lower_case: bool = False,
+    by_player_id: bool = False,
+    include_deleted: bool = True,
+) -> str:
+    """Requires: pc (str), lower_case (bool), by_player_id (bool), include_deleted (bool); returns str.
+    'SELECT * FROM {table} WHERE {pc_name} = ?'. Bind the name, then the player_id if by_player_id.
+    Available Options:
+    lower_case: True makes the match case-insensitive (COLLATE NOCASE), otherwise it is exact (COLLATE BINARY)
+    by_player_id: adds 'AND player_id = ?'
+    include_deleted: False adds 'AND deleted = 0'"""
+    table, _, pc_name = PC_TABLES[pc]
+    collate = "NOCASE" if lower_case else "BINARY"
+
+    sql = f"SELECT * FROM {table} WHERE {pc_name} = ? COLLATE {collate}"
+    if by_player_id:
+        sql = f"{sql} AND player_id = ?"
+    if not include_deleted:
+        sql = f"{sql} AND deleted = 0"
+    return sql
+
+
+@lru_cache(maxsize=None)
+def pc_list(
+    pc: str = "player", by_player_id: bool = False, include_deleted: bool = True
+) -> str:
+    """Requires: pc (str), by_player_id (bool), include_deleted (bool); returns str.
+    'SELECT {pc_id}, {pc_name} FROM {table}'. Bind the player_id if by_player_id."""
+    table, pc_id, pc_name = PC_TABLES[pc]
+
+    where = []
+    if not include_deleted:
+        where.append("deleted = 0")
+    if by_player_id:
+        where.append("player_id = ?")
+
+    sql = f"SELECT {pc_id}, {pc_name} FROM {table}"
+    if where:
+        sql = f"{sql} WHERE {' AND '.join(where)}"
+    return sql
+
+
+@lru_cache(maxsize=None)
+def pc_last_id(pc: str = "player") -> str:
+    """Requires: pc (str); returns str.
+    Highest id in use in the pc's table. No parameters."""
+    table, pc_id, _ = PC_TABLES[pc]
+    return f"SELECT {pc_id} FROM {table} ORDER BY {pc_id} DESC LIMIT 1"
+
+
+@lru_cache(maxsize=None)
+def pc_exists(pc: str = "player") -> str:
+    """Requires: pc (str); returns str.
+    Quick existence check. Bind the id."""
+    table, pc_id, _ = PC_TABLES[pc]
+    return f"SELECT * FROM {table} WHERE {pc_id} = ? LIMIT 1"
+
+
+@lru_cache(maxsize=None)
+def pc_deleted_check(pc: str = "player") -> str:
+    """Requires: pc (str); returns str.
+    'SELECT {pc_id} FROM {table} WHERE {pc_id} = ? AND deleted = ?'. Bind the id, then 1 (marked) or 0 (unmarked)."""
+    table, pc_id, _ = PC_TABLES[pc]
+    return f"SELECT {pc_id} FROM {table} WHERE {pc_id} = ? AND deleted = ?"
+
+
+@lru_cache(maxsize=None)
+def pc_set_deleted(pc: str = "player") -> str:
+    """Requires: pc (str); returns str.
+    'UPDATE {table} SET deleted = ? WHERE {pc_id} = ?'. Bind 1 (mark) or 0 (unmark), then the id."""
+    table, pc_id, _ = PC_TABLES[pc]
+    return f"UPDATE {table} SET deleted = ? WHERE {pc_id} = ?"
+
+
+@lru_cache(maxsize=None)
+def pc_marked_deleted(pc: str = "player") -> str:
+    """Requires: pc (str); returns str.
+    Every row of the pc's table marked for deletion. No parameters."""
+    table, _, _ = PC_TABLES[pc]
+    return f"SELECT * FROM {table} WHERE deleted = 1"
+
+
+@lru_cache(maxsize=None)
+def pc_purge_deleted(pc: str = "player") -> str:
+    """Requires: pc (str); returns str.
+    Permanently deletes every row of the pc's table marked for deletion. No parameters."""
+    table, _, _ = PC_TABLES[pc]
+    return f"DELETE FROM {table} WHERE deleted = 1"
+
+
+# The common single-row lookups
+PLAYER_BY_ID: str = pc_by_id("player")
+PLAYER_BY_NAME: str = pc_by_name("player")
+CHAR_BY_ID: str = pc_by_id("char")
+CHAR_BY_NAME: str = pc_by_name("char")
+LIVE_CHAR_BY_ID: str = pc_by_id("live_char")
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# Generic searches (table and field names must come from code, never from user input)
+# -------------------------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def search_by_field(table: str, field: str, fields: str = "*") -> str:
+    """Requires: table (str), field (str), fields (str); returns str.
+    'SELECT {fields} FROM {table} WHERE {field} = ?'. Bind the value."""
+    return f"SELECT {fields} FROM {table} WHERE {field} = ?"
+
+
+@lru_cache(maxsize=None)
+def search_like(table: str, field: str, fields: str = "*") -> str:
+    """Requires: table (str), field (str), fields (str); returns str.
+    Case-insensitive 'begins with' search on field, ordered by field. Bind like_prefix(search_text)."""
+    return f"SELECT {fields} FROM {table} WHERE {field} LIKE ? ESCAPE '\\' ORDER BY {field}"
+
+
+def like_prefix(search_text: str) -> str:
+    """Requires: search_text (str); returns str.
+    Turns search_text into a 'begins with' LIKE parameter, escaping any % or _ it contains so they are matched
+    literally. Use with statements that have "LIKE ? ESCAPE '\\'"."""
+    escaped = (
+        str(search_text).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    return f"{escaped}%"
+
+
+def fts_match(search_text: str) -> str:
+    """Requires: search_text (str); returns str.
+    Turns free text into a safe FTS5 MATCH parameter: every word becomes a quoted prefix term ("word"*), and all of
+    them must match. FTS5 operators and punctuation in search_text are ignored. Returns "" if there are no words."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", str(search_text)))
@@ -2,7 +2,10 @@
 __version__ = "2.5.00"
 __author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
 
-from BSUtilities import BrokenShieldUtilities
+from contextlib import contextmanager
+from mod_catalog import ModCatalog
+from gamedata_snapshot import write_snapshot, clear_snapshot_cache
+from db_migrations import migrate_db, run_migration, GAMEDATA_MIGRATIONS
 from openpyxl import load_workbook
 from character_dataclasses import (
     BSCMConfig,
@@ -11,6 +14,10 @@ from character_dataclasses import (
 import sqlite3
 import json
 import logging
+import hashlib
+import time
+import os
+import sys
 
 
 logging.basicConfig(level=logging.WARNING)
@@ -19,16 +26,36 @@ logging.basicConfig(level=logging.WARNING)
 class ExcelImport:
     """This script reads gamedata.xlsx and exports ut to gamedata.json"""
 
-    def __init__(self, **kwargs):
+    # Number of rows written to the Gamedata DB per executemany
+    export_batch_size: int = 500
+
+    # Effect fields that split_effects turns into lists. Built once rather than a BSCMConfig per cell
+    convert_to_list: frozenset = frozenset(BSCMConfig().convert_to_list)
+
+    def __init__(self, incremental=False, db_path="./gamedata/", **kwargs):
         super(ExcelImport, self).__init__(**kwargs)
-        # Create Gamedata DB
-        self.create_gamedata_db()
+        # incremental = True only writes the mods whose rows have changed since the last export, otherwise the
+        # gamedata table is dropped and rebuilt (in the export's transaction, see create_json_datafile). Either way
+        # the change set is worked out from the stored row hashes, so they have to be read BEFORE the table goes
+        self.incremental = incremental
+        self.db_path = db_path
+        self.stored_hashes = self.read_row_hashes(db_path=db_path)
+
+        # Bring an existing Gamedata DB up to date, a full export builds a new one
+        if incremental and self.stored_hashes:
+            migrate_db(
+                db="broken_shield_gamedata.sqlite",
+                db_path=db_path,
+                migrations=GAMEDATA_MIGRATIONS,
+            )
+        else:
+            self.incremental = False
 
     @staticmethod
     def split_effects(data, want_list=False):
         """Processes cell data and divides up the individual effects for formatting"""
         # TODO: Fix bug where it cannot process a text string that begins with a minus symbol (-)
-        bscm = BSCMConfig()
+        convert_to_list = ExcelImport.convert_to_list
         list_of_effects = {}
 
         # Check data is not null
@@ -40,7 +67,7 @@ class ExcelImport:
                     for effect in effects:
                         individual_effect = effect.split(":")
                         effect_id = individual_effect[0]
-                        if effect_id in bscm.convert_to_list:
+                        if effect_id in convert_to_list:
                             effect_value = individual_effect[1].split(",")
                         else:
                             if individual_effect[1].isnumeric():
@@ -59,7 +86,7 @@ class ExcelImport:
                 individual_effect = data.split(":")
                 if want_list is False:
                     effect_id = individual_effect[0]
-                    if effect_id in bscm.convert_to_list:
+                    if effect_id in convert_to_list:
                         effect_value = individual_effect[1].split(",")
                     else:
                         if individual_effect[1].isnumeric():
@@ -79,7 +106,64 @@ class ExcelImport:
 
         return list_of_effects
 
+    @staticmethod
+    def json_entry(mod_id, mod_details):
+        """Formats one mod exactly as json.dump(..., indent=4) would write it inside the gamedata JSON file, so the
+        file can be written a mod at a time"""
+        entry = json.dumps({mod_id: mod_details}, indent=4)[2:-2]
+        return "\n".join("    " + line for line in entry.split("\n"))
+
+    @staticmethod
+    def row_hash(db_row):
+        """SHA-256 of a gamedata row as it is stored in the DB. Bools are hashed as the ints SQLite stores them as, so
+        a freshly transformed row and the same row read back from the DB hash the same"""
+        values = [int(value) if isinstance(value, bool) else value for value in db_row]
+        return hashlib.sha256(json.dumps(values).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def read_row_hashes(
+        db="broken_shield_gamedata.sqlite",
+        gamedata="gamedata",
+        db_path="./gamedata/",
+    ):
+        """Returns {mod_id: row_hash} for every mod in the Gamedata DB, or {} if there isn't one yet. Mods without a
+        stored hash (a DB exported before gamedata_hashes existed) are hashed from the row itself. Only mods with a
+        gamedata row are returned: a hash left behind by a deleted row would otherwise mark the mod as unchanged, so
+        an incremental export would never write it again."""
+        if not os.path.exists(db_path + db):
+            return {}
+
+        conn = sqlite3.connect(db_path + db)
+        try:
+            tables = {
+                table[0]
+                for table in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table'"
+                )
+            }
+            if gamedata not in tables:
+                return {}
+
+            if "gamedata_hashes" in tables:
+                rows_sql = (
+                    f"SELECT {gamedata}.*, gamedata_hashes.row_hash FROM {gamedata} "
+                    f"LEFT JOIN gamedata_hashes ON gamedata_hashes.mod_id = {gamedata}.mod_id"
+                )
+            else:
+                rows_sql = f"SELECT *, NULL FROM {gamedata}"
+            stored_hashes = {}
+            for *db_row, row_hash in conn.execute(rows_sql):
+                stored_hashes[db_row[0]] = row_hash or ExcelImport.row_hash(db_row)
+        finally:
+            conn.close()
+
+        return stored_hashes
+
     def create_json_datafile(self, excel_workbook="broken_shield_gamedata.xlsx"):
+        """Exports the workbook to the Gamedata DB and JSON file and returns the change set (also written to
+        broken_shield_gamedata_changes.json): the mod_ids inserted, updated and deleted since the last export"""
+        export_start = time.perf_counter()
+
         # We need this for the JSON writing
         bscm = BSCMConfig()
 
@@ -89,13 +173,12 @@ class ExcelImport:
 
         lc = LiveCharacterModel(char_id=999999, live_char_id=999999, player_id=999999)
         lc_dict = lc.dict()
-        valid_nodes = list(lc_dict.keys())
+        valid_nodes = set(lc_dict.keys())
 
-        utils = BrokenShieldUtilities()
         json_file = "broken_shield_gamedata"
         count = 0
 
-        excel_path = "./gamedata/" + excel_workbook
+        excel_path = self.db_path + excel_workbook
 
         # Open up the Excel workbook for processing
         workbook = load_workbook(
@@ -108,8 +191,6 @@ class ExcelImport:
         sheet = workbook.active
 
         # Define the empty dicts to store the data in
-        data_file: dict = {}
-        mods_data: dict = {}
         effects_list: list = []
         node_category_list = set()
         node_type_list = set()
@@ -130,186 +211,267 @@ class ExcelImport:
         # All Mod types
         all_mods = set(tp_no_change + tp_bonus + tp_cost)
 
-        # Read each row (except the first as that is headings) and process the data
-        for row in sheet.iter_rows(min_row=2, values_only=True):
-            if row[0]:  # Ensure there is actually mod entry!
-                # 15 = ACTIVE
-                if row[15] == 1:  # Only add mods that are indicated as Active = 1
-                    count += 1
-
-                    # 1 = MOD_ID
-                    # 2 = NAME
-                    # 3 = CATEGORY
-                    # 4 = TYPE
-                    if row[4]:
-                        # Discover if there is a Spent TP or Bonus TP value by mod type
-                        if row[4] in tp_bonus:
-                            tpb = 2
-                            tps = 0
-                        elif row[4] in tp_cost:
-                            tps = 1
-                            tpb = 0
-                        else:
-                            tps = 0
-                            tpb = 0
+        # Rows are streamed from the workbook and written to the Gamedata DB in batches of export_batch_size, all
+        # inside ONE transaction, which for a full export also drops and recreates the gamedata table. It is
+        # committed at the end or rolled back completely if the export fails part way through. The JSON file is
+        # written in the same pass, a mod at a time, to a temporary file that only replaces the old one once the DB
+        # has been committed, and is deleted if the export fails
+        db = "broken_shield_gamedata.sqlite"
+        db_path = self.db_path
+        json_path = db_path + json_file + ".json"
+        db_rows: list = []
+        seen_mod_ids: set = set()
+        export_stats: dict = {"batches": 0, "rows": 0, "db_time": 0.0, "json_time": 0.0}
+        change_set: dict = {
+            "incremental": self.incremental,
+            "inserted": [],
+            "updated": [],
+            "deleted": [],
+            "unchanged": 0,
+        }
+
+        conn = sqlite3.connect(db_path + db, isolation_level=None)
+        with self.export_transaction(conn, json_path + ".tmp"), open(
+            json_path + ".tmp", "w"
+        ) as json_out:
+            json_out.write("{\n    " + json.dumps(json_file) + ": {")
+
+            # Read each row (except the first as that is headings) and process the data
+            for row in sheet.iter_rows(min_row=2, values_only=True):
+                if row[0]:  # Ensure there is actually mod entry!
+                    # 15 = ACTIVE
+                    if row[15] == 1:  # Only add mods that are indicated as Active = 1
+                        count += 1
+
+                        # 1 = MOD_ID
+                        # 2 = NAME
+                        # 3 = CATEGORY
+                        # 4 = TYPE
+                        if row[4]:
+                            # Discover if there is a Spent TP or Bonus TP value by mod type
+                            if row[4] in tp_bonus:
+                                tpb = 2
+                                tps = 0
+                            elif row[4] in tp_cost:
+                                tps = 1
+                                tpb = 0
+                            else:
+                                tps = 0
+                                tpb = 0
 
-                        # print(f"TPB = {tpb} and TPS = {tps}")
+                            # print(f"TPB = {tpb} and TPS = {tps}")
 
-                    # 5 = CHOOSE TEXT
-                    if row[5] == 1:
-                        choose_text = True
-                    else:
-                        choose_text = False
+                        # 5 = CHOOSE TEXT
+                        if row[5] == 1:
+                            choose_text = True
+                        else:
+                            choose_text = False
 
-                    # 6 = ALLOW MULTIPLE
-                    if row[6] == 1:
-                        allow_multiple = True
-                    else:
-                        allow_multiple = False
+                        # 6 = ALLOW MULTIPLE
+                        if row[6] == 1:
+                            allow_multiple = True
+                        else:
+                            allow_multiple = False
 
-                    # 7 = PREREQS = LIST [] or null
-                    # 8 = PREREQ ANY ALL
-                    # Clean Prerequisites
-                    if row[7]:
-                        prereq_data = self.split_effects(row[7], True)
-                    else:
-                        prereq_data = row[7]
-
-                    if row[8] == "all":
-                        prereq_any = False
-                    else:  # Blank default to Any/True
-                        prereq_any = True
-
-                    # 9 = RESTRICTION = LIST [] or null
-                    # 10 = RESTRICTION ANY ALL
-                    # Clean Restrictions
-                    if row[9]:
-                        restrict_data = self.split_effects(row[9], True)
-                    else:
-                        restrict_data = row[9]
-
-                    if row[10] == "all":
-                        restrict_any = False
-                    else:  # Blank default to Any/True
-                        restrict_any = True
-
-                    # 11 = TOUCHED SKILLS = LIST []
-                    # Clean Touched Skills: grab list from row 12
-                    if row[12]:
-                        touch_data = []
-                        raw_touch_data = self.split_effects(row[12])
-                        new_touch_key = list(raw_touch_data.keys())
-                        for y in new_touch_key:
-                            if y in valid_nodes:
-                                touch_data.append(y.lower())
-                            else:
-                                touch_data.append(y.lower())
-                                logging.error("INVALID NODE FOUND: " + str(y))
-                                mod_errors.append(y)
-                        # Add in Spent TP or Bonus TP value
-                        if tps > 0:
-                            touch_data.append("tp_spent")
-                        if tpb > 0:
-                            touch_data.append("tp_bonus")
-                    else:
-                        touch_data = row[12]
-
-                    # 12 = EFFECTS = DICT {}
-                    # Clean Effects
-                    if row[12]:
-                        effect_data = self.split_effects(row[12])
-                        # Add in Spent TP or Bonus TP value
-                        if tps > 0:
-                            effect_data["tp_spent"] = tps
-                        if tpb > 0:
-                            effect_data["tp_bonus"] = tpb
-                        if effect_data:
-                            new_key = list(effect_data.keys())
-                            for x in new_key:
-                                if x in effects_list:
-                                    pass
+                        # 7 = PREREQS = LIST [] or null
+                        # 8 = PREREQ ANY ALL
+                        # Clean Prerequisites
+                        if row[7]:
+                            prereq_data = self.split_effects(row[7], True)
+                        else:
+                            prereq_data = row[7]
+
+                        if row[8] == "all":
+                            prereq_any = False
+                        else:  # Blank default to Any/True
+                            prereq_any = True
+
+                        # 9 = RESTRICTION = LIST [] or null
+                        # 10 = RESTRICTION ANY ALL
+                        # Clean Restrictions
+                        if row[9]:
+                            restrict_data = self.split_effects(row[9], True)
+                        else:
+                            restrict_data = row[9]
+
+                        if row[10] == "all":
+                            restrict_any = False
+                        else:  # Blank default to Any/True
+                            restrict_any = True
+
+                        # 11 = TOUCHED SKILLS = LIST []
+                        # Clean Touched Skills: grab list from row 12
+                        if row[12]:
+                            touch_data = []
+                            raw_touch_data = self.split_effects(row[12])
+                            new_touch_key = list(raw_touch_data.keys())
+                            for y in new_touch_key:
+                                if y in valid_nodes:
+                                    touch_data.append(y.lower())
                                 else:
-                                    effects_list.append(x)
-                            # Correct "true"/"false" effects for actual true/false
-                            #for tf in effect_data:
-                            #    if effect_data[tf] == "true":
-                            #        effect_data[tf] = True
-                            #    elif effect_data[tf] == "false":
-                            #        effect_data[tf] = False
+                                    touch_data.append(y.lower())
+                                    logging.error("INVALID NODE FOUND: " + str(y))
+                                    mod_errors.append(y)
+                            # Add in Spent TP or Bonus TP value
+                            if tps > 0:
+                                touch_data.append("tp_spent")
+                            if tpb > 0:
+                                touch_data.append("tp_bonus")
                         else:
-                            logging.error("Effect data: Null")
-                    else:
-                        effect_data = row[12]
-
-                    # 13 = BOOK
-                    # 14 = PAGE
-                    # REF = DICT {}
-                    page_ref = (row[13], row[14])
-                    if all(page_ref):
-                        reference = {str(row[13]): row[14]}
+                            touch_data = row[12]
+
+                        # 12 = EFFECTS = DICT {}
+                        # Clean Effects
+                        if row[12]:
+                            effect_data = self.split_effects(row[12])
+                            # Add in Spent TP or Bonus TP value
+                            if tps > 0:
+                                effect_data["tp_spent"] = tps
+                            if tpb > 0:
+                                effect_data["tp_bonus"] = tpb
+                            if effect_data:
+                                new_key = list(effect_data.keys())
+                                for x in new_key:
+                                    if x in effects_list:
+                                        pass
+                                    else:
+                                        effects_list.append(x)
+                                # Correct "true"/"false" effects for actual true/false
+                                #for tf in effect_data:
+                                #    if effect_data[tf] == "true":
+                                #        effect_data[tf] = True
+                                #    elif effect_data[tf] == "false":
+                                #        effect_data[tf] = False
+                            else:
+                                logging.error("Effect data: Null")
+                        else:
+                            effect_data = row[12]
+
+                        # 13 = BOOK
+                        # 14 = PAGE
+                        # REF = DICT {}
+                        page_ref = (row[13], row[14])
+                        if all(page_ref):
+                            reference = {str(row[13]): row[14]}
+                        else:
+                            reference = None
+
+                        # JSON name of Mod
+                        mod_id = row[0]
+                        mod_details = {
+                            "name": row[1],
+                            "description": row[2],
+                            "category": row[3],
+                            "type": row[4],
+                            "choose_text": choose_text,
+                            "allow_multiple": allow_multiple,
+                            "prereqs": prereq_data,
+                            "prereq_any": prereq_any,
+                            "restriction": restrict_data,
+                            "restrict_any": restrict_any,
+                            "skills_touched": touch_data,
+                            "effects": effect_data,
+                            "ref": reference,
+                        }
+                        # mod_id is a real PRIMARY KEY, so a duplicate replaces the earlier row in the DB (and in the
+                        # JSON once it is loaded), but it is almost certainly a mistake in the workbook
+                        if mod_id in seen_mod_ids:
+                            logging.error("DUPLICATE MOD_ID FOUND: " + str(mod_id))
+                            mod_errors.append(mod_id)
+                        seen_mod_ids.add(mod_id)
+
+                        # [mod_id, name, description, category, mod_type, choose_text, allow_multiple, prereqs,
+                        #  prereq_any, restriction, restriction_any, skills_touched, effects, ref]
+                        db_row = (
+                            mod_id,
+                            mod_details["name"],
+                            mod_details["description"],
+                            mod_details["category"],
+                            mod_details["type"],
+                            mod_details["choose_text"],
+                            mod_details["allow_multiple"],
+                            json.dumps(mod_details["prereqs"]),
+                            mod_details["prereq_any"],
+                            json.dumps(mod_details["restriction"]),
+                            mod_details["restrict_any"],
+                            json.dumps(mod_details["skills_touched"]),
+                            json.dumps(mod_details["effects"]),
+                            json.dumps(mod_details["ref"]),
+                        )
+
+                        # Compare the row with the last export. An incremental export only queues the changed rows
+                        # for the Gamedata DB (which is written in batches), a full export queues all of them
+                        row_hash = self.row_hash(db_row)
+                        stored_hash = self.stored_hashes.get(mod_id)
+                        if stored_hash is None:
+                            change_set["inserted"].append(mod_id)
+                        elif stored_hash != row_hash:
+                            change_set["updated"].append(mod_id)
+                        else:
+                            change_set["unchanged"] += 1
+                        if not self.incremental or stored_hash != row_hash:
+                            logging.debug("SQLite: queueing mod_id " + str(mod_id))
+                            db_rows.append((db_row, row_hash))
+                        if len(db_rows) >= self.export_batch_size:
+                            self.write_gamedata_db(conn, db_rows, export_stats)
+
+                        # Write the mod to the JSON file
+                        json_start = time.perf_counter()
+                        json_out.write(
+                            ("\n" if count == 1 else ",\n")
+                            + self.json_entry(mod_id, mod_details)
+                        )
+                        export_stats["json_time"] += time.perf_counter() - json_start
+
+                        logging.debug(
+                            str(count)
+                            + ": "
+                            + str(mod_id)
+                            + " ("
+                            + str(mod_details["name"])
+                            + ")"
+                        )
+                        node_category_list.add(mod_details["category"])
+                        node_type_list.add(mod_details["type"])
+
                     else:
-                        reference = None
-
-                    # JSON name of Mod
-                    mod_id = row[0]
-                    mod_details = {
-                        "name": row[1],
-                        "description": row[2],
-                        "category": row[3],
-                        "type": row[4],
-                        "choose_text": choose_text,
-                        "allow_multiple": allow_multiple,
-                        "prereqs": prereq_data,
-                        "prereq_any": prereq_any,
-                        "restriction": restrict_data,
-                        "restrict_any": restrict_any,
-                        "skills_touched": touch_data,
-                        "effects": effect_data,
-                        "ref": reference,
-                    }
-                    mods_data[mod_id] = mod_details
-
-                    # Write to Gamedata DB
-                    # [mod_id, name, description, category, mod_type, choose_text, allow_multiple, prereqs,
-                    #  prereq_any, restriction, restriction_any, skills_touched, effects, ref]
-                    logging.debug("SQLite: writing mod_id " + str(mod_id))
-
-                    self.write_gamedata_db(
-                        mod_id,
-                        mod_details["name"],
-                        mod_details["description"],
-                        mod_details["category"],
-                        mod_details["type"],
-                        mod_details["choose_text"],
-                        mod_details["allow_multiple"],
-                        json.dumps(mod_details["prereqs"]),
-                        mod_details["prereq_any"],
-                        json.dumps(mod_details["restriction"]),
-                        mod_details["restrict_any"],
-                        json.dumps(mod_details["skills_touched"]),
-                        json.dumps(mod_details["effects"]),
-                        json.dumps(mod_details["ref"]),
-                    )
-
-                    logging.debug(
-                        str(count)
-                        + ": "
-                        + str(mod_id)
-                        + " ("
-                        + str(mod_details["name"])
-                        + ")"
-                    )
-                    node_category_list.add(mod_details["category"])
-                    node_type_list.add(mod_details["type"])
+                        inactive_nodes += 1
+
+            # Write the last (part) batch, remove the mods that are no longer in the workbook (a full export has
+            # already dropped them) and close off the JSON
+            if db_rows:
+                self.write_gamedata_db(conn, db_rows, export_stats)
+            change_set["deleted"] = sorted(set(self.stored_hashes) - seen_mod_ids)
+            if self.incremental and change_set["deleted"]:
+                self.delete_gamedata_db(conn, change_set["deleted"])
+            json_out.write("\n    }\n}" if count else "}\n}")
+
+        os.replace(json_path + ".tmp", json_path)
+        logging.info(f"SQLite: committed {export_stats['rows']} mods to {db_path}{db}")
+
+        # Write the change set, so downstream caches and compiled characters can invalidate only what changed
+        changes_path = db_path + json_file + "_changes.json"
+        with open(changes_path, "w") as changes_out:
+            json.dump(change_set, changes_out, indent=4)
+        changed = (
+            len(change_set["inserted"])
+            + len(change_set["updated"])
+            + len(change_set["deleted"])
+        )
 
-                else:
-                    inactive_nodes += 1
+        # Index the freshly written rows for full-text search (search_mods)
+        post_start = time.perf_counter()
+        if changed or not self.incremental:
+            self.rebuild_gamedata_fts(db_path=db_path)
 
-        # Encase the dict in the overall type: mods_data
-        data_file[json_file] = mods_data
+        # Binary snapshot of the new gamedata (plus NodeMap and BreedTemplates) for fast startup
+        write_snapshot(ModCatalog(db_path=db_path), db_path=db_path)
 
-        # Write the JSON file
-        utils.write_json(data_file, json_file, "w", "./gamedata")
+        # The gamedata DB has been regenerated, so any in-memory catalog or snapshot of it is now stale
+        clear_snapshot_cache()
+        ModCatalog.invalidate_all()
+        post_time = time.perf_counter() - post_start
+        total_time = time.perf_counter() - export_start
 
         effects_list.sort()
 
@@ -360,20 +522,53 @@ class ExcelImport:
             + "\n\n4. INACTIVE MODS: "
             + str(inactive_nodes)
             + " (Active column not set to 1)"
+            + "\n\n5. EXPORT STATS\n"
+            + f"{export_stats['rows']} mods written to {db} in {export_stats['batches']} batch(es) of up to "
+            + f"{self.export_batch_size} (1 transaction) and to {json_file}.json in the same pass"
+            + f"\nSQLite inserts: {export_stats['db_time']:.3f}s, JSON: {export_stats['json_time']:.3f}s, "
+            + f"FTS index + snapshot: {post_time:.3f}s, "
+            + "workbook read + transform: "
+            + f"{total_time - export_stats['db_time'] - export_stats['json_time'] - post_time:.3f}s"
+            + f"\nTotal: {total_time:.3f}s ({export_stats['rows'] / total_time:.0f} mods/s)"
+            + "\n\n6. CHANGES SINCE LAST EXPORT ("
+            + ("incremental" if self.incremental else "full")
+            + f" export, written to {changes_path})"
+            + f"\nInserted: {len(change_set['inserted'])}, updated: {len(change_set['updated'])}, "
+            + f"deleted: {len(change_set['deleted'])}, unchanged: {change_set['unchanged']}"
             + "\n\nEND DATA VALIDATION"
             + "\n....................\n"
         )
 
+        return change_set
+
+    @contextmanager
+    def export_transaction(self, conn, json_tmp_path):
+        """The one transaction an export writes the Gamedata DB in (conn must have isolation_level=None, or sqlite3
+        commits before the DROP and CREATE TABLE of a full export). A full export starts by rebuilding the gamedata
+        table (create_gamedata_db). Commits if the export finishes, otherwise rolls everything back and deletes the
+        half written JSON at json_tmp_path, so the DB and the JSON are left as they were."""
+        conn.execute("BEGIN")
+        try:
+            if not self.incremental:
+                self.create_gamedata_db(conn)
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            if os.path.exists(json_tmp_path):
+                os.remove(json_tmp_path)
+            logging.error(
+                "SQLite: the export FAILED and was rolled back, the Gamedata DB and JSON are unchanged"
+            )
+            raise
+        finally:
+            conn.close()
+
     @staticmethod
-    def create_gamedata_db(
-        db="broken_shield_gamedata.sqlite",
-        gamedata="gamedata",
-        db_path="./gamedata/",
-    ):
-        # IF broken_shield_gamedata DOESN'T EXIST CREATE IT.
-        conn = sqlite3.connect(db_path + db)
+    def create_gamedata_db(conn, gamedata="gamedata"):
+        """Drops and recreates the gamedata table and runs every migration on it, in conn's current transaction
+        (committing is left to the caller, see export_transaction)"""
         cursor = conn.cursor()
-        logging.info(f"SQLite: connecting to db = {db_path}{db}")
 
         # IF gamedata TABLE DOESN'T EXIST, CREATE IT.  IF IT DOES EXIST DELETE AND RECREATE!
         drop_table_sql = f"DROP TABLE IF EXISTS {gamedata}"
@@ -390,63 +585,79 @@ class ExcelImport:
         logging.info(f"SQLite: create table = {create_table_sql}")
         cursor.execute(drop_table_sql)
         cursor.execute(create_table_sql)
-        conn.commit()
-        conn.close()
+        # The fresh table is the original (v0) schema, so the migrations build the rest, in this same transaction
+        for migration_version, description, statements in GAMEDATA_MIGRATIONS:
+            logging.info(
+                f"SQLite: migrating to schema v{migration_version}: {description}"
+            )
+            run_migration(conn, migration_version, statements)
 
     @staticmethod
-    def write_gamedata_db(
-        mod_id,
-        name,
-        description,
-        category,
-        mod_type,
-        choose_text,
-        allow_multiple,
-        prereqs,
-        prereq_any,
-        restriction,
-        restriction_any,
-        skills_touched,
-        effects,
-        ref,
-        db="broken_shield_gamedata.sqlite",
-        gamedata="gamedata",
-        db_path="./gamedata/",
-    ):
-        conn = sqlite3.connect(db_path + db)
-        cursor = conn.cursor()
-
+    def write_gamedata_db(conn, db_rows, export_stats, gamedata="gamedata"):
+        """Writes a batch of (gamedata row, row hash) with a single executemany each for the rows and their hashes,
+        updates export_stats and empties db_rows. Committing is left to the caller, so a whole export is one
+        transaction."""
+        db_start = time.perf_counter()
+
+        # mod_id is a real PRIMARY KEY, so a row for an existing mod_id UPDATEs it in place (keeping its rowid, which
+        # gamedata_fts is keyed on) and a duplicate mod_id replaces the earlier one (as it does in the JSON)
         write_sql = (
             f"INSERT INTO {gamedata} (mod_id, name, description, category, type, choose_text, allow_multiple, "
             f"prereqs, prereq_any, restriction, restriction_any, skills_touched, effects, ref) "
-            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT (mod_id) DO UPDATE SET name=excluded.name, description=excluded.description, "
+            f"category=excluded.category, type=excluded.type, choose_text=excluded.choose_text, "
+            f"allow_multiple=excluded.allow_multiple, prereqs=excluded.prereqs, prereq_any=excluded.prereq_any, "
+            f"restriction=excluded.restriction, restriction_any=excluded.restriction_any, "
+            f"skills_touched=excluded.skills_touched, effects=excluded.effects, ref=excluded.ref"
+        )
+        conn.executemany(write_sql, [db_row for db_row, row_hash in db_rows])
+        conn.executemany(
+            "INSERT OR REPLACE INTO gamedata_hashes (mod_id, row_hash) VALUES (?, ?)",
+            [(db_row[0], row_hash) for db_row, row_hash in db_rows],
         )
 
-        cursor.execute(
-            write_sql,
-            [
-                mod_id,
-                name,
-                description,
-                category,
-                mod_type,
-                choose_text,
-                allow_multiple,
-                prereqs,
-                prereq_any,
-                restriction,
-                restriction_any,
-                skills_touched,
-                effects,
-                ref,
-            ],
+        export_stats["batches"] += 1
+        export_stats["rows"] += len(db_rows)
+        export_stats["db_time"] += time.perf_counter() - db_start
+        logging.info(
+            f"SQLite: wrote batch {export_stats['batches']} ({export_stats['rows']} mods so far)"
+        )
+        db_rows.clear()
+
+    @staticmethod
+    def delete_gamedata_db(conn, mod_ids, gamedata="gamedata"):
+        """Deletes the given mod_ids (and their row hashes) from the Gamedata DB. Committing is left to the
+        caller."""
+        conn.executemany(
+            f"DELETE FROM {gamedata} WHERE mod_id = ?",
+            [(mod_id,) for mod_id in mod_ids],
+        )
+        conn.executemany(
+            "DELETE FROM gamedata_hashes WHERE mod_id = ?",
+            [(mod_id,) for mod_id in mod_ids],
         )
+        logging.info(f"SQLite: deleted {len(mod_ids)} mods no longer in the workbook")
+
+    @staticmethod
+    def rebuild_gamedata_fts(
+        db="broken_shield_gamedata.sqlite",
+        db_path="./gamedata/",
+    ):
+        # gamedata_fts is an external content FTS5 table (see GAMEDATA_MIGRATIONS v2), so it doesn't see rows
+        # written to gamedata until it is rebuilt
+        conn = sqlite3.connect(db_path + db)
+        cursor = conn.cursor()
+
+        cursor.execute("INSERT INTO gamedata_fts (gamedata_fts) VALUES ('rebuild')")
 
-        logging.info(f"SQLite: writing DB entry for {mod_id}")
+        logging.info(f"SQLite: rebuilt full-text index gamedata_fts in {db_path}{db}")
         conn.commit()
         conn.close()
 
 
-run_import = ExcelImport()
-# Import Data
-run_import.create_json_datafile("broken_shield_gamedata.xlsx")
+if __name__ == "__main__":
+    # Pass --incremental to only write the mods that have changed since the last export
+    run_import = ExcelImport(incremental="--incremental" in sys.argv)
+    # Import Data
+    run_import.create_json_datafile("broken_shield_gamedata.xlsx")
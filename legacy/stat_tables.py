@@ -0,0 +1,65 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.WARNING)
+
+# Wound Thresholds, Mook Thresholds and Initiative as NumPy lookup tables, for one character or a batch.
+
+
+class LookupTable:
+    """A banded stat as an array indexed by base value - low. rule gives the stat for one base value and is only
+    used to build the table."""
+
+    def __init__(self, low: int, high: int, rule):
+        self.low: int = low
+        self.high: int = high
+        self.values: np.ndarray = np.array(
+            [rule(base) for base in range(low, high + 1)], dtype=np.int64
+        )
+        # Plain ints for lookup, indexing a tuple is a lot quicker than a NumPy array for one value
+        self.scalars: tuple = tuple(int(value) for value in self.values)
+
+    def __len__(self):
+        return len(self.scalars)
+
+    def lookup(self, base: int) -> int:
+        """Requires: base (int); returns int.
+        The stat for one base value."""
+        if base < self.low:
+            base = self.low
+        elif base > self.high:
+            base = self.high
+        return self.scalars[base - self.low]
+
+    def lookup_many(self, bases) -> np.ndarray:
+        """Requires: bases (numpy array or list of int); returns numpy array.
+        The stat for every base value in bases."""
+        bases = np.asarray(bases, dtype=np.int64)
+        return self.values[np.clip(bases, self.low, self.high) - self.low]
+
+
+# Wound Thresholds: bases -2 to 33 in bands of 3 (-2 to 0 is 1, 1 to 3 is 2 ... 31 to 33 is 12), base / 3 + 1 outside
+WT_TABLE = LookupTable(
+    -60,
+    600,
+    lambda base: -(-base // 3) + 1 if -2 <= base <= 33 else int(base / 3) + 1,
+)
+
+# Mook Thresholds: bases -2 to 0 are 1, then bands of 7 up to 63 (1 to 7 is 2 ... 57 to 63 is 10), base / 7 + 1 outside
+MOOK_WT_TABLE = LookupTable(
+    -300,
+    3000,
+    lambda base: -(-base // 7) + 1 if -2 <= base <= 63 else int(base / 7) + 1,
+)
+
+# Initiative from physical + smarts + resources (never below 0): 0 to 32 in bands of 3 (0 to 2 is 1 ... 30 to 32 is
+# 11), psr / 3 above that
+INITIATIVE_TABLE = LookupTable(
+    0,
+    1800,
+    lambda psr: psr // 3 + 1 if psr <= 32 else psr // 3,
+)
@@ -2,12 +2,24 @@
 __version__ = "2.1.50"
 __author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
 
-from json import dumps
+from io import StringIO
+from json import dumps, loads
 
 import logging
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
 
 # from character_methods import CharacterMethods
 from delete_methods import DeleteMethods
+from run_gamedata_export import ExcelImport
+from gamedata_snapshot import get_snapshot, model_defaults
+from stat_tables import WT_TABLE, MOOK_WT_TABLE, INITIATIVE_TABLE
+from what_if import model_diff
 from character_dataclasses import (
     NodeMap,
     BaseModel,
@@ -93,6 +105,237 @@ class TestCharacterMethods(DeleteMethods):
             )
             return False
 
+    def test_mod_catalog(self) -> bool:
+        """This method tests that every record in the in-memory gamedata catalog matches the gamedata DB"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing: Running unit test for the gamedata "
+            f"catalog.{self.col['w']}"
+        )
+
+        fetch_sql = f"SELECT * FROM {self.gamedata_db['table']}"
+        db_data = self.db_fetch(
+            self.gamedata_db["db"], self.gamedata_db["db_path"], fetch_sql
+        )
+
+        mismatches: list = []
+        for row in db_data:
+            if self.get_mod_info(row[0]) != [row]:
+                mismatches.append(row[0])
+
+        if not mismatches and len(self.catalog) == len({row[0] for row in db_data}):
+            logging.info(
+                f"{self.chk} {self.test_text} All {len(db_data)} catalog records match the gamedata DB."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Catalog records that don't match the gamedata DB: "
+                f"{mismatches} {self.fail_txt}."
+            )
+            return False
+
+    def test_search_mods(self, query="gift of albion", mod_cat="edge") -> bool:
+        """This method tests that the full-text search_mods method returns ranked results, filtered by category"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing: Running unit test for search_mods "
+            f"method.{self.col['w']}"
+        )
+
+        return_data = self.search_mods(query, category=mod_cat, limit=5)
+        ranks = [record[4] for record in return_data]
+
+        if (
+            return_data
+            and len(return_data) <= 5
+            and all(record[2] == mod_cat for record in return_data)
+            and ranks == sorted(ranks)
+            and self.search_mods("!!!") == []
+        ):
+            logging.info(
+                f"{self.chk} {self.test_text} search_mods found {len(return_data)} '{mod_cat}' mods for "
+                f"'{query}': {[record[0] for record in return_data]}"
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Dump of search_mods results: {return_data} {self.fail_txt}."
+            )
+            return False
+
+    def test_mod_autocomplete(
+        self, search_text="ar", mod_cat="edge", mod_type="dgx"
+    ) -> bool:
+        """This method tests that the in-memory mod_autocomplete returns the same mods, in the same order, as the
+        SQL mod_name_search, including when search_text is typed a character at a time"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing: Running unit test for mod_autocomplete "
+            f"method.{self.col['w']}"
+        )
+
+        mismatches: list = []
+        for search_type in ("name", "name_cat", "name_type", "cat_type", "cat", "type"):
+            db_search = self.mod_name_search(
+                search_text, mod_cat=mod_cat, mod_type=mod_type, search_type=search_type
+            )
+            index_search = self.mod_autocomplete(
+                search_text, mod_cat=mod_cat, mod_type=mod_type, search_type=search_type
+            )
+            if db_search != index_search:
+                mismatches.append(search_type)
+
+        # Typed a key at a time (and deleted again), so each search narrows or restarts the last one
+        typed = [search_text[: i + 1] for i in range(len(search_text))]
+        for prefix in typed + typed[-2::-1] + ["b", "bo"]:
+            db_search = self.mod_name_search(prefix, search_type="name")
+            index_search = self.mod_autocomplete(prefix, search_type="name")
+            if db_search != index_search:
+                mismatches.append(("name", prefix))
+
+        if not mismatches:
+            logging.info(
+                f"{self.chk} {self.test_text} mod_autocomplete matches mod_name_search for '{search_text}'."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} mod_autocomplete doesn't match mod_name_search for search types: "
+                f"{mismatches} {self.fail_txt}."
+            )
+            return False
+
+    def test_gamedata_snapshot(self) -> bool:
+        """This method tests that the gamedata snapshot (if there is an up-to-date one) holds the same mods as the
+        gamedata DB"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing: Running unit test for the gamedata "
+            f"snapshot.{self.col['w']}"
+        )
+
+        snapshot = get_snapshot(self.gamedata_db["db_path"])
+        if snapshot is None:
+            logging.info(
+                f"{self.cross} {self.test_text} No up-to-date gamedata snapshot, run gamedata_snapshot.py "
+                f"{self.fail_txt}."
+            )
+            return False
+
+        fetch_sql = f"SELECT * FROM {self.gamedata_db['table']}"
+        db_rows = tuple(
+            tuple(row)
+            for row in self.db_fetch(
+                self.gamedata_db["db"], self.gamedata_db["db_path"], fetch_sql
+            )
+        )
+
+        if snapshot.catalog_rows == db_rows:
+            logging.info(
+                f"{self.chk} {self.test_text} The gamedata snapshot matches the gamedata DB "
+                f"({len(db_rows)} mods)."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} The gamedata snapshot doesn't match the gamedata DB "
+                f"{self.fail_txt}."
+            )
+            return False
+
+    def test_gamedata_snapshot_defaults(self) -> bool:
+        """This method tests that the defaults the gamedata snapshot is keyed on (model_defaults) are the NodeMap and
+        BreedTemplates a snapshot holds, so the snapshot goes out of date exactly when they change"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing: the NodeMap and BreedTemplates defaults the "
+            f"gamedata snapshot is keyed on.{self.col['w']}"
+        )
+        different = [
+            model_class.__name__
+            for model_class in (NodeMap, BreedTemplates)
+            if model_defaults(model_class) != model_class().dict()
+        ]
+
+        if not different:
+            logging.info(
+                f"{self.chk} {self.test_text} The snapshot's defaults match NodeMap() and BreedTemplates()."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} The snapshot's defaults don't match: {different} {self.fail_txt}."
+            )
+            return False
+
+    def test_gamedata_export_rollback(self, fail_after=700, batch_size=100) -> bool:
+        """This method tests that a gamedata export that fails part way through (a transform error after fail_after
+        mods, with batches of batch_size already written) leaves the Gamedata DB and JSON as they were, for a full
+        and an incremental export. Runs on a copy of ./gamedata/"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing: a gamedata export that fails after {fail_after} "
+            f"mods is rolled back.{self.col['w']}"
+        )
+        db_path = tempfile.mkdtemp() + "/"
+        failures: list = []
+        try:
+            for file_name in (
+                "broken_shield_gamedata.sqlite",
+                "broken_shield_gamedata.json",
+                "broken_shield_gamedata.xlsx",
+            ):
+                shutil.copy("./gamedata/" + file_name, db_path)
+
+            def gamedata_state():
+                conn = sqlite3.connect(db_path + "broken_shield_gamedata.sqlite")
+                try:
+                    rows = conn.execute(
+                        "SELECT * FROM gamedata ORDER BY mod_id"
+                    ).fetchall()
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                finally:
+                    conn.close()
+                with open(db_path + "broken_shield_gamedata.json") as json_in:
+                    json_data = json_in.read()
+                return rows, version, json_data, sorted(os.listdir(db_path))
+
+            before = gamedata_state()
+            for incremental in (False, True):
+                export = ExcelImport(incremental=incremental, db_path=db_path)
+                export.export_batch_size = batch_size
+                calls = [0]
+
+                def failing_split_effects(data, want_list=False):
+                    calls[0] += 1
+                    if calls[0] > fail_after:
+                        raise ValueError("Forced transform error")
+                    return ExcelImport.split_effects(data, want_list)
+
+                export.split_effects = failing_split_effects
+                try:
+                    export.create_json_datafile()
+                    failures.append((incremental, "didn't fail"))
+                except ValueError:
+                    pass
+                if gamedata_state() != before:
+                    failures.append((incremental, "changed"))
+        finally:
+            shutil.rmtree(db_path, ignore_errors=True)
+
+        if not failures:
+            logging.info(
+                f"{self.chk} {self.test_text} The failed exports left the Gamedata DB and JSON as they were."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Failed exports (incremental, what happened): {failures} "
+                f"{self.fail_txt}."
+            )
+            return False
+
     def test_len(self, return_data):
         """Just a little test method to check that the length of returned data is greater than 0"""
         if len(return_data) > 0:
@@ -305,6 +548,134 @@ class TestCharacterMethods(DeleteMethods):
 
         return return_data
 
+    def test_rule_evaluators(
+        self,
+        character_mods=["e_sprinter", "e_enhanced_sprinter", "t_unregistered_echo"],
+    ) -> bool:
+        """Test that the bitset and list rule evaluators agree on check_mod_allowed for every mod in the catalog"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing the bitset rule evaluator against the list rule "
+            f"evaluator for every mod_id.{self.col['w']}"
+        )
+
+        rule_evaluator = self.rule_evaluator
+        mismatches: list = []
+        if not self.catalog.loaded:
+            self.catalog.load()
+        for mod_id in self.catalog.records:
+            self.rule_evaluator = "list"
+            list_allowed = self.check_mod_allowed(mod_id, character_mods)
+            self.rule_evaluator = "bitset"
+            bitset_allowed = self.check_mod_allowed(mod_id, character_mods)
+            if list_allowed != bitset_allowed:
+                mismatches.append(mod_id)
+        self.rule_evaluator = rule_evaluator
+
+        if not mismatches:
+            logging.info(
+                f"{self.chk} {self.test_text} The bitset and list rule evaluators agree for all "
+                f"{len(self.catalog)} mod_ids."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} The bitset and list rule evaluators disagree for: {mismatches} "
+                f"{self.fail_txt}."
+            )
+            return False
+
+    def test_check_mod_allowed_memo(self, char_ids=(0, 1, 2, 3, 4)) -> bool:
+        """Test that the memoised check_mod_allowed gives the same answer as checking from scratch for every mod in
+        the catalog against each character's mods, that asking again only hits the cache, and that reloading the
+        catalog empties it"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing memoised check_mod_allowed for "
+            f"char_ids:{char_ids}.{self.col['w']}"
+        )
+
+        self.catalog.reload()
+        allowed_cache = self.catalog.allowed_cache
+        mod_lists = [
+            self.get_char_current_mods(
+                char=self.load_char(char_id=char_id, feedback=False), cli_print=False
+            )
+            for char_id in char_ids
+        ]
+        # The mods a character has can be allowed more than once, so put a second copy of each in
+        mod_lists.append(mod_lists[0] + mod_lists[0])
+
+        mismatches: list = []
+        for char_mods in mod_lists:
+            for mod_id in self.catalog.records:
+                self.memoise_allowed = False
+                scratch = self.check_mod_allowed(mod_id, char_mods)
+                self.memoise_allowed = True
+                if self.check_mod_allowed(mod_id, char_mods) != scratch:
+                    mismatches.append(mod_id)
+
+        # Second time round everything is already cached
+        misses = allowed_cache.misses
+        for char_mods in mod_lists:
+            for mod_id in self.catalog.records:
+                self.check_mod_allowed(mod_id, char_mods)
+        all_hits = allowed_cache.misses == misses
+        cached = len(allowed_cache)
+
+        self.catalog.reload()
+        emptied = not len(allowed_cache)
+
+        if not mismatches and all_hits and emptied:
+            logging.info(
+                f"{self.chk} {self.test_text} The memoised answers match for all {len(self.catalog)} mod_ids "
+                f"({cached} cached, {allowed_cache.stats()})."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Memoised answers differ for: {mismatches}, second pass all hits: "
+                f"{all_hits}, emptied on reload: {emptied} {self.fail_txt}."
+            )
+            return False
+
+    def test_get_node_candidates(self, node_location="athletics_edge_n0") -> bool:
+        """Test that the precomputed candidates for a node are all in the node's category, and that including the
+        'extra' types only ever adds candidates"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing the candidate mod_ids for node "
+            f"'{node_location}'.{self.col['w']}"
+        )
+
+        node_cat = self.nm_dict[node_location]["category"]
+        candidates = self.get_node_candidates(node_location) or ()
+        candidates_extra = (
+            self.get_node_candidates(node_location, include_extra=True) or ()
+        )
+        wrong_category = [
+            mod_id
+            for mod_id in candidates_extra
+            if self.catalog.get(mod_id).category != node_cat
+        ]
+
+        if (
+            candidates
+            and not wrong_category
+            and set(candidates) <= set(candidates_extra)
+        ):
+            logging.info(
+                f"{self.chk} {self.test_text} '{node_location}' has {len(candidates)} candidates "
+                f"({len(candidates_extra)} including extra)."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} '{node_location}' candidates are wrong: {wrong_category} "
+                f"{self.fail_txt}."
+            )
+            return False
+
     def test_get_touched_skills(self, mod_id="e_deathworld_native") -> list:
         """This test checks that the method get_touched_skills works correctly."""
         logging.info(
@@ -371,6 +742,34 @@ class TestCharacterMethods(DeleteMethods):
 
         return return_data
 
+    def test_query_exists_in_db_table(self, query_id=1) -> bool:
+        """Test that query_exists_in_db finds an ID in the table for its id_label, and refuses a query_table that
+        isn't that table rather than looking in id_label's table instead"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing query_exists_in_db with a query_table that doesn't "
+            f"match id_label.{self.col['w']}"
+        )
+        found = self.query_exists_in_db(
+            query_id, query_table="players", id_label="player"
+        )
+        mismatched = self.query_exists_in_db(
+            query_id, query_table="characters", id_label="player"
+        )
+
+        if found and not mismatched:
+            logging.info(
+                f"{self.chk} {self.test_text} ID {query_id} found in 'players', refused for 'characters' with "
+                f"id_label 'player'."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Found in 'players': {found}, found in 'characters' with id_label "
+                f"'player': {mismatched} {self.fail_txt}."
+            )
+            return False
+
     def test_insert_update_db(self, write_id=1, write_type="player") -> bool:
         """This tests whether you will insert or update a Database table
         write type: str = player, char or live_char"""
@@ -491,6 +890,92 @@ class TestCharacterMethods(DeleteMethods):
 
         return char
 
+    def test_get_char_free_nodes(self, char_id=1) -> bool:
+        """Test that the free nodes from the compiled NodeGraph are exactly the empty nodes that check_node_cxn (or
+        being an entry node) and check_prerequisites_for_node allow"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing free nodes for character with "
+            f"char_id:{char_id}.{self.col['w']}"
+        )
+        char = self.load_char(char_id=char_id, feedback=False)
+        free_nodes = self.get_char_free_nodes(char=char)
+
+        filled_locations = [
+            x for x in char.nodes if char.nodes[x] and x in self.nm_dict
+        ]
+        expected: list = []
+        for empty_loc in char.nodes:
+            if char.nodes[empty_loc] or empty_loc not in self.nm_dict:
+                continue
+            cxn_list = self.nm_dict[empty_loc]["cxn"]
+            if cxn_list[0] == "null":
+                continue
+            if "entry_node" in cxn_list or self.check_node_cxn(
+                node_location=empty_loc, cxn_list=filled_locations
+            ):
+                if self.check_prerequisites_for_node(
+                    node_location=empty_loc, char=char
+                ):
+                    expected.append(empty_loc)
+
+        if free_nodes == expected:
+            logging.info(
+                f"{self.chk} {self.test_text} All {len(free_nodes)} free nodes match the node by node check."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Free nodes don't match the node by node check: "
+                f"{set(free_nodes) ^ set(expected)} {self.fail_txt}."
+            )
+            return False
+
+    def test_free_node_frontier(self, char_id=1, steps=200, seed=0) -> bool:
+        """Test that the FreeNodeFrontier kept up to date one mod at a time gives the same free nodes as the
+        NodeGraph works out from scratch, with mods added to free nodes and removed from filled nodes at random"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing the free node frontier for character with "
+            f"char_id:{char_id} over {steps} random changes.{self.col['w']}"
+        )
+        rng = random.Random(seed)
+        char = self.load_char(char_id=char_id, feedback=False)
+        nodes = dict(char.nodes)
+        graph = self.get_node_graph()
+        frontier = self.get_free_node_frontier(char=char)
+        req_mods = sorted(graph.req_by_mod)
+        if not self.catalog.loaded:
+            self.catalog.load()
+        mod_ids = sorted(self.catalog.records)
+
+        for step in range(steps):
+            filled = [x for x in nodes if nodes[x]]
+            free = frontier.free_nodes()
+            if free and (not filled or rng.random() < 0.6):
+                location = rng.choice(free)
+                # Favour the mods that open up req nodes, so those get exercised too
+                mod_id = rng.choice(req_mods if rng.random() < 0.3 else mod_ids)
+            else:
+                location = rng.choice(filled)
+                mod_id = ""
+            nodes[location] = mod_id
+            frontier.set_node(location, mod_id)
+
+            char_mods = {x for x in nodes.values() if x}
+            expected = graph.free_nodes(nodes, char_mods)
+            if frontier.free_nodes() != expected or not frontier.in_sync(nodes):
+                logging.info(
+                    f"{self.cross} {self.test_text} Frontier doesn't match after setting {location} to "
+                    f"'{mod_id}' (step {step}): {set(frontier.free_nodes()) ^ set(expected)} {self.fail_txt}."
+                )
+                return False
+
+        logging.info(
+            f"{self.chk} {self.test_text} Frontier matched the NodeGraph after all {steps} changes."
+        )
+        return True
+
     def test_retrieve_live_character(self, char_id=0, feedback=True):
         logging.info(
             f"{self.l_break}"
@@ -566,6 +1051,917 @@ class TestCharacterMethods(DeleteMethods):
 
         return char
 
+    def test_remove_mod_delta(self, char_id=1) -> bool:
+        """Test that taking each mod off a live character with its effect ledger delta gives the same stats as
+        building the live character again without that mod. Text stats are compared entry by entry (see
+        _text_entries), as entries can end up in a different order"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing removing each mod by delta against a full rebuild "
+            f"for character with char_id:{char_id}.{self.col['w']}"
+        )
+        char = self.load_char(char_id=char_id, feedback=False)
+        mod_ids = [x for x in char.nodes.values() if x]
+        checked: int = 0
+        mismatches: dict = {}
+
+        for mod_location, mod_id in char.nodes.items():
+            if not mod_id or mod_ids.count(mod_id) > 1:
+                continue
+            delta_live_char = self._build_live_char(char=char)
+            if not self.can_remove_mod_delta(
+                mod_id=mod_id, mod_location=mod_location, live_char=delta_live_char
+            ):
+                continue
+            self.remove_mod_delta(mod_id=mod_id, char=char, live_char=delta_live_char)
+            rebuilt_live_char = self._build_live_char(
+                char=char, skip_location=mod_location
+            )
+
+            delta_stats = self._derived_stats_dict(live_char=delta_live_char, char=char)
+            rebuilt_stats = self._derived_stats_dict(
+                live_char=rebuilt_live_char, char=char
+            )
+            different = [
+                x
+                for x in delta_stats
+                if delta_stats[x] != rebuilt_stats[x]
+                and (
+                    type(delta_stats[x]) is not str
+                    or self._text_entries(delta_stats[x])
+                    != self._text_entries(rebuilt_stats[x])
+                )
+            ]
+            if different:
+                mismatches[mod_id] = different
+            checked += 1
+
+        if not mismatches:
+            logging.info(
+                f"{self.chk} {self.test_text} Removing by delta matched a full rebuild for all {checked} mods."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Removing by delta didn't match a full rebuild for: {mismatches} "
+                f"{self.fail_txt}."
+            )
+            return False
+
+    @staticmethod
+    def _text_entries(text: str) -> list:
+        """The entries of a text stat, sorted: split where _apply_mod_effect and add_note join them (", ", or a
+        general note's ". \\n**Mod name:** ")"""
+        return sorted(re.split(r", |\. \n\*\*[^*\n]+:\*\* ", text))
+
+    def test_remove_mod_delta_write_to_db(self, char_id=1) -> bool:
+        """Test that remove_mod_from_character saves the live character when it takes a mod off by delta, as it does
+        when it rebuilds it"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing that removing a mod by delta is saved to the DB for "
+            f"character with char_id:{char_id}.{self.col['w']}"
+        )
+        char, live_char = self.load_complete_character(char_id=char_id)
+        placement = None
+        for location in self.get_char_free_nodes(char=char):
+            offered = self.check_mods_by_node(node_location=location, char=char)
+            for mod_id in offered or ():
+                if mod_id not in char.nodes.values():
+                    placement = (location, mod_id)
+                    break
+            if placement:
+                break
+        if not placement:
+            logging.info(
+                f"{self.cross} {self.test_text} No mod to place on char_id:{char_id} {self.fail_txt}."
+            )
+            return False
+        location, mod_id = placement
+
+        self.apply_mod_to_character(
+            mod_id=mod_id, mod_location=location, char=char, live_char=live_char
+        )
+        char, live_char = self.char, self.live_char
+        ledger = self.get_effect_ledger(live_char=live_char)
+        # Save a copy with the mod, so the DB has it to lose. The effect ledger tracks live_char itself, which saving
+        # would replace (and housekeeping the copy can start a new ledger for it)
+        self.new_or_update_live_char(
+            char_id=char.char_id,
+            player_id=char.player_id,
+            write_to_db=True,
+            live_char=live_char.copy(deep=True),
+        )
+        self.char, self.live_char, self.effect_ledger = char, live_char, ledger
+        saved = self.load_live_character(char_id=char_id, feedback=False)
+        saved_with = mod_id in saved.applied_mods
+        by_delta = self.can_remove_mod_delta(
+            mod_id=mod_id, mod_location=location, live_char=live_char
+        )
+        self.remove_mod_from_character(
+            mod_id=mod_id,
+            mod_location=location,
+            char=char,
+            live_char=live_char,
+            write_to_db=True,
+        )
+        saved = self.load_live_character(char_id=char_id, feedback=False)
+        saved_without = mod_id not in saved.applied_mods
+
+        if saved_with and by_delta and saved_without:
+            logging.info(
+                f"{self.chk} {self.test_text} {mod_id} removed from {location} by delta and saved."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} {mod_id} at {location} saved when applied: {saved_with}, removed by "
+                f"delta: {by_delta}, saved when removed: {saved_without} {self.fail_txt}."
+            )
+            return False
+
+    def test_remove_mod_delta_loaded(self, char_id=2) -> bool:
+        """Test that each mod can be taken off a live character freshly loaded from the DB by delta (its effect ledger
+        is seeded when it is loaded), and that the stats it changed then match rebuilding the live character without
+        it, as remove_mod_from_character does. Nothing is saved"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing removing each mod by delta from a freshly loaded "
+            f"character with char_id:{char_id}.{self.col['w']}"
+        )
+        char = self.load_char(char_id=char_id, feedback=False)
+        mod_ids = [x for x in char.nodes.values() if x]
+        checked: int = 0
+        mismatches: dict = {}
+
+        for mod_location, mod_id in char.nodes.items():
+            if not mod_id or mod_ids.count(mod_id) > 1:
+                continue
+            char, live_char = self.load_complete_character(char_id=char_id)
+            if not self.can_remove_mod_delta(
+                mod_id=mod_id, mod_location=mod_location, live_char=live_char
+            ):
+                continue
+            stats = set(self.effect_ledger.deltas[mod_id])
+            without = char.copy(deep=True)
+            without.nodes[mod_location] = ""
+            live_char = self.remove_mod_delta(
+                mod_id=mod_id, char=without, live_char=live_char
+            )
+            # The talent points are the CharacterModel's, which housekeeping copies over
+            without, live_char = self.calc_talent_points(
+                char=without, live_char=live_char
+            )
+            rebuilt_live_char = self.compile_live_char(
+                char=without, live_char=live_char
+            )
+            rebuilt_live_char = self.housekeeping(
+                char=without, live_char=rebuilt_live_char, full=True
+            )
+
+            delta_stats = {x: getattr(live_char, x) for x in stats}
+            rebuilt_stats = {x: getattr(rebuilt_live_char, x) for x in stats}
+            for stats_dict in (delta_stats, rebuilt_stats):
+                stats_dict["applied_mods"] = sorted(stats_dict["applied_mods"])
+            different = [
+                x
+                for x in stats
+                if delta_stats[x] != rebuilt_stats[x]
+                and (
+                    type(delta_stats[x]) is not str
+                    or self._text_entries(delta_stats[x])
+                    != self._text_entries(rebuilt_stats[x])
+                )
+            ]
+            if different:
+                mismatches[mod_id] = different
+            checked += 1
+
+        if checked and not mismatches:
+            logging.info(
+                f"{self.chk} {self.test_text} Removing by delta from the loaded character matched a full rebuild for "
+                f"all {checked} mods."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Removing by delta from the loaded character didn't match a full "
+                f"rebuild for: {mismatches} ({checked} mods checked) {self.fail_txt}."
+            )
+            return False
+
+    def test_what_if(self, char_id=4, sessions=50) -> bool:
+        """Test that applying and removing mods in what-if sessions leaves the loaded character and the DB alone, that
+        applying a mod and removing it again gives the base stats back, and that a committed session is saved"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing what-if sessions for character with "
+            f"char_id:{char_id}.{self.col['w']}"
+        )
+        char, live_char = self.load_complete_character(char_id=char_id)
+        char_json = char.json()
+        live_char_json = live_char.json()
+
+        start = time.perf_counter()
+        for _ in range(sessions):
+            self.discard_what_if(self.start_what_if())
+        took = round((time.perf_counter() - start) / sessions * 1000000)
+        logging.info(f"{self.chk} {self.test_text} {took}us to start a session.")
+
+        # Apply a mod to a free node and take it off again. Housekeeping can change stats of a character loaded from
+        # the DB by itself, so this is compared with a session that only ran housekeeping
+        mod_location = self.get_char_free_nodes(char=char)[0]
+        mod_id = self.check_mods_by_node(node_location=mod_location, char=char)[0]
+        baseline = self.start_what_if()
+        self.what_if_diff(baseline)
+        session = self.start_what_if()
+        applied = self.what_if_apply(session, mod_id=mod_id, mod_location=mod_location)
+        applied_diff = self.what_if_diff(session)
+        self.what_if_remove(session, mod_id=mod_id, mod_location=mod_location)
+        self.what_if_diff(session)
+        restored = model_diff(baseline.live_char, session.live_char)
+        round_trip = [x for x, (old, new) in restored.items() if type(new) is not str]
+        self.discard_what_if(session)
+        self.discard_what_if(baseline)
+
+        # Remove a mod that came from the DB, which rebuilds the live character
+        held = [
+            (x, y)
+            for x, y in char.nodes.items()
+            if y
+            and not self.check_if_breed_mod(
+                mod_id=y, mod_location=x, breed_name=char.breed
+            )
+        ]
+        session = self.start_what_if()
+        removed = self.what_if_remove(
+            session, mod_id=held[-1][1], mod_location=held[-1][0]
+        )
+        removed_diff = self.what_if_diff(session)
+        self.discard_what_if(session)
+
+        untouched = (
+            self.char is char
+            and char.json() == char_json
+            and live_char.json() == live_char_json
+            and self.load_live_character(char_id=live_char.live_char_id).json()
+            == live_char_json
+        )
+        try:
+            self.what_if_apply(session, mod_id=mod_id, mod_location=mod_location)
+            closed = False
+        except ValueError:
+            closed = True
+
+        # Commit a session and load the character back from the DB
+        session = self.start_what_if(char=char, live_char=live_char)
+        self.what_if_apply(session, mod_id=mod_id, mod_location=mod_location)
+        self.commit_what_if(session)
+        committed = self.load_char(char_id=char_id, feedback=False).nodes[mod_location]
+
+        if (
+            applied
+            and applied_diff
+            and not round_trip
+            and removed
+            and removed_diff
+            and untouched
+            and closed
+            and committed == mod_id
+        ):
+            logging.info(
+                f"{self.chk} {self.test_text} What-if sessions changed {len(applied_diff)} and "
+                f"{len(removed_diff)} stats without touching the character, and the commit was saved."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Applied: {applied} ({len(applied_diff)} stats), not restored by "
+                f"removing it: {round_trip}, removed: {removed} ({len(removed_diff)} stats), character untouched: "
+                f"{untouched}, closed: {closed}, committed: {committed} {self.fail_txt}."
+            )
+            return False
+
+    def test_compile_live_char(self, char_id=1) -> bool:
+        """Test that compiling a live character with the effects matrix gives exactly the same LiveCharacterModel as
+        applying every mod to a blank one with apply_mod_to_live_character"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing compiling the live character against applying "
+            f"each mod for character with char_id:{char_id}.{self.col['w']}"
+        )
+        # Applying mods can change char.text_replace_mods, so each build gets its own copy of the character
+        applied_live_char = self._build_live_char(
+            char=self.load_char(char_id=char_id, feedback=False)
+        )
+        compiled_live_char = self.compile_live_char(
+            char=self.load_char(char_id=char_id, feedback=False),
+            live_char=applied_live_char,
+        )
+
+        applied_stats = applied_live_char.dict()
+        compiled_stats = compiled_live_char.dict()
+        different = [x for x in applied_stats if applied_stats[x] != compiled_stats[x]]
+        if not different:
+            logging.info(
+                f"{self.chk} {self.test_text} All {len(applied_stats)} stats of the compiled live character match."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} The compiled live character differs in: {different} "
+                f"{self.fail_txt}."
+            )
+            return False
+
+    def test_compile_many(self, char_ids=(0, 1, 2, 3, 4)) -> bool:
+        """Test that compiling many characters at once gives, for each of them, exactly the same LiveCharacterModel
+        as compile_live_char followed by the derived stat steps compile_many vectorises"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing compile_many against compile_live_char for "
+            f"char_ids:{char_ids}.{self.col['w']}"
+        )
+        compiled_many = self.compile_many(char_ids=list(char_ids))
+
+        different: dict = {}
+        for char_id in char_ids:
+            live_char = self.compile_live_char(
+                char=self.load_char(char_id=char_id, feedback=False),
+                live_char=self.load_live_character(char_id=char_id, feedback=False),
+            )
+            live_char = self.set_skill_minimums(live_char=live_char)
+            live_char = self.calc_live_char_initiative(live_char=live_char)
+            live_char = self.calc_live_char_wound_thresholds(live_char=live_char)
+            live_char = self.set_armour_value_caps(live_char=live_char)
+
+            single_stats = live_char.dict()
+            many_stats = compiled_many[char_id].dict()
+            stats = [x for x in single_stats if single_stats[x] != many_stats[x]]
+            if stats:
+                different[char_id] = stats
+
+        if not different:
+            logging.info(
+                f"{self.chk} {self.test_text} All {len(char_ids)} characters compiled together match."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} The characters compiled together differ in: {different} "
+                f"{self.fail_txt}."
+            )
+            return False
+
+    def test_compile_many_benchmark(
+        self, sizes=(10, 100, 10000), char_ids=(0, 1, 2, 3, 4), model_limit=100
+    ) -> dict:
+        """Benchmark of the per-character cost of compile_stats_many (integer and derived stats only) and
+        compile_chars (whole LiveCharacterModels) against compile_live_char and the derived stat steps a character
+        at a time. The characters are char_ids repeated up to each size. Building the whole models is timed on at
+        most model_limit characters, as it costs much the same per character at any size.
+        Returns {size: (stats, models, one_at_a_time)}, each in microseconds per character."""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Benchmarking compile_many for {sizes} characters."
+            f"{self.col['w']}"
+        )
+        pool = self.load_chars_many(char_ids=list(char_ids))
+        live_char_info = self.load_live_char_info_many(char_ids=list(char_ids))
+        # Build the effects matrix before timing anything
+        self.compile_stats_many(chars=pool)
+
+        results: dict = {}
+        for size in sizes:
+            chars = [pool[i % len(pool)] for i in range(size)]
+            sample = chars[: min(size, model_limit)]
+
+            start = time.perf_counter()
+            self.compile_stats_many(chars=chars)
+            stats_time = (time.perf_counter() - start) / size
+
+            start = time.perf_counter()
+            self.compile_chars(chars=sample, live_char_info=live_char_info)
+            models_time = (time.perf_counter() - start) / len(sample)
+
+            start = time.perf_counter()
+            for char in sample:
+                live_char = self.compile_live_char(
+                    char=char,
+                    live_char=LiveCharacterModel(
+                        live_char_id=live_char_info[char.char_id][0],
+                        char_id=char.char_id,
+                        char_name=char.char_name,
+                        player_id=char.player_id,
+                        player_name=live_char_info[char.char_id][1],
+                        deleted=char.deleted,
+                    ),
+                )
+                live_char = self.set_skill_minimums(live_char=live_char)
+                live_char = self.calc_live_char_initiative(live_char=live_char)
+                live_char = self.calc_live_char_wound_thresholds(live_char=live_char)
+                self.set_armour_value_caps(live_char=live_char)
+            single_time = (time.perf_counter() - start) / len(sample)
+
+            results[size] = tuple(
+                round(x * 1000000, 1) for x in (stats_time, models_time, single_time)
+            )
+            logging.info(
+                f"{self.chk} {self.test_text} {size} characters: compile_stats_many {results[size][0]}us, "
+                f"compile_chars {results[size][1]}us, one at a time {results[size][2]}us per character."
+            )
+
+        return results
+
+    def test_housekeeping_pipeline(self, char_id=1, steps=8, seed=0) -> bool:
+        """Test that housekeeping only re-running the stages whose inputs changed gives the same character as a full
+        run (verify_housekeeping) while mods are added to free nodes and removed again at random, and that a change
+        nobody marked dirty is caught by the check"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing partial housekeeping against full runs for "
+            f"character with char_id:{char_id}.{self.col['w']}"
+        )
+        rng = random.Random(seed)
+        self.load_complete_character(char_id=char_id)
+        self.housekeeping()
+        self.verify_housekeeping = True
+        failures = self.housekeeping_verify_failures
+
+        for _ in range(steps):
+            mod_location = rng.choice(self.get_char_free_nodes(char=self.char))
+            mod_ids = self.check_mods_by_node(
+                node_location=mod_location, char=self.char
+            )
+            if mod_ids:
+                self.apply_mod_to_character(
+                    mod_id=rng.choice(list(mod_ids)),
+                    mod_location=mod_location,
+                    char=self.char,
+                )
+                self.housekeeping()
+
+        for mod_location, mod_id in rng.sample(
+            [(x, y) for x, y in self.char.nodes.items() if y], steps // 2
+        ):
+            self.remove_mod_from_character(
+                mod_id=mod_id, mod_location=mod_location, char=self.char
+            )
+            self.housekeeping()
+        matched = self.housekeeping_verify_failures == failures
+
+        # Changing a stat without marking it dirty has to be caught
+        self.housekeeping()
+        self.live_char.initiative_bonus += 1
+        self.housekeeping()
+        caught = self.housekeeping_verify_failures == failures + 1
+        self.verify_housekeeping = False
+
+        if matched and caught:
+            logging.info(
+                f"{self.chk} {self.test_text} Every partial housekeeping matched a full run."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Partial housekeeping matched full runs: {matched}, unmarked change "
+                f"caught: {caught} {self.fail_txt}."
+            )
+            return False
+
+    def test_thresholds_many(self, char_ids=(0, 1, 2, 3, 4), combatants=300) -> bool:
+        """Test that calc_thresholds_many gives every combatant the same Initiative and Wound Thresholds as
+        calc_live_char_initiative and calc_live_char_wound_thresholds do one character at a time, and that the lookup
+        tables give the same value one at a time as they do for a whole array"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing calc_thresholds_many for {combatants} combatants "
+            f"from char_ids:{char_ids}.{self.col['w']}"
+        )
+        compiled = self.compile_many(char_ids=list(char_ids))
+        live_chars = [compiled[char_ids[i % len(char_ids)]] for i in range(combatants)]
+        # Spread the stats out, so the bands and both ends of the tables are covered
+        for i, live_char in enumerate(live_chars):
+            live_char.physical += i % 40 - 10
+            live_char.physical_actual += i % 40 - 10
+            live_char.faith += i // 40
+
+        thresholds = self.calc_thresholds_many(live_chars=live_chars)
+        different: list = []
+        for i, live_char in enumerate(live_chars):
+            live_char = self.calc_live_char_initiative(live_char=live_char)
+            live_char = self.calc_live_char_wound_thresholds(live_char=live_char)
+            stats = [x for x in thresholds if thresholds[x][i] != getattr(live_char, x)]
+            if stats:
+                different.append((i, stats))
+
+        for table in (WT_TABLE, MOOK_WT_TABLE, INITIATIVE_TABLE):
+            bases = list(range(table.low - 5, table.high + 6))
+            if [table.lookup(x) for x in bases] != table.lookup_many(bases).tolist():
+                different.append((table, "lookup"))
+
+        if not different:
+            logging.info(
+                f"{self.chk} {self.test_text} All {combatants} combatants' thresholds match."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Thresholds differ for: {different} {self.fail_txt}."
+            )
+            return False
+
+    def test_plan_build(
+        self,
+        char_id=1,
+        mod_ids=("e_social_noble", "n_persuade_2", "t_claustrophobia"),
+    ) -> bool:
+        """Test that plan_build finds a plan for each mod_id, that every placement in it is one check_mods_by_node
+        offers for a free node at that point, and that a mod the character already has needs no placements"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing plan_build for {mod_ids} for character with "
+            f"char_id:{char_id}.{self.col['w']}"
+        )
+        self.load_complete_character(char_id=char_id)
+        char = self.char.copy(deep=True)
+
+        illegal: list = []
+        for mod_id in mod_ids:
+            start = time.perf_counter()
+            plan = self.plan_build(mod_id=mod_id, char=char)
+            took = round((time.perf_counter() - start) * 1000, 2)
+            if not plan or plan.placements[-1][1] != mod_id:
+                illegal.append((mod_id, "no plan"))
+                continue
+            logging.info(
+                f"{self.chk} {self.test_text} {mod_id} in {took}ms: {plan.placements}"
+            )
+
+            planned = char.copy(deep=True)
+            for location, placed in plan.placements:
+                free_nodes = self.get_char_free_nodes(char=planned)
+                offered = self.check_mods_by_node(node_location=location, char=planned)
+                if location not in free_nodes or placed not in (offered or ()):
+                    illegal.append((mod_id, location, placed))
+                    break
+                planned.nodes[location] = placed
+
+        held = self.get_char_current_mods(char=char)[0]
+        already_held = self.plan_build(mod_id=held, char=char).placements == ()
+
+        if not illegal and already_held:
+            logging.info(
+                f"{self.chk} {self.test_text} Every plan is legal step by step."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Plans that aren't legal: {illegal}, no placements for a mod already "
+                f"held: {already_held} {self.fail_txt}."
+            )
+            return False
+
+    def _build_live_char(
+        self, char: CharacterModel, skip_location: str = ""
+    ) -> LiveCharacterModel:
+        """Applies every mod in char.nodes (except the one at skip_location) to a blank LiveCharacterModel"""
+        live_char = LiveCharacterModel(
+            live_char_id=0,
+            char_id=char.char_id,
+            char_name=char.char_name,
+            player_id=char.player_id,
+            player_name="",
+            deleted=False,
+        )
+        live_char.text_replace_mods = {
+            x: dict(char.text_replace_mods[x]) for x in char.text_replace_mods
+        }
+        self.char = char
+        self.live_char = live_char
+        for mod_location, mod_id in char.nodes.items():
+            if mod_id and mod_location != skip_location:
+                self.apply_mod_to_live_character(
+                    mod_id=mod_id, mod_location=mod_location, live_char=live_char
+                )
+
+        return live_char
+
+    def _derived_stats_dict(
+        self, live_char: LiveCharacterModel, char: CharacterModel
+    ) -> dict:
+        """Runs every derived stat step on live_char and returns its stats, with applied_mods sorted"""
+        live_char = self.recalc_derived_stats(
+            changed=None,
+            char=char,
+            live_char=live_char,
+        )
+        stats = live_char.dict()
+        stats["applied_mods"] = sorted(stats["applied_mods"])
+        stats.pop("text_replace_mods", None)
+
+        return stats
+
+    def test_explore_builds(
+        self, char_id=1, objective=None, max_placements=3, workers=(1, 2)
+    ) -> bool:
+        """Test that explore_builds gives the same builds with each number of workers, that every top build is legal
+        step by step (check_mods_by_node), within the TP budget, and that its stats and score are the ones
+        compile_stats_many gives for the character with those mods"""
+        if objective is None:
+            objective = {"physical_wt": 1, "initiative": 1}
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing explore_builds for {objective} for character with "
+            f"char_id:{char_id}.{self.col['w']}"
+        )
+        self.load_complete_character(char_id=char_id)
+        char = self.char.copy(deep=True)
+
+        tops: list = []
+        for worker_count in workers:
+            *_, top = self.explore_builds(
+                objective=objective,
+                char=char,
+                max_placements=max_placements,
+                beam_width=32,
+                workers=worker_count,
+            )
+            tops.append(top)
+        same = all(
+            [(x.score, x.placements) for x in top]
+            == [(x.score, x.placements) for x in tops[0]]
+            for top in tops
+        )
+
+        illegal: list = []
+        for build in tops[0]:
+            planned = char.copy(deep=True)
+            for location, placed in build.placements:
+                free_nodes = self.get_char_free_nodes(char=planned)
+                offered = self.check_mods_by_node(node_location=location, char=planned)
+                if location not in free_nodes or placed not in (offered or ()):
+                    illegal.append((build.placements, location, placed))
+                    break
+                planned.nodes[location] = placed
+            columns, values = self.compile_stats_many(chars=[planned])
+            score = sum(values[0][columns.index(x)] * y for x, y in objective.items())
+            if (
+                build.tp_cost > char.tp_unspent
+                or list(build.stats) != list(values[0])
+                or build.score != score
+            ):
+                illegal.append((build.placements, "stats"))
+
+        ranked = [x.rank() for x in tops[0]] == sorted(x.rank() for x in tops[0])
+        if same and ranked and tops[0] and not illegal:
+            logging.info(
+                f"{self.chk} {self.test_text} {len(tops[0])} legal builds, the same with {workers} workers. Best: "
+                f"{tops[0][0].score} with {tops[0][0].placements}."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Same with {workers} workers: {same}, ranked: {ranked}, builds that "
+                f"aren't legal or don't match: {illegal} {self.fail_txt}."
+            )
+            return False
+
+    def test_explore_builds_benchmark(
+        self, char_id=1, workers=(1, 2, 4), max_placements=5, beam_width=256
+    ) -> dict:
+        """Benchmark of explore_builds with each number of workers. Returns {workers: (seconds, builds compiled per
+        second, per second per worker)}"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Benchmarking explore_builds with {workers} workers."
+            f"{self.col['w']}"
+        )
+        self.load_complete_character(char_id=char_id)
+        char = self.char
+        # Build the planner and breed locks before timing anything
+        self.get_breed_locked_nodes(char_breed=char.breed)
+
+        results: dict = {}
+        for worker_count in workers:
+            start = time.perf_counter()
+            for _ in self.explore_builds(
+                objective={"physical_wt": 1, "initiative": 1},
+                char=char,
+                max_placements=max_placements,
+                beam_width=beam_width,
+                workers=worker_count,
+            ):
+                pass
+            took = time.perf_counter() - start
+            compiled = self.build_explorer.compiled
+
+            seconds, per_second, per_worker = (
+                round(took, 2),
+                round(compiled / took),
+                round(compiled / took / worker_count),
+            )
+            results[worker_count] = (seconds, per_second, per_worker)
+            logging.info(
+                f"{self.chk} {self.test_text} {worker_count} workers: {compiled} builds in {seconds}s, "
+                f"{per_second} builds/s, {per_worker} builds/s per worker."
+            )
+
+        return results
+
+    def test_generate_random_characters(
+        self, player_id=0, count=100, sample=5, seed=0
+    ) -> bool:
+        """Test that generate_random_characters makes the same characters from the same seed, that each of a sample
+        of them is its breed's template plus placements that are legal step by step (check_mods_by_node) within its
+        tp_create, and compiles to the same stats as compile_live_char and the derived stat steps. Also tests that
+        every NDJSON line is one of the characters (parsing back to it) and that writing to the DB inserts them all"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing generate_random_characters for {count} characters "
+            f"for player_id:{player_id}.{self.col['w']}"
+        )
+        stream = StringIO()
+        generated = self.generate_random_characters(
+            count=count, player_id=player_id, seed=seed, ndjson_stream=stream
+        )
+        again = self.generate_random_characters(
+            count=count, player_id=player_id, seed=seed
+        )
+        same = [(x.breed, x.nodes) for x, _ in generated] == [
+            (x.breed, x.nodes) for x, _ in again
+        ]
+        lines = [loads(line) for line in stream.getvalue().splitlines()]
+        streamed = [
+            (x["char"]["char_id"], x["live_char"]["live_char_id"]) for x in lines
+        ]
+        ndjson = streamed == [
+            (x.char_id, y.live_char_id) for x, y in generated
+        ] and all(
+            CharacterModel.parse_obj(x["char"]) == char
+            for x, (char, _) in zip(lines, generated)
+        )
+
+        generator = self.get_character_generator()
+        wrong: list = []
+        for i, (char, live_char) in enumerate(generated[:sample]):
+            built = generator.generate(
+                rng=random.Random(f"{seed}:{i}"), tp_budget=char.tp_create
+            )
+            planned = CharacterModel(
+                char_id=char.char_id, player_id=player_id, breed=built.breed
+            )
+            template = self.bt.__dict__[built.breed]
+            planned.nodes.update(template)
+            for location, placed in built.placements[len(template) :]:
+                free_nodes = self.get_char_free_nodes(char=planned)
+                offered = self.check_mods_by_node(node_location=location, char=planned)
+                if location not in free_nodes or placed not in (offered or ()):
+                    wrong.append((char.char_id, location, placed))
+                    break
+                planned.nodes[location] = placed
+            if planned.nodes != char.nodes:
+                wrong.append((char.char_id, "nodes"))
+
+            tp_spent = (live_char.tp_spent - live_char.breed_tp_spent) - (
+                live_char.tp_bonus - live_char.breed_tp_bonus
+            )
+            if built.tp_cost != tp_spent or not 0 <= char.tp_unspent <= char.tp_create:
+                wrong.append((char.char_id, "tp", built.tp_cost, tp_spent))
+
+            # Compiling can change char.text_replace_mods, so this one gets its own copy of the character
+            single = self.compile_live_char(
+                char=char.copy(deep=True), live_char=live_char
+            )
+            single = self.set_skill_minimums(live_char=single)
+            single = self.calc_live_char_initiative(live_char=single)
+            single = self.calc_live_char_wound_thresholds(live_char=single)
+            single = self.set_armour_value_caps(live_char=single)
+            single_stats = single.dict()
+            generated_stats = live_char.dict()
+            stats = [
+                x
+                for x in single_stats
+                if single_stats[x] != generated_stats[x]
+                and x not in ("tp_total", "tp_unspent", "char_created", "char_modified")
+            ]
+            if stats:
+                wrong.append((char.char_id, stats))
+
+        next_char_id = self.fetch_next_id(id_type="char")
+        written = self.generate_random_characters(
+            count=sample, player_id=player_id, seed=seed, write_to_db=True
+        )
+        loaded = self.load_char(char_id=written[-1][0].char_id, feedback=False)
+        in_db = (
+            self.fetch_next_id(id_type="char") == next_char_id + sample
+            and loaded.nodes == written[-1][0].nodes
+        )
+
+        if same and ndjson and in_db and not wrong:
+            logging.info(
+                f"{self.chk} {self.test_text} {count} random characters, the same from the same seed, {sample} of "
+                f"them legal and compiled the same one at a time."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} Same from the same seed: {same}, NDJSON lines match: {ndjson}, written "
+                f"to the DB: {in_db}, characters that aren't legal or don't match: {wrong} {self.fail_txt}."
+            )
+            return False
+
+    def test_compile_chars_generated(self, player_id=0, count=20, seed=1) -> bool:
+        """Test that random characters compiled together (compile_chars, via generate_random_characters) have the same
+        int, text and bool stats as applying each of their mods in turn with apply_mod_to_live_character followed by
+        the derived stat steps, i.e. that compiling and applying a mod share their effect rules"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Testing compile_chars against applying each mod for {count} "
+            f"random characters.{self.col['w']}"
+        )
+        generated = self.generate_random_characters(
+            count=count, player_id=player_id, seed=seed
+        )
+        skip = (
+            "tp_total",
+            "tp_unspent",
+            "char_created",
+            "char_modified",
+            "live_char_id",
+            "player_name",
+        )
+
+        different: dict = {}
+        checked = {int: 0, str: 0, bool: 0}
+        for char, live_char in generated:
+            applied = self._build_live_char(char=char.copy(deep=True))
+            applied = self.set_skill_minimums(live_char=applied)
+            applied = self.calc_live_char_initiative(live_char=applied)
+            applied = self.calc_live_char_wound_thresholds(live_char=applied)
+            applied = self.set_armour_value_caps(live_char=applied)
+
+            compiled_stats = live_char.dict()
+            for stat, value in applied.dict().items():
+                if stat in skip or type(value) not in checked:
+                    continue
+                checked[type(value)] += 1
+                if value != compiled_stats[stat]:
+                    different.setdefault(type(value).__name__, []).append(
+                        (char.char_id, stat)
+                    )
+
+        if not different and all(checked.values()):
+            logging.info(
+                f"{self.chk} {self.test_text} All {count} characters match applied a mod at a time on "
+                f"{checked[int]} int, {checked[str]} text and {checked[bool]} bool stats."
+            )
+            return True
+        else:
+            logging.info(
+                f"{self.cross} {self.test_text} The compiled characters differ in: {different} {self.fail_txt}."
+            )
+            return False
+
+    def test_generate_random_characters_benchmark(
+        self, player_id=0, sizes=(100, 1000)
+    ) -> dict:
+        """Benchmark of generate_random_characters writing NDJSON. Returns {size: (seconds, placements (builds only)
+        per second, whole characters per second)}"""
+        logging.info(
+            f"{self.l_break}"
+            f"{self.chk} {self.test_text} {self.col['y']}Benchmarking generate_random_characters for {sizes} "
+            f"characters.{self.col['w']}"
+        )
+        # Build the generator and effects matrix before timing anything
+        generator = self.get_character_generator()
+        self.generate_random_characters(count=10, player_id=player_id)
+
+        results: dict = {}
+        for size in sizes:
+            start = time.perf_counter()
+            for i in range(size):
+                generator.generate(rng=random.Random(f"0:{i}"))
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            self.generate_random_characters(
+                count=size, player_id=player_id, ndjson_stream=StringIO()
+            )
+            took = time.perf_counter() - start
+
+            results[size] = (
+                round(took, 2),
+                round(size / build_time),
+                round(size / took),
+            )
+            logging.info(
+                f"{self.chk} {self.test_text} {size} characters in {results[size][0]}s: {results[size][1]} builds/s, "
+                f"{results[size][2]} characters/s."
+            )
+
+        return results
+
     def test_node_slot_already_free(
         self, mod_location: str, char: CharacterModel
     ) -> bool:
@@ -583,6 +1979,12 @@ class TestCharacterMethods(DeleteMethods):
 cm = TestCharacterMethods()
 # test1 = cm.test_db_fetch()  # set good=False to try an incorrect SQL query
 # test2 = cm.test_get_mod_info()
+# test2a = cm.test_mod_catalog()
+# test2b = cm.test_search_mods()
+# test2c = cm.test_mod_autocomplete()
+# test2d = cm.test_gamedata_snapshot()
+# test2e = cm.test_gamedata_snapshot_defaults()
+# test2f = cm.test_gamedata_export_rollback()
 # test3 = cm.test_get_mod_selection()
 # test4 = cm.test_get_mod_selection_full()
 # test5 = cm.test_check_any_all(mod_id="e_brave")
@@ -591,10 +1993,31 @@ cm = TestCharacterMethods()
 # test8 = cm.test_check_allowed_multiple(mod_id="e_brave")
 # test9 = cm.test_check_preq_restrict_all(mod_id="s_cnsbooster")
 # test10 = cm.test_check_mod_allowed(mod_id="e_brave")
+# test10a = cm.test_rule_evaluators()
+# test10k = cm.test_check_mod_allowed_memo()
+# test10l = cm.test_plan_build(char_id=1)
+# test10n = cm.test_explore_builds(char_id=1)
+# test10o = cm.test_explore_builds_benchmark(workers=(1, 2, 4))
+# test10p = cm.test_generate_random_characters(player_id=0)
+# test10s = cm.test_compile_chars_generated()
+# test10q = cm.test_generate_random_characters_benchmark(sizes=(100, 1000))
+# test10b = cm.test_get_node_candidates()
+# test10c = cm.test_get_char_free_nodes(char_id=1)
+# test10d = cm.test_free_node_frontier(char_id=1)
+# test10e = cm.test_remove_mod_delta(char_id=1)
+# test10r = cm.test_remove_mod_delta_write_to_db(char_id=1)
+# test10t = cm.test_remove_mod_delta_loaded(char_id=2)
+# test10m = cm.test_what_if(char_id=4)
+# test10f = cm.test_compile_live_char(char_id=1)
+# test10g = cm.test_compile_many(char_ids=(0, 1, 2, 3, 4))
+# test10h = cm.test_compile_many_benchmark(sizes=(10, 100, 10000))
+# test10i = cm.test_housekeeping_pipeline(char_id=1)
+# test10j = cm.test_thresholds_many(combatants=300)
 # test11 = cm.test_get_touched_skills(mod_id="e_brave")
 # test12 = cm.test_get_modded_skills("e_brave")
 # test13 = cm.test_fetch_next_id(id_type="player")
 # test14 = cm.test_query_exists_in_db(query_table="characters", id_label="character")
+# test14a = cm.test_query_exists_in_db_table(query_id=1)
 # test15 = cm.test_insert_update_db()
 """
 new_player = cm.test_new_player(
@@ -2,6 +2,7 @@
 __version__ = "2.1.50"
 __author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
 
+from contextlib import contextmanager
 from json import dump, load, loads
 from character_dataclasses import (
     BSCMConfig,
@@ -15,13 +16,19 @@ from character_dataclasses import (
 )
 import sqlite3
 import logging
+import threading
 import os
 from json import dumps
 from textwrap import wrap
+from db_migrations import migrate_db, GAMEDATA_MIGRATIONS, CHARDATA_MIGRATIONS
+import queries
 
 logging.basicConfig(level=logging.WARNING)
 # logging.basicConfig(filename='app.log', filemode='w', format='%(message)s')
 
+# Pooled SQLite connections: one connection (and its cursor) per database, per thread
+_db_pool = threading.local()
+
 
 class UtilityMethods:
     """The UtilityMethods class provides some general purpose utility methods used by CharacterMethods and
@@ -40,6 +47,18 @@ class UtilityMethods:
         self.char_save_file_tail = bscm.char_save_file_tail
         self.live_char_save_file_tail = bscm.live_char_save_file_tail
 
+        # Bring both DBs up to the current schema version (only checked once per process)
+        migrate_db(
+            db=self.gamedata_db["db"],
+            db_path=self.gamedata_db["db_path"],
+            migrations=GAMEDATA_MIGRATIONS,
+        )
+        migrate_db(
+            db=self.chardata_db["db"],
+            db_path=self.chardata_db["db_path"],
+            migrations=CHARDATA_MIGRATIONS,
+        )
+
         # Custom Colours for CLI Logging output
         colour = {
             "g": "\x1b[32m",
@@ -88,6 +107,9 @@ class UtilityMethods:
         self.db_cached_write_count = db_cached_write_count
         db_read_count = 0
         self.db_read_count = db_read_count
+        # Size of each pooled connection's prepared statement cache (sqlite3 defaults to 128)
+        db_cached_statements = 256
+        self.db_cached_statements = db_cached_statements
 
         current_sql_write_query = ""
         self.current_sql_write_query = current_sql_write_query
@@ -104,7 +126,6 @@ class UtilityMethods:
         fetch_sql: str,
         sql_data_tuple: tuple = (),
         allow_edit: bool = False,
-        lower_case: bool = False,
     ) -> dict:
         """
         Requires db (string), db_path (string), fetch_sql (string); returns dict.
@@ -115,15 +136,13 @@ class UtilityMethods:
         db: name of DB
         db_path: string of DB path
         fetch_sql: SQL to be performed. Unless allow_edit = True this must be a SELECT query
-        sql_data_tuple: arbitrary list of data to be included in SQL query
+        sql_data_tuple: values bound to the '?' parameters of fetch_sql (see queries.py). Never paste values into
+        fetch_sql itself.
         allow_edit: prevents any queries except SELECT unless set to True
+        Connections are pooled (see get_db_connection) so nothing is opened or closed per call. SELECT queries are
+        never committed, and writes run inside a db_transaction scope.
         """
-        conn = sqlite3.connect(db_path + db)
-        cursor = conn.cursor()
-        logging.debug(
-            f"{self.chk} {self.sql_txt} Connecting to "
-            f"db:{self.col['y']}{db_path}{db}{self.col['w']}."
-        )
+        conn, cursor = self.get_db_connection(db=db, db_path=db_path)
 
         # Check this is a SELECT query only and not trying to spoof us
         if allow_edit:
@@ -144,7 +163,6 @@ class UtilityMethods:
                 )
                 self.current_sql_write_query = fetch_sql
                 self.current_sql_data_tuple = sql_data_tuple
-                cursor.execute(fetch_sql, sql_data_tuple)
             else:
                 logging.info(
                     f"{self.chk} {self.sql_txt} Executing "
@@ -164,9 +182,11 @@ class UtilityMethods:
                 )
 
                 self.current_sql_write_query = fetch_sql
-                cursor.execute(fetch_sql)
 
-            select_data = cursor.fetchall()
+            # Joins the caller's transaction if one is already open, otherwise commits this write on its own
+            with self.db_transaction(db=db, db_path=db_path) as cursor:
+                cursor.execute(fetch_sql, sql_data_tuple)
+                select_data = cursor.fetchall()
             return_data = dict(select_data)
 
         else:
@@ -176,12 +196,10 @@ class UtilityMethods:
                     f"{self.chk} {self.sql_txt} Executing {self.col['g']}SELECT{self.col['w']} "
                     f"query: "
                 )
-                logging.debug(f"{self.col['g']}{fetch_sql}{self.col['w']}")
-                if lower_case:
-                    fetch_sql = fetch_sql.replace("WHERE", "WHERE LOWER(")
-                    fetch_sql = fetch_sql.replace("=", ")=")
-                    # Really need to mke the search term lower case too with a regex...
-                cursor.execute(fetch_sql)
+                logging.debug(
+                    f"{self.col['g']}{fetch_sql} {sql_data_tuple}{self.col['w']}"
+                )
+                cursor.execute(fetch_sql, sql_data_tuple)
                 select_data = cursor.fetchall()
                 data_count = len(select_data)
                 logging.debug(
@@ -212,12 +230,72 @@ class UtilityMethods:
                 )
                 return_data = {0: 0}
 
-        conn.commit()
-        conn.close()
-        logging.debug(f"{self.chk} {self.sql_txt} Connection closed.")
-
         return return_data
 
+    def get_db_connection(self, db: str, db_path: str) -> tuple:
+        """Requires db (string), db_path (string); returns tuple of (sqlite3.Connection, sqlite3.Cursor).
+        Returns this thread's pooled connection and cursor for a database, opening it on first use. Connections are
+        opened in autocommit mode so reads never hold a transaction open; writes are grouped with db_transaction.
+        Each connection keeps a cache of its most recent db_cached_statements prepared statements, keyed by SQL
+        string, which is why every query is a fixed, parameterized statement from queries.py."""
+        connections = getattr(_db_pool, "connections", None)
+        if connections is None:
+            connections = {}
+            _db_pool.connections = connections
+
+        pooled = connections.get(db_path + db)
+        if pooled is None:
+            logging.debug(
+                f"{self.chk} {self.sql_txt} Connecting to "
+                f"db:{self.col['y']}{db_path}{db}{self.col['w']}."
+            )
+            conn = sqlite3.connect(
+                db_path + db,
+                isolation_level=None,
+                cached_statements=self.db_cached_statements,
+            )
+            pooled = (conn, conn.cursor())
+            connections[db_path + db] = pooled
+
+        return pooled
+
+    @contextmanager
+    def db_transaction(self, db: str, db_path: str):
+        """Requires db (string), db_path (string); yields sqlite3.Cursor.
+        Explicit transaction scope for writes: everything executed inside the 'with' block is committed once at the
+        end, or rolled back if an exception is raised. Nested scopes (and db_fetch writes made inside a scope) join
+        the outermost transaction.
+        Example:
+        with self.db_transaction(db, db_path) as cursor:
+            cursor.execute(write_sql, data_tuple)"""
+        conn, cursor = self.get_db_connection(db=db, db_path=db_path)
+
+        if conn.in_transaction:
+            yield cursor
+            return
+
+        cursor.execute("BEGIN")
+        try:
+            yield cursor
+        except BaseException:
+            conn.rollback()
+            logging.error(
+                f"{self.cross} {self.sql_txt} {self.err_txt} Transaction on "
+                f"db:{self.col['y']}{db_path}{db}{self.col['w']} {self.col['r']}ROLLED BACK{self.col['w']}."
+            )
+            raise
+        else:
+            conn.commit()
+
+    @staticmethod
+    def close_db_connections() -> None:
+        """Closes all of this thread's pooled connections. They are reopened automatically on next use."""
+        connections = getattr(_db_pool, "connections", {})
+        for conn, cursor in connections.values():
+            cursor.close()
+            conn.close()
+        connections.clear()
+
     def fetch_next_id(self, id_type: str = "player") -> int:
         """Requires id_type (string); returns int.
         We need to fetch the next available ID from the DB to use with the PlayerModel, CharacterModel or
@@ -237,29 +315,23 @@ class UtilityMethods:
                     f"{self.chk} {self.sql_txt} {self.col['g']}'player'{self.col['w']} "
                     f"selected."
                 )
-                fetch_sql = (
-                    f"SELECT player_id FROM players ORDER BY player_id DESC LIMIT 1"
-                )
             case "char":
                 logging.info(
                     f"{self.chk} {self.sql_txt} {self.col['g']}'character'{self.col['w']} "
                     f"selected."
                 )
-                fetch_sql = (
-                    f"SELECT char_id FROM characters ORDER BY char_id DESC LIMIT 1"
-                )
             case "live_char":
                 logging.info(
                     f"{self.chk} {self.sql_txt} {self.col['g']}'live_character'{self.col['w']} "
                     f"selected."
                 )
-                fetch_sql = f"SELECT live_char_id FROM live_characters ORDER BY live_char_id DESC LIMIT 1"
             case _:
                 logging.warning(
                     f"{self.cross} {self.sql_txt} {self.err_txt} No id_type selected."
                 )
                 return False
 
+        fetch_sql = queries.pc_last_id(id_type)
         last_id = self.db_fetch(
             self.chardata_db["db"], self.chardata_db["db_path"], fetch_sql
         )
@@ -273,13 +345,14 @@ class UtilityMethods:
         return next_id
 
     def query_exists_in_db(
-        self, query_id: int, query_table: str = "characters", id_label: str = "player"
+        self, query_id: int, query_table: str = "characters", id_label: str = "char"
     ) -> bool:
         """Requires query_id (int), query_table (string), id_label (string); returns bool.
         This method does a quick query to see if an id already exists in a certain table and DB.
         Available Options:
         query_table = 'gamedata', 'characters', 'players', or 'live_characters'
-        id_label = 'gamedata', 'player', 'char', or 'live_char'"""
+        id_label = 'gamedata', 'player', 'char', or 'live_char'
+        Apart from 'gamedata', query_table must be id_label's table ('players' for 'player' etc.)."""
         logging.info(f"{self.chk} {self.col['y']}[query_exists_in_db]{self.col['w']}")
 
         logging.info(
@@ -294,27 +367,36 @@ class UtilityMethods:
             db = self.gamedata_db["db"]
             db_path = self.gamedata_db["db_path"]
         else:
-            if id_label in self.pc_types:
-                id_type = id_label + "_id"
-
-                db = self.chardata_db["db"]
-                db_path = self.chardata_db["db_path"]
-            else:
+            if id_label not in self.pc_types:
                 logging.error(
                     f"{self.cross} {self.err_txt} Database query failed. Please call query_exists_in_db "
                     f"method with correct query_id and either correct query_table"
                 )
                 return False
+            # The query is built from id_label, so a query_table that isn't id_label's table is a mistake by the
+            # caller rather than a different table to look in
+            if query_table != queries.PC_TABLES[id_label][0]:
+                logging.error(
+                    f"{self.cross} {self.err_txt} Database query failed. query_table:'{query_table}' is not the "
+                    f"table for id_label:'{id_label}', which is '{queries.PC_TABLES[id_label][0]}'."
+                )
+                return False
+            id_type = id_label + "_id"
+
+            db = self.chardata_db["db"]
+            db_path = self.chardata_db["db_path"]
 
         logging.info(
             f"{self.chk} {self.sql_txt} Checking to see if '{id_type} = {query_id}' exists in '{query_table}' "
             f"table in '{db}' DB?"
         )
 
-        # This is the variable SELECT SQL statement:
-        fetch_sql = f"SELECT * FROM {query_table} WHERE {id_type}={query_id} LIMIT 1"
+        if query_table == "gamedata":
+            fetch_sql = queries.MOD_EXISTS
+        else:
+            fetch_sql = queries.pc_exists(id_label)
         query_return = self.db_fetch(
-            db, db_path, fetch_sql
+            db, db_path, fetch_sql, sql_data_tuple=(query_id,)
         )  # Returns dict if True, empty dict if False.
 
         if query_return:
@@ -0,0 +1,169 @@
+# encoding: utf-8
+__version__ = "2.1.50"
+__author__ = "Gunnar Roxen <gunnar@brokenshield.net>"
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+import logging
+
+logging.basicConfig(level=logging.WARNING)
+
+# Copy-on-write overlays of pydantic models, for trying mods on a loaded character (see WhatIfSession).
+
+
+# model class: names of its list and dict fields, see container_fields
+_container_fields: dict = {}
+# model class: whether it has fields that are models, see has_nested_models
+_nested_models: dict = {}
+# model class: names of its required fields, see non_default_values
+_required_fields: dict = {}
+
+
+def container_fields(model_class) -> tuple:
+    """Requires: model_class (pydantic model class); returns tuple.
+    The names of the fields of model_class declared as a list or dict, worked out once per class."""
+    fields = _container_fields.get(model_class)
+    if fields is None:
+        fields = tuple(
+            name
+            for name, field in model_class.__fields__.items()
+            if field.shape != SHAPE_SINGLETON
+            or getattr(field.outer_type_, "__origin__", field.outer_type_)
+            in (list, dict)
+        )
+        _container_fields[model_class] = fields
+
+    return fields
+
+
+def has_nested_models(model_class) -> bool:
+    """Requires: model_class (pydantic model class); returns bool.
+    Whether any field of model_class is itself a pydantic model, or holds them. When none is, the model's __dict__
+    is already what model.dict() would build, worked out once per class."""
+    nested = _nested_models.get(model_class)
+    if nested is None:
+        # type_ is the innermost type, the model in e.g. list[Model] or Optional[Model] too
+        nested = any(
+            isinstance(field.type_, type) and issubclass(field.type_, BaseModel)
+            for field in model_class.__fields__.values()
+        )
+        _nested_models[model_class] = nested
+
+    return nested
+
+
+def overlay_model(model):
+    """Requires: model (pydantic model); returns pydantic model.
+    A copy of model that shares its field values, apart from lists and dicts which are copied (one level deep).
+    Like model.copy(), but without going through every field."""
+    values: dict = dict(model.__dict__)
+    for field in container_fields(model.__class__):
+        value = values.get(field)
+        if type(value) is list or type(value) is dict:
+            values[field] = value.copy()
+
+    return model_from_values(model.__class__, values, set(model.__fields_set__))
+
+
+def model_from_values(model_class, values: dict, fields_set: set = None):
+    """Requires: model_class (pydantic model class), values (dict), fields_set (set); returns pydantic model.
+    A model_class made from values, which must already have every field in it with a valid value: it becomes the
+    model's __dict__ as it is. Like model_class.construct(), but without going through every field."""
+    model = model_class.__new__(model_class)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(
+        model, "__fields_set__", set(values) if fields_set is None else fields_set
+    )
+    return model
+
+
+def model_diff(base, overlay) -> dict:
+    """Requires: base (pydantic model), overlay (pydantic model); returns dict.
+    {field: (base value, overlay value)} for every field that is different in overlay."""
+    base_values: dict = base.__dict__
+    diff: dict = {}
+    for field, value in overlay.__dict__.items():
+        old = base_values.get(field)
+        if value is not old and value != old:
+            diff[field] = (old, value)
+
+    return diff
+
+
+def non_default_values(model, defaults: dict, fields=None) -> dict:
+    """Requires: model (pydantic model), defaults (dict), fields (iterable of str); returns dict.
+    {field: value} for every field of model that is different from defaults ({field: default value}), and its
+    required fields whatever they are, so that model's class can parse_obj it back to model. If the caller knows
+    which fields can be different, only those (fields) are compared."""
+    required = _required_fields.get(model.__class__)
+    if required is None:
+        required = _required_fields[model.__class__] = tuple(
+            name for name, field in model.__fields__.items() if field.required
+        )
+    model_values: dict = model.__dict__
+    if fields is None:
+        fields = model_values
+
+    values: dict = {field: model_values[field] for field in required}
+    for field in fields:
+        value = model_values[field]
+        if field not in values and (field not in defaults or value != defaults[field]):
+            values[field] = value
+
+    return values
+
+
+class WhatIfSession:
+    """Overlays of a character (char and live_char) that mods are applied to and removed from instead of the base
+    models. Use it through CharacterMethods, which swaps the session's state in while it works on it. A session is
+    closed once it has been committed or discarded."""
+
+    def __init__(
+        self,
+        base_char,
+        base_live_char,
+        effect_ledger=None,
+        dirty_stats: set = None,
+        free_node_frontier=None,
+    ):
+        self.base_char = base_char
+        self.base_live_char = base_live_char
+        self.char = overlay_model(base_char)
+        self.live_char = overlay_model(base_live_char)
+        # The session's EffectLedger, dirty stats and FreeNodeFrontier, None until there is one for the overlays
+        self.effect_ledger = effect_ledger
+        self.dirty_stats = dirty_stats
+        self.free_node_frontier = free_node_frontier
+        # ("apply" or "remove", mod_id, mod_location) for every change made, in order
+        self.changes: list = []
+        self.closed: bool = False
+
+    def __len__(self):
+        return len(self.changes)
+
+    def check_open(self) -> None:
+        """Raises ValueError if the session has already been committed or discarded."""
+        if self.closed:
+            raise ValueError("What-if session has already been committed or discarded")
+
+    def diff(self) -> dict:
+        """Returns {stat: (base value, what-if value)} for every live character stat the session has changed."""
+        return model_diff(self.base_live_char, self.live_char)
+
+    def node_diff(self) -> dict:
+        """Returns {mod_location: (base mod_id, what-if mod_id)} for every node the session has changed."""
+        base_nodes: dict = self.base_char.nodes
+        return {
+            location: (base_nodes.get(location, ""), mod_id)
+            for location, mod_id in self.char.nodes.items()
+            if base_nodes.get(location, "") != mod_id
+        }
+
+    def close(self) -> None:
+        """Drops the overlays and the state that goes with them."""
+        self.char = None
+        self.live_char = None
+        self.effect_ledger = None
+        self.dirty_stats = None
+        self.free_node_frontier = None
+        self.closed = True